@@ -0,0 +1,186 @@
+"""
+Admission Control — stop expensive requests from starving cheap ones.
+
+The problem:
+    A worker has a fixed number of threads. At peak times, expensive
+    requests — the unfiltered task list, the admin dashboard, file
+    uploads, password hashing on login — can occupy every thread at
+    once. A cheap request (opening one task) then waits behind them and
+    times out, even though it would take a few milliseconds.
+
+The solution:
+    Each expensive endpoint belongs to a COST CLASS. Every class has:
+      - limit: how many of its requests may run at the same time
+      - queue: how many more may WAIT for a free slot
+      - wait:  how long (seconds) a queued request waits before giving up
+    A request that finds the queue already full, or waits too long, is
+    rejected immediately with 503 Service Unavailable and a Retry-After
+    header. Failing fast is kinder than a 30-second timeout — and it
+    leaves threads free for everything else.
+
+Long-lived streams:
+    The dashboard's live stream (GET /dashboard/stream) holds its thread
+    for minutes, not milliseconds. Gunicorn defaults to 2 threads per
+    worker (serve.py), so a couple of open dashboards could hold them
+    all. The "stream" class lets ONE stream per worker run and queues
+    none: the rest are told (in SSE's own retry field) to try again
+    later, and their pages simply update on the next reload. Under the
+    ASGI server (asgi.py) the stream is an async view that holds no
+    thread, so it is not counted here — use it for many live dashboards.
+
+Limits are per worker process. Override them in app config, e.g.
+    ADMISSION_LIMITS = {"report": {"limit": 2, "queue": 4, "wait": 1.0}}
+"""
+
+import math
+import threading
+import time
+
+from flask import Response, g, request, session
+
+from query_planner import TASK_LIST
+
+# Default limits for each cost class (per worker process)
+DEFAULT_LIMITS = {
+    "report": {"limit": 4, "queue": 8, "wait": 2.0},
+    "upload": {"limit": 2, "queue": 4, "wait": 5.0},
+    "login": {"limit": 2, "queue": 8, "wait": 3.0},
+    "stream": {"limit": 1, "queue": 0, "wait": 0.0},
+}
+
+# A turned-away stream reconnects after at least this long
+STREAM_RETRY_SECONDS = 30
+
+_gates = {}
+
+
+class Gate:
+    """A concurrency limit with a bounded wait queue for one cost class."""
+
+    def __init__(self, name, limit, queue, wait):
+        self.name = name
+        self.limit = limit
+        self.max_queue = queue
+        self.wait = wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_seconds = 0.0  # moving average of how long a request holds a slot
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed. Returns False if rejected."""
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                deadline = time.monotonic() + self.wait
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self, held_seconds):
+        """Free a slot and wake one queued request."""
+        with self._condition:
+            self.active -= 1
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * held_seconds
+            self._condition.notify()
+
+    def retry_after(self):
+        """Estimate (whole seconds) when a slot is likely to be free again."""
+        backlog = (self.waiting + self.limit) / self.limit
+        return max(1, math.ceil(self.avg_seconds * backlog))
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "queue_limit": self.max_queue,
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_seconds": round(self.avg_seconds, 4),
+            }
+
+
+def classify():
+    """Decide which cost class (if any) the current request belongs to."""
+    endpoint = request.endpoint
+    if endpoint == "tasks.task_list":
+        # Only the unfiltered list is expensive — any filter narrows the query
+        if not any(request.args.get(name) for name in TASK_LIST.parameters):
+            return "report"
+    elif endpoint == "reports.report":
+        return "report"  # cheap once warm, but the first call builds the snapshot
+    elif endpoint == "dashboard.dashboard":
+        # Admins see organisation-wide figures; other roles are scoped
+        if session.get("role") == "admin":
+            return "report"
+    elif endpoint in ("attachments.upload_file", "attachments.download_all", "tasks.import_tasks"):
+        return "upload"  # bulk file transfer — a ZIP holds its slot while it streams
+    elif endpoint == "auth.login" and request.method == "POST":
+        return "login"  # password hashing is deliberately slow
+    elif endpoint == "dashboard.stream":
+        return "stream"  # holds its thread while the dashboard is open
+    return None
+
+
+def stats():
+    """Counters for every cost class in this worker process."""
+    return {name: gate.stats() for name, gate in _gates.items()}
+
+
+def init_app(app):
+    """Create the gates and hook them into every request."""
+    limits = {name: dict(values) for name, values in DEFAULT_LIMITS.items()}
+    for name, overrides in app.config.get("ADMISSION_LIMITS", {}).items():
+        limits.setdefault(name, {}).update(overrides)
+
+    _gates.clear()
+    for name, values in limits.items():
+        _gates[name] = Gate(name, values["limit"], values["queue"], values["wait"])
+
+    @app.before_request
+    def _admit():
+        gate = _gates.get(classify())
+        if gate is None:
+            return None
+        if not gate.acquire():
+            if gate.name == "stream":
+                # EventSource gives up for good on a 503. An empty stream
+                # whose retry field (ms) is the estimated wait makes it
+                # quietly reconnect later instead.
+                seconds = max(STREAM_RETRY_SECONDS, gate.retry_after())
+                return Response(
+                    f"retry: {seconds * 1000}\n\n",
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"},
+                )
+            return Response(
+                "The server is busy right now. Please try again in a moment.",
+                status=503,
+                headers={"Retry-After": str(gate.retry_after())},
+                mimetype="text/plain",
+            )
+        g.admission_gate = gate
+        g.admission_started = time.monotonic()
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            gate.release(time.monotonic() - g.pop("admission_started"))
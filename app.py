@@ -12,23 +12,35 @@ Why Flask + Jinja2?
 - Explicit: no magic — every route, query, and template call is visible
 """
 
+import time
+
+# Measure how long our imports take — reported by create_app() below.
+# A new worker process should be ready to serve in tens of milliseconds.
+_IMPORT_STARTED = time.perf_counter()
+
 import os
-from flask import Flask, render_template, flash, redirect, request
+from flask import Flask, render_template, flash, redirect, request, url_for
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 # This keeps secrets out of source code — a key security practice
 load_dotenv()
 
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
 
-def create_app():
+def create_app(test_config=None):
     """Application factory pattern — creates and configures the Flask app.
 
     Why use a factory?
     - Allows different configs for dev/test/production
     - Makes the app testable
     - Professional best practice
+
+    test_config: optional dict of settings that override the environment,
+    e.g. create_app({"TESTING": True, "DATABASE_PATH": ":memory:"})
     """
+    boot_started = time.perf_counter()
     app = Flask(
         __name__,
         static_folder="static",
@@ -42,31 +54,155 @@ def create_app():
         os.getenv("MAX_CONTENT_LENGTH", 5 * 1024 * 1024)
     )  # 5MB default
 
+    # Database location — ":memory:" gives a shared in-memory database
+    # that disappears when the process exits (tests and benchmarks)
+    app.config["DATABASE_PATH"] = os.getenv("DATABASE_PATH", "")
+
+    # Sharded storage (see database.py) — one tasks file per department
+    app.config["DATABASE_SHARDED"] = os.getenv("DATABASE_SHARDED", "0") == "1"
+
+    # Archive of old closed tasks — defaults to <database>_archive.db
+    app.config["ARCHIVE_DATABASE_PATH"] = os.getenv("ARCHIVE_DATABASE_PATH", "")
+
+    # Online backups (see backup.py) — 0 hours = only via `flask backup`
+    app.config["BACKUP_FOLDER"] = os.getenv("BACKUP_FOLDER", "backups")
+    app.config["BACKUP_KEEP"] = int(os.getenv("BACKUP_KEEP", "7"))
+    app.config["BACKUP_INTERVAL_HOURS"] = float(os.getenv("BACKUP_INTERVAL_HOURS", "0"))
+
+    # Due-date reminders (see reminders.py) — off unless REMINDERS_ENABLED=1
+    app.config["REMINDERS_ENABLED"] = os.getenv("REMINDERS_ENABLED", "0") == "1"
+    app.config["REMINDER_DAYS_BEFORE"] = int(os.getenv("REMINDER_DAYS_BEFORE", "1"))
+    app.config["REMINDER_ESCALATE_AFTER_DAYS"] = int(os.getenv("REMINDER_ESCALATE_AFTER_DAYS", "1"))
+    app.config["REMINDER_NOTIFIER"] = os.getenv("REMINDER_NOTIFIER", "file")
+    app.config["REMINDER_FILE"] = os.getenv("REMINDER_FILE", "reminders.log")
+    app.config["SMTP_HOST"] = os.getenv("SMTP_HOST", "localhost")
+    app.config["SMTP_PORT"] = int(os.getenv("SMTP_PORT", "25"))
+    app.config["SMTP_SENDER"] = os.getenv("SMTP_SENDER", "portal@localhost")
+    app.config["SMTP_USERNAME"] = os.getenv("SMTP_USERNAME", "")
+    app.config["SMTP_PASSWORD"] = os.getenv("SMTP_PASSWORD", "")
+    app.config["SMTP_STARTTLS"] = os.getenv("SMTP_STARTTLS", "0") == "1"
+
+    # Reporting snapshot (see reporting.py) — empty = in memory only;
+    # a folder lets workers memory-map a shared copy from disk
+    app.config["REPORT_SNAPSHOT_DIR"] = os.getenv("REPORT_SNAPSHOT_DIR", "")
+
+    # Audit trail (see audit.py) — events are queued and written in
+    # batches by a background thread in each worker
+    app.config["AUDIT_QUEUE_SIZE"] = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    app.config["AUDIT_BATCH_SIZE"] = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    app.config["AUDIT_FLUSH_SECONDS"] = float(os.getenv("AUDIT_FLUSH_SECONDS", "1"))
+
+    # Memory tracing (see memtrace.py) — fraction of requests traced
+    # with tracemalloc; 0 = off. Keep it low in production (e.g. 0.01).
+    app.config["MEMORY_SAMPLE_RATE"] = float(os.getenv("MEMORY_SAMPLE_RATE", "0"))
+    app.config["MEMORY_TRACE_FRAMES"] = int(os.getenv("MEMORY_TRACE_FRAMES", "8"))
+
+    # ASGI mode (see asgi.py) — threads per worker for blocking file and
+    # database work in the async views, and for the sync Flask routes
+    app.config["ASGI_IO_THREADS"] = int(os.getenv("ASGI_IO_THREADS", "4"))
+    app.config["ASGI_WSGI_THREADS"] = int(os.getenv("ASGI_WSGI_THREADS", "8"))
+
     # Session cookie settings
     app.config["SESSION_COOKIE_HTTPONLY"] = True
 
+    if test_config:
+        app.config.update(test_config)
+
     # Ensure upload folder exists
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
     # --- Database initialisation ---
-    from database import init_db
+    # init_db() only does schema work when PRAGMA user_version says the
+    # file is behind — on a normal boot it is a single cheap read
+    import database
+
+    step_started = time.perf_counter()
+    database.configure(app.config["DATABASE_PATH"] or database.DATABASE_PATH,
+                       sharded=app.config["DATABASE_SHARDED"])
+    schema_changed = database.init_db()
+    schema_seconds = time.perf_counter() - step_started
+
+    # --- Memory tracing ---
+    # Registered first so a traced request covers every other hook too
+    import memtrace
+
+    memtrace.init_app(app)
+
+    # --- Cache coherence ---
+    # One cheap PRAGMA per request tells us whether another worker has
+    # written since our caches were filled (see cache.py)
+    import cache
+
+    cache.init_app(app)
+
+    # --- Admission control ---
+    # Caps concurrent expensive requests so cheap ones never queue
+    # behind them; over-limit requests get a fast 503 (see admission.py)
+    import admission
 
-    init_db()
+    admission.init_app(app)
+
+    # --- Archival ---
+    # Old closed tasks move to a separate database file so everyday
+    # queries only see the hot set (see archival.py)
+    import archival
+
+    archival.init_app(app)
+
+    # --- Backups ---
+    # Consistent copies of the database and uploads while the app keeps
+    # serving requests (see backup.py)
+    import backup
+
+    backup.init_app(app)
+
+    # --- Due-date reminders ---
+    # A timer heap over open tasks' due dates, kept current by the
+    # change feed, sends reminders and escalations (see reminders.py)
+    import reminders
+
+    reminders.init_app(app)
+
+    # --- Audit trail ---
+    # Write-behind: handlers queue events, a thread writes them in
+    # batches, and whatever is left is written at exit (see audit.py)
+    import audit
+
+    audit.init_app(app)
+
+    # --- Reporting ---
+    # Columnar task snapshot for the management reports (see reporting.py)
+    import reporting
+
+    reporting.init_app(app)
 
     # --- Register route blueprints ---
     # Blueprints keep routes organised by feature — each feature gets its own file
-    # No /api prefix — routes serve HTML pages directly
+    # Page routes have no /api prefix — they serve HTML directly.
+    # The versioned JSON API for integrations lives under /api/v1.
+    step_started = time.perf_counter()
     from routes.auth import auth_bp
     from routes.tasks import tasks_bp
     from routes.clients import clients_bp
     from routes.dashboard import dashboard_bp
     from routes.attachments import attachments_bp
+    from routes.admin import admin_bp
+    from routes.archive import archive_bp
+    from routes.reports import reports_bp
+    from routes.typeahead import typeahead_bp
+    from routes.api import api_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(tasks_bp, url_prefix="/tasks")
     app.register_blueprint(clients_bp, url_prefix="/clients")
     app.register_blueprint(dashboard_bp, url_prefix="/dashboard")
     app.register_blueprint(attachments_bp, url_prefix="/attachments")
+    app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(archive_bp, url_prefix="/archive")
+    app.register_blueprint(reports_bp, url_prefix="/reports")
+    app.register_blueprint(typeahead_bp, url_prefix="/typeahead")
+    app.register_blueprint(api_bp, url_prefix="/api/v1")
+    blueprint_seconds = time.perf_counter() - step_started
 
     # --- Error handlers ---
     @app.errorhandler(404)
@@ -80,6 +216,24 @@ def create_app():
         flash("File too large. Maximum size is 5MB.", "error")
         return redirect(request.referrer or url_for("dashboard.dashboard"))
 
+    # --- Startup timings ---
+    # Kept in config so they can be inspected (flask startup-report)
+    # and logged, making slow boots visible instead of a mystery
+    app.config["STARTUP_TIMINGS"] = {
+        "import_ms": round(IMPORT_SECONDS * 1000, 2),
+        "schema_ms": round(schema_seconds * 1000, 2),
+        "schema_changed": schema_changed,
+        "blueprints_ms": round(blueprint_seconds * 1000, 2),
+        "boot_ms": round((time.perf_counter() - boot_started) * 1000, 2),
+    }
+    app.logger.info("Startup timings: %s", app.config["STARTUP_TIMINGS"])
+
+    @app.cli.command("startup-report")
+    def startup_report():
+        """Print how long importing and booting the app took."""
+        for name, value in app.config["STARTUP_TIMINGS"].items():
+            print(f"{name:>15}: {value}")
+
     return app
 
 
@@ -0,0 +1,279 @@
+"""
+Archival — moves old closed tasks out of the live ("hot") tables.
+
+Completed and cancelled tasks are kept forever, but almost nobody looks
+at them after a few months. While they sit in the tasks table, every
+task list, dashboard COUNT and workload join has to step over them.
+
+This module moves closed tasks older than a configurable age — and
+their attachment rows — into a separate archive database file that is
+ATTACHed to the connection only when needed:
+
+    mj_limited.db          → the hot set: open work and recent history
+    mj_limited_archive.db  → archived tasks and attachments (cold)
+
+Everyday queries never open the archive file. It stays searchable and
+exportable through the Archive page (routes/archive.py).
+
+Run it from the command line (or a nightly cron job):
+    flask --app app archive-tasks --days 365
+
+How the move stays safe:
+    - Work is done in batches (default 500 tasks), each its own
+      transaction: copy to the archive, then delete from the hot tables.
+      If anything fails, that batch rolls back — a task is never lost
+      or in both places.
+    - Between batches we pause briefly, so request traffic can get the
+      write lock instead of waiting for one giant transaction.
+    - Attachment FILES stay in uploads/ — only their rows move.
+    - Status history and rollups are untouched: the work still happened.
+
+Archival works on single-file storage only: with sharded storage (see
+database.py) the command refuses to run and there is nothing to search.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import database
+
+ARCHIVE_DATABASE_PATH = None  # None = derive from database.DATABASE_PATH
+
+DEFAULT_AFTER_DAYS = 365
+DEFAULT_BATCH_SIZE = 500
+PAUSE_BETWEEN_BATCHES = 0.05
+
+# Live tables whose rows move into the archive (plus an archived_at column)
+_ARCHIVED_TABLES = ("tasks", "attachments")
+
+_MEMORY_URI = "file:mj_limited_archive?mode=memory&cache=shared"
+
+# Like database._memory_anchor: keeps the in-memory archive alive
+# between the connections that ATTACH it
+_memory_anchor = None
+
+# Archive paths whose tables this process has already created or updated
+_prepared = set()
+_prepare_lock = threading.Lock()
+
+
+def configure(path):
+    """Use a specific archive database file (called by init_app)."""
+    global ARCHIVE_DATABASE_PATH
+    ARCHIVE_DATABASE_PATH = path
+
+
+def archive_path():
+    """Where the archive lives — by default, next to the main database."""
+    if ARCHIVE_DATABASE_PATH:
+        return ARCHIVE_DATABASE_PATH
+    if database.DATABASE_PATH == ":memory:":
+        # Connections to the shared in-memory database are opened as URIs,
+        # so the archive can be a shared in-memory database too
+        return _MEMORY_URI
+    stem, extension = os.path.splitext(database.DATABASE_PATH)
+    return f"{stem}_archive{extension or '.db'}"
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def attach(conn):
+    """ATTACH the archive database as 'archive'.
+
+    The first attach of each archive file in a process also creates or
+    updates its tables (_prepare); every later one is just the ATTACH,
+    so an archive page view does no schema work and no write.
+    """
+    global _memory_anchor
+    path = archive_path()
+    if path == _MEMORY_URI and _memory_anchor is None:
+        _memory_anchor = sqlite3.connect(path, uri=True, check_same_thread=False)
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    if path not in _prepared:
+        with _prepare_lock:
+            if path not in _prepared:
+                _prepare(conn)
+                _prepared.add(path)
+
+
+def _prepare(conn):
+    """Create the archive tables and indexes if needed. `conn` has it attached.
+
+    The archive tables mirror the live ones plus an archived_at column.
+    If the live table has gained columns since the archive was created,
+    they are added here, so INSERT ... SELECT keeps lining up.
+    """
+    for table in _ARCHIVED_TABLES:
+        live_columns = _columns(conn, "main", table)
+        archived_columns = _columns(conn, "archive", table)
+        if not archived_columns:
+            conn.execute(
+                f"CREATE TABLE archive.{table} AS SELECT * FROM main.{table} WHERE 0"
+            )
+            conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN archived_at TIMESTAMP")
+        else:
+            for column in live_columns:
+                if column not in archived_columns:
+                    conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archived_tasks_id ON tasks (id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archive.idx_archived_tasks_updated "
+        "ON tasks (department, updated_at)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archive.idx_archived_attachments_task "
+        "ON attachments (task_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archive.idx_archived_attachments_filename "
+        "ON attachments (filename)"
+    )
+    conn.commit()
+
+
+def archive_closed_tasks(after_days=DEFAULT_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                         pause=PAUSE_BETWEEN_BATCHES):
+    """Move closed tasks not updated for `after_days` days into the archive.
+
+    Returns (tasks_moved, attachments_moved).
+    """
+    if database.SHARDED:
+        raise RuntimeError("Archival needs single-file storage (DATABASE_SHARDED is on)")
+    conn = database.get_db()
+    attach(conn)
+    conn.isolation_level = None  # explicit transactions below
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+
+    task_columns = ", ".join(_columns(conn, "main", "tasks"))
+    attachment_columns = ", ".join(_columns(conn, "main", "attachments"))
+
+    tasks_moved = attachments_moved = 0
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM temp.archive_batch")
+                # Uses the partial index idx_tasks_closed_updated
+                conn.execute(
+                    """
+                    INSERT INTO temp.archive_batch (id)
+                    SELECT id FROM main.tasks
+                    WHERE status IN ('completed', 'cancelled')
+                      AND updated_at < DATETIME('now', ?)
+                    LIMIT ?
+                    """,
+                    (f"-{int(after_days)} days", batch_size),
+                )
+                batch = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+                if batch == 0:
+                    conn.execute("COMMIT")
+                    break
+
+                conn.execute(
+                    f"""INSERT INTO archive.tasks ({task_columns}, archived_at)
+                        SELECT {task_columns}, CURRENT_TIMESTAMP FROM main.tasks
+                        WHERE id IN (SELECT id FROM temp.archive_batch)"""
+                )
+                attachments_moved += conn.execute(
+                    f"""INSERT INTO archive.attachments ({attachment_columns}, archived_at)
+                        SELECT {attachment_columns}, CURRENT_TIMESTAMP FROM main.attachments
+                        WHERE task_id IN (SELECT id FROM temp.archive_batch)"""
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM main.attachments WHERE task_id IN (SELECT id FROM temp.archive_batch)"
+                )
+                conn.execute(
+                    "DELETE FROM main.tasks WHERE id IN (SELECT id FROM temp.archive_batch)"
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            tasks_moved += batch
+            if batch < batch_size:
+                break
+            time.sleep(pause)  # let request traffic take the write lock
+    finally:
+        conn.close()
+    return tasks_moved, attachments_moved
+
+
+def search(conn, search="", department="", status="", before_id=None, limit=50):
+    """Search archived tasks, newest id first. `conn` must be attach()ed.
+
+    Returns (rows, next_before_id) — pass next_before_id back in to get
+    the next page (keyset pagination, as in the JSON API).
+    """
+    query = """
+        SELECT t.id, t.title, t.status, t.priority, t.department, t.due_date,
+               t.created_at, t.updated_at, t.archived_at,
+               u.full_name AS assigned_name, c.company_name AS client_name,
+               (SELECT COUNT(*) FROM archive.attachments a WHERE a.task_id = t.id)
+                   AS attachment_count
+        FROM archive.tasks t
+        LEFT JOIN main.users u ON t.assigned_to = u.id
+        LEFT JOIN main.clients c ON t.client_id = c.id
+        WHERE 1=1
+    """
+    params = []
+    if search:
+        query += " AND (t.title LIKE ? OR t.description LIKE ?)"
+        params.extend([f"%{search}%", f"%{search}%"])
+    if department:
+        query += " AND t.department = ?"
+        params.append(department)
+    if status:
+        query += " AND t.status = ?"
+        params.append(status)
+    if before_id:
+        query += " AND t.id < ?"
+        params.append(before_id)
+    query += " ORDER BY t.id DESC"
+
+    if limit is None:
+        return conn.execute(query, params), None
+
+    rows = conn.execute(query + " LIMIT ?", params + [limit + 1]).fetchall()
+    next_before_id = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_before_id
+
+
+def find_attachment(filename):
+    """Look up an archived attachment row by stored filename (or None)."""
+    if database.SHARDED:
+        return None  # sharded storage has no archive
+    conn = database.get_db()
+    try:
+        attach(conn)
+        return conn.execute(
+            "SELECT * FROM archive.attachments WHERE filename = ?", (filename,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def init_app(app):
+    """Read archive settings from config and register the CLI command."""
+    import click
+
+    if app.config.get("ARCHIVE_DATABASE_PATH"):
+        configure(app.config["ARCHIVE_DATABASE_PATH"])
+
+    @app.cli.command("archive-tasks")
+    @click.option("--days", default=DEFAULT_AFTER_DAYS, show_default=True,
+                  help="Archive closed tasks not updated for this many days.")
+    @click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True,
+                  help="Tasks moved per transaction.")
+    def archive_tasks_command(days, batch_size):
+        """Move old completed/cancelled tasks into the archive database."""
+        try:
+            tasks_moved, attachments_moved = archive_closed_tasks(days, batch_size)
+        except RuntimeError as exc:
+            raise click.ClickException(str(exc))
+        print(f"Archived {tasks_moved} task(s) and {attachments_moved} attachment(s) "
+              f"into {archive_path()}")
@@ -0,0 +1,385 @@
+"""
+ASGI Mode — attachment transfers and live streams without tying up worker threads.
+
+The problem:
+    Under Gunicorn every request holds one worker thread from its first
+    byte to its last. An upload or download over a slow link can take
+    minutes, and most of that time the thread just waits on the network.
+    A handful of them can occupy every thread while quick page views
+    queue behind them.
+
+The solution:
+    Run the app under an ASGI server (Uvicorn) instead. This module is
+    the ASGI application:
+      - The attachment transfers (upload, download, download-all ZIP)
+        are async views in routes/attachments_async.py. While they wait
+        for the client they hold NO thread — a waiting transfer is just
+        a small object on the event loop, so thousands cost almost
+        nothing.
+      - The dashboard's live stream (GET /dashboard/stream) is an async
+        view too (routes/dashboard_async.py): an open dashboard waits on
+        the change feed as a coroutine, not a thread.
+      - Their blocking work — database calls and reading or writing one
+        64 KB chunk of a file — runs on a small thread pool (IO_THREADS).
+        asyncio has no portable async file API; libraries like aiofiles
+        use threads the same way.
+      - EVERY other route is the normal Flask app, called through a WSGI
+        bridge on its own pool of WSGI_THREADS (the same job as
+        Gunicorn's --threads). Nothing in the sync blueprints changes.
+
+    URLs are matched with Flask's own URL map, so a route behaves the
+    same under either server; only which code serves it differs.
+
+Usage:
+    pip install uvicorn
+    python serve.py --asgi                      # Gunicorn + Uvicorn workers
+    uvicorn --factory asgi:create_asgi_app      # one process, for trying it out
+
+What the async views do NOT do: the Flask request hooks
+(before_request/teardown) do not run for them, so they are not counted
+by admission control or memory tracing — they hold no thread to protect.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import io
+import os
+import sys
+
+from itsdangerous import BadSignature
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import dump_cookie
+from werkzeug.sansio.request import Request
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_IO_THREADS = 4
+DEFAULT_WSGI_THREADS = 8
+
+_DONE = object()
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the request body was read."""
+
+
+class AsgiResponse:
+    """What an async view returns: a status, headers and a body.
+
+    body is bytes, or an async iterator of bytes to stream.
+    """
+
+    def __init__(self, body=b"", status=200, headers=None, mimetype=None):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.headers = Headers(headers)
+        if mimetype:
+            self.headers.setdefault("Content-Type", mimetype)
+
+
+class AsgiRequest(Request):
+    """Werkzeug's sans-IO request (args, cookies, accept_encodings, ...)
+    plus the Flask session and helpers the async views need."""
+
+    def __init__(self, app, scope, receive, pool):
+        headers = Headers([
+            (name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]
+        ])
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        super().__init__(
+            method=scope["method"],
+            scheme=scope.get("scheme", "http"),
+            server=scope.get("server"),
+            root_path=root_path,
+            path=path,
+            query_string=scope.get("query_string", b""),
+            headers=headers,
+            remote_addr=(scope.get("client") or (None,))[0],
+        )
+        self.app = app
+        self._receive = receive
+        self._pool = pool
+        self._urls = app.url_map.bind(
+            self.host, script_name=root_path or None, url_scheme=self.scheme
+        )
+        self.session = _load_session(app, self.cookies)
+
+    async def run(self, function, *args):
+        """Run blocking work (a query, one file chunk) on the I/O pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(function, *args))
+
+    async def stream(self):
+        """The request body, chunk by chunk as the client sends it."""
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            if message.get("body"):
+                yield message["body"]
+            if not message.get("more_body", False):
+                return
+
+    async def disconnected(self):
+        """Return once the client has gone away (for long-lived responses)."""
+        while (await self._receive())["type"] != "http.disconnect":
+            pass
+
+    async def file_chunks(self, source):
+        """Stream an open file (or any .read()-able object), then close it."""
+        try:
+            while True:
+                chunk = await self.run(source.read, CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            await self.run(source.close)
+
+    async def iterate(self, iterator):
+        """Stream a blocking generator, advancing it on the I/O pool."""
+        try:
+            while True:
+                chunk = await self.run(next, iterator, _DONE)
+                if chunk is _DONE:
+                    return
+                if chunk:
+                    yield chunk
+        finally:
+            await self.run(iterator.close)
+
+    def flash(self, message, category="message"):
+        """Same as flask.flash(): shown on the next page the user sees."""
+        flashes = self.session.get("_flashes", [])
+        flashes.append((category, message))
+        self.session["_flashes"] = flashes
+
+    def url_for(self, endpoint, **values):
+        return self._urls.build(endpoint, values)
+
+    def redirect(self, endpoint, **values):
+        return AsgiResponse(status=302, headers={"Location": self.url_for(endpoint, **values)})
+
+
+def _load_session(app, cookies):
+    """Read Flask's signed session cookie, exactly as Flask would."""
+    interface = app.session_interface
+    serializer = interface.get_signing_serializer(app)
+    value = cookies.get(interface.get_cookie_name(app))
+    if serializer is None or not value:
+        return interface.session_class()
+    try:
+        data = serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return interface.session_class()
+    return interface.session_class(data)
+
+
+def _session_cookie(app, session):
+    """Set-Cookie header value for a changed session."""
+    interface = app.session_interface
+    return dump_cookie(
+        interface.get_cookie_name(app),
+        interface.get_signing_serializer(app).dumps(dict(session)),
+        expires=interface.get_expiration_time(app, session),
+        domain=interface.get_cookie_domain(app),
+        path=interface.get_cookie_path(app),
+        secure=interface.get_cookie_secure(app),
+        httponly=interface.get_cookie_httponly(app),
+        samesite=interface.get_cookie_samesite(app),
+        partitioned=interface.get_cookie_partitioned(app),
+    )
+
+
+def _header_list(headers):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+class AsgiApp:
+    """The ASGI application: async views for transfers and streams, Flask for the rest."""
+
+    def __init__(self, app, io_threads=DEFAULT_IO_THREADS, wsgi_threads=DEFAULT_WSGI_THREADS):
+        from routes import attachments_async, dashboard_async
+
+        self.app = app
+        self.views = {**attachments_async.ASYNC_VIEWS, **dashboard_async.ASYNC_VIEWS}
+        self.io_threads = io_threads
+        self.wsgi_threads = wsgi_threads
+        self._pid = None
+
+    def _pools(self):
+        """This process's thread pools (threads do not survive fork())."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._io_pool = concurrent.futures.ThreadPoolExecutor(
+                self.io_threads, thread_name_prefix="asgi-io"
+            )
+            self._wsgi_pool = concurrent.futures.ThreadPoolExecutor(
+                self.wsgi_threads, thread_name_prefix="asgi-wsgi"
+            )
+        return self._io_pool, self._wsgi_pool
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return  # no websockets here
+
+        io_pool, wsgi_pool = self._pools()
+        view, arguments = self._match(scope)
+        if view is None:
+            await self._wsgi(scope, receive, send, wsgi_pool)
+            return
+
+        request = AsgiRequest(self.app, scope, receive, io_pool)
+        try:
+            response = await view(request, **arguments)
+        except ClientDisconnected:
+            return
+        except HTTPException as error:
+            response = AsgiResponse(error.description, error.code, mimetype="text/plain")
+        await self._respond(send, request, response)
+
+    def _match(self, scope):
+        """(async view, URL arguments) for the request, or (None, None) for Flask."""
+        adapter = self.app.url_map.bind("localhost", script_name=scope.get("root_path") or None)
+        try:
+            endpoint, arguments = adapter.match(scope["path"], scope["method"])
+        except HTTPException:
+            return None, None  # let Flask produce its own 404 / 405
+        if scope["method"] not in ("GET", "POST"):
+            return None, None  # e.g. HEAD: Flask answers it without a body
+        return self.views.get(endpoint), arguments
+
+    async def _respond(self, send, request, response):
+        headers = Headers(response.headers)
+        if request.session.modified:
+            headers.add("Set-Cookie", _session_cookie(self.app, request.session))
+        if isinstance(response.body, bytes):
+            headers.setdefault("Content-Length", str(len(response.body)))
+        await send({"type": "http.response.start", "status": response.status,
+                    "headers": _header_list(headers.items())})
+        if isinstance(response.body, bytes):
+            await send({"type": "http.response.body", "body": response.body})
+            return
+        try:
+            async for chunk in response.body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.body.aclose()  # closes the file if the client left early
+
+    # --- The WSGI bridge -------------------------------------------------
+
+    async def _wsgi(self, scope, receive, send, pool):
+        """Serve the request with the Flask app, on the WSGI thread pool."""
+        # Page forms are small; read at most one byte past the upload
+        # limit, so Flask answers 413 without us holding a huge body
+        limit = self.app.config.get("MAX_CONTENT_LENGTH")
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body", False) or (limit and len(body) > limit):
+                break
+
+        environ = _environ(scope, bytes(body))
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = headers
+            return lambda data: None  # the legacy write() is not supported
+
+        def begin():
+            result = self.app(environ, start_response)
+            iterator = iter(result)
+            return result, iterator, next(iterator, _DONE)
+
+        loop = asyncio.get_running_loop()
+        result, iterator, chunk = await loop.run_in_executor(pool, begin)
+        try:
+            await send({"type": "http.response.start", "status": started["status"],
+                        "headers": _header_list(started["headers"])})
+            while chunk is not _DONE:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(pool, next, iterator, _DONE)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(pool, result.close)  # Flask's teardown
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._pid == os.getpid():
+                    self._io_pool.shutdown(wait=True)
+                    self._wsgi_pool.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _environ(scope, body):
+    """The WSGI environ for an ASGI HTTP scope (PEP 3333)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI strings are bytes decoded as latin-1
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        if key in environ:
+            value = environ[key] + ("; " if name == "COOKIE" else ", ") + value
+        environ[key] = value
+    if "CONTENT_LENGTH" not in environ and body:
+        environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def create_asgi_app(app=None, io_threads=None, wsgi_threads=None):
+    """Wrap the Flask app (created if not given) for an ASGI server."""
+    if app is None:
+        from app import create_app
+
+        app = create_app()
+    return AsgiApp(
+        app,
+        io_threads or int(app.config.get("ASGI_IO_THREADS") or DEFAULT_IO_THREADS),
+        wsgi_threads or int(app.config.get("ASGI_WSGI_THREADS") or DEFAULT_WSGI_THREADS),
+    )
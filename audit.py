@@ -0,0 +1,263 @@
+"""
+Audit Log — who created, changed or deleted what, written behind.
+
+The problem:
+    We need a trail of every create, edit, reassignment, status change
+    and delete on tasks, clients and attachments. Adding a second INSERT
+    and COMMIT to every handler would double the cost of each write:
+    a commit is the expensive part (the journal is synced to disk).
+
+The solution — write-behind:
+    Handlers call record(), which only appends the event to an
+    in-memory queue and returns. A background thread in each worker
+    takes up to BATCH_SIZE events at a time and writes them with ONE
+    executemany and ONE commit, so a hundred edits cost one audit
+    commit instead of a hundred. Events wait at most FLUSH_SECONDS.
+
+    record() is called AFTER the handler's own commit, so a write that
+    was rolled back never appears in the trail.
+
+Backpressure:
+    The queue is bounded (QUEUE_SIZE). If the database falls so far
+    behind that it fills, record() waits for the flusher to make room
+    — the request slows down instead of memory growing without limit.
+    If there is still no room after BLOCK_SECONDS, the request writes a
+    batch itself. Events are never silently dropped.
+
+Shutdown:
+    An atexit hook writes whatever is still queued when a worker exits
+    (Gunicorn stops workers with SIGTERM, which runs atexit handlers).
+    A worker that is killed outright loses at most FLUSH_SECONDS of events.
+
+Reading:
+    GET /admin/audit (admin only) searches the trail by entity, record
+    id, user and action — each filter has an index that hands back rows
+    newest first, so a page is found without sorting the whole table.
+"""
+
+import atexit
+import collections
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from flask import has_request_context, session
+
+import database
+
+ENTITIES = ("task", "client", "attachment")
+ACTIONS = ("create", "import", "update", "reassign", "status", "delete")
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_SECONDS = 1.0
+BLOCK_SECONDS = 2.0
+
+_INSERT = """
+    INSERT INTO audit_log (occurred_at, user_id, action, entity, entity_id, details)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+class AuditWriter:
+    """A bounded queue of audit events and the thread that flushes it."""
+
+    def __init__(self, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 flush_seconds=FLUSH_SECONDS, block_seconds=BLOCK_SECONDS):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.block_seconds = block_seconds
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()  # one batch written at a time
+        self._reset()
+
+    def _reset(self):
+        self._queue = collections.deque()
+        self._pid = os.getpid()
+        self._thread = None
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.waits = 0        # times a request waited for room (backpressure)
+        self.failures = 0
+        self.last_error = None
+
+    def ensure_started(self):
+        """Start the flush thread in this process (threads do not survive fork())."""
+        with self._condition:
+            if self._pid != os.getpid():
+                # A forked child: the queued events are the parent's to write
+                self._reset()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="audit", daemon=True)
+            self._thread.start()
+
+    def record(self, event):
+        """Queue one event tuple (see _INSERT), waiting if the queue is full."""
+        self.ensure_started()
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                self.waits += 1
+                self._condition.notify_all()  # wake the flusher now
+                self._condition.wait_for(
+                    lambda: len(self._queue) < self.queue_size, self.block_seconds
+                )
+            full = len(self._queue) >= self.queue_size
+            if not full:
+                self._queue.append(event)
+                self.recorded += 1
+                if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                    # The first event starts the FLUSH_SECONDS clock; a
+                    # full batch is written straight away
+                    self._condition.notify_all()
+        if full:
+            # Still no room: write a batch from this request, then queue.
+            # If even that fails the database is refusing writes, so the
+            # handlers producing events are failing too — keep the event.
+            try:
+                self._flush_batch()
+            except sqlite3.Error:
+                pass
+            with self._condition:
+                self._queue.append(event)
+                self.recorded += 1
+
+    def _flush_batch(self):
+        """Write up to batch_size queued events. Returns how many were written."""
+        with self._flush_lock:
+            with self._condition:
+                batch = list(itertools.islice(self._queue, self.batch_size))
+            if not batch:
+                return 0
+            conn = database.connect()
+            try:
+                conn.executemany(_INSERT, batch)
+                conn.commit()
+            except sqlite3.Error as exc:
+                with self._condition:
+                    self.failures += 1
+                    self.last_error = str(exc)
+                raise
+            finally:
+                conn.close()
+            # Only this lock's holder removes events, so the first
+            # len(batch) are still exactly the ones we wrote
+            with self._condition:
+                for _ in batch:
+                    self._queue.popleft()
+                self.written += len(batch)
+                self.batches += 1
+                self._condition.notify_all()  # room for any waiting request
+            return len(batch)
+
+    def flush(self):
+        """Write everything queued so far (shutdown and tests)."""
+        while self._flush_batch():
+            pass
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue)
+                # Give a burst the chance to fill a batch before writing
+                self._condition.wait_for(
+                    lambda: len(self._queue) >= self.batch_size, self.flush_seconds
+                )
+            try:
+                self.flush()
+            except sqlite3.Error:
+                time.sleep(self.flush_seconds)  # e.g. database locked — retry later
+
+    def close(self):
+        """atexit hook: write what is left, if this process owns the queue."""
+        if self._pid == os.getpid() and self._queue:
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # nothing more we can do while exiting
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queued": len(self._queue),
+                "queue_size": self.queue_size,
+                "recorded": self.recorded,
+                "written": self.written,
+                "batches": self.batches,
+                "waits": self.waits,
+                "failures": self.failures,
+                "last_error": self.last_error,
+            }
+
+
+# One writer per process
+writer = AuditWriter()
+atexit.register(writer.close)
+
+
+def record(action, entity, entity_id, details=None, user_id=None):
+    """Add an event to the audit trail (written within FLUSH_SECONDS).
+
+        audit.record("status", "task", task_id, {"from": "open", "to": "completed"})
+
+    Call it after the change has been committed. user_id defaults to the
+    logged-in user.
+    """
+    if user_id is None and has_request_context():
+        user_id = session.get("user_id")
+    writer.record((
+        time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),  # UTC, like CURRENT_TIMESTAMP
+        user_id,
+        action,
+        entity,
+        entity_id,
+        json.dumps(details, default=str) if details else None,
+    ))
+
+
+def search(conn, entity="", entity_id=None, user_id=None, action="", before_id=None, limit=50):
+    """Audit events, newest first. Returns (rows, next_before_id).
+
+    Same keyset pagination as archival.search(): pass next_before_id
+    back in for the next page.
+    """
+    query = """
+        SELECT a.id, a.occurred_at, a.user_id, a.action, a.entity, a.entity_id,
+               a.details, u.full_name AS user_name
+        FROM audit_log a
+        LEFT JOIN users u ON a.user_id = u.id
+        WHERE 1=1
+    """
+    params = []
+    if entity:
+        query += " AND a.entity = ?"
+        params.append(entity)
+        if entity_id is not None:
+            query += " AND a.entity_id = ?"
+            params.append(entity_id)
+    if user_id is not None:
+        query += " AND a.user_id = ?"
+        params.append(user_id)
+    if action:
+        query += " AND a.action = ?"
+        params.append(action)
+    if before_id:
+        query += " AND a.id < ?"
+        params.append(before_id)
+    query += " ORDER BY a.id DESC LIMIT ?"
+
+    rows = conn.execute(query, params + [limit + 1]).fetchall()
+    next_before_id = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_before_id
+
+
+def init_app(app):
+    """Apply the AUDIT_* settings to this process's writer."""
+    writer.queue_size = int(app.config.get("AUDIT_QUEUE_SIZE") or QUEUE_SIZE)
+    writer.batch_size = int(app.config.get("AUDIT_BATCH_SIZE") or BATCH_SIZE)
+    writer.flush_seconds = float(app.config.get("AUDIT_FLUSH_SECONDS") or FLUSH_SECONDS)
@@ -0,0 +1,335 @@
+"""
+Backups — consistent online copies of the database and uploads.
+
+Copying mj_limited.db with `cp` while the app is running is unsafe: if
+a write lands halfway through the copy, the backup is a torn mix of old
+and new pages that may not even open. Stopping the app to copy it means
+downtime.
+
+SQLite's online backup API (sqlite3.Connection.backup) solves this. It
+copies the database a few hundred pages at a time; between steps it
+sleeps, so request traffic can keep reading and writing. If a write
+changes pages that were already copied, SQLite restarts the copy, so
+the finished file is always one consistent moment in time.
+
+Each backup is a timestamped directory:
+
+    backups/20250301T020000Z/
+        mj_limited.db           ← online copy of the main database
+        mj_limited_archive.db   ← online copy of the archive (archival.py)
+        uploads/                ← hard links to every uploaded file
+        manifest.json           ← sizes and SHA-256 of everything above
+
+With sharded storage (see database.py) there is no archive; instead
+each department's shard is copied too (mj_limited_finance.db, ...).
+Each file is consistent on its own, but the files are copied one
+after another, not at one single moment.
+
+Uploaded files are never modified in place (each upload gets a new
+unique name), so a hard link is a free, instant snapshot: it costs no
+extra disk space and keeps the file even if the task is later deleted.
+Where hard links are impossible (backups on another disk) the file is
+copied instead.
+
+Run a backup from the command line (or cron):
+    flask --app app backup                  # back up, verify, rotate
+    flask --app app backup --verify-only    # check the existing backups
+
+Or set BACKUP_INTERVAL_HOURS and each worker starts a background thread;
+a lock file makes sure only one of them backs up at a time.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl
+    fcntl = None
+
+import archival
+import database
+
+BACKUP_FOLDER = "backups"
+KEEP_BACKUPS = 7
+
+# Pages copied per step, and the pause between steps. 256 pages of 4 KB
+# is 1 MB — a few milliseconds of holding the read lock at a time.
+PAGES_PER_STEP = 256
+PAUSE_BETWEEN_STEPS = 0.05
+
+MANIFEST_NAME = "manifest.json"
+_STAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+_PARTIAL_SUFFIX = ".partial"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_entry(path):
+    return {"size": os.path.getsize(path), "sha256": _sha256(path)}
+
+
+def _copy_database(source, destination, pages, pause, name="main"):
+    """Online-copy one database (`name` = main or an ATTACHed one) into a new file."""
+    target = sqlite3.connect(destination)
+    try:
+        source.backup(target, pages=pages, sleep=pause, name=name)
+    finally:
+        target.close()
+
+
+def _snapshot_uploads(upload_folder, destination):
+    """Hard-link (or copy) every uploaded file. Returns the manifest entries."""
+    files = {}
+    if not os.path.isdir(upload_folder):
+        return files
+    os.makedirs(destination)
+    for name in sorted(os.listdir(upload_folder)):
+        source = os.path.join(upload_folder, name)
+        if not os.path.isfile(source):
+            continue
+        target = os.path.join(destination, name)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)  # e.g. backups on a different filesystem
+        files[name] = _file_entry(target)
+    return files
+
+
+def create_backup(upload_folder, backup_folder=BACKUP_FOLDER,
+                  pages=PAGES_PER_STEP, pause=PAUSE_BETWEEN_STEPS):
+    """Take one backup and return its directory.
+
+    The backup is written to "<stamp>.partial" and only renamed when
+    complete, so a crash halfway never leaves something that looks like
+    a finished backup.
+    """
+    started = datetime.datetime.now(datetime.timezone.utc)
+    stamp = started.strftime(_STAMP_FORMAT)
+    final_dir = os.path.join(backup_folder, stamp)
+    work_dir = final_dir + _PARTIAL_SUFFIX
+    os.makedirs(work_dir)
+
+    try:
+        manifest = {
+            "created_at": started.isoformat(timespec="seconds"),
+            "schema_version": database.SCHEMA_VERSION,
+            "databases": {},
+            "uploads": {},
+        }
+
+        if database.SHARDED:
+            files = [(None, "main", "mj_limited.db")] + [
+                (department, "main", f"mj_limited_{database.shard_slug(department)}.db")
+                for department in database.SHARD_DEPARTMENTS
+            ]
+        else:
+            files = [(None, "main", "mj_limited.db"), (None, "archive", "mj_limited_archive.db")]
+        for department, schema, filename in files:
+            source = database.connect(department=department)
+            try:
+                if schema == "archive":
+                    archival.attach(source)
+                path = os.path.join(work_dir, filename)
+                _copy_database(source, path, pages, pause, name=schema)
+                manifest["databases"][filename] = _file_entry(path)
+            finally:
+                source.close()
+
+        manifest["uploads"] = _snapshot_uploads(upload_folder, os.path.join(work_dir, "uploads"))
+        manifest["seconds"] = round(
+            (datetime.datetime.now(datetime.timezone.utc) - started).total_seconds(), 2
+        )
+        with open(os.path.join(work_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    os.rename(work_dir, final_dir)
+    return final_dir
+
+
+def list_backups(backup_folder=BACKUP_FOLDER):
+    """Finished backup directories, oldest first."""
+    if not os.path.isdir(backup_folder):
+        return []
+    names = []
+    for name in os.listdir(backup_folder):
+        try:
+            datetime.datetime.strptime(name, _STAMP_FORMAT)
+        except ValueError:
+            continue  # .partial, the lock file, anything else
+        names.append(name)
+    return [os.path.join(backup_folder, name) for name in sorted(names)]
+
+
+def verify_backup(backup_dir):
+    """Check one backup against its manifest. Returns a list of problems (empty = OK).
+
+    Every file must match its recorded size and SHA-256, and every
+    database must pass SQLite's own PRAGMA integrity_check.
+    """
+    manifest_path = os.path.join(backup_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return ["manifest.json is missing"]
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    problems = []
+    expected = [(name, entry) for name, entry in manifest["databases"].items()]
+    expected += [(os.path.join("uploads", name), entry) for name, entry in manifest["uploads"].items()]
+    for name, entry in expected:
+        path = os.path.join(backup_dir, name)
+        if not os.path.exists(path):
+            problems.append(f"{name}: missing")
+        elif os.path.getsize(path) != entry["size"] or _sha256(path) != entry["sha256"]:
+            problems.append(f"{name}: contents do not match the manifest")
+
+    for name in manifest["databases"]:
+        path = os.path.join(backup_dir, name)
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        except sqlite3.DatabaseError as exc:
+            result = str(exc)
+        finally:
+            conn.close()
+        if result != "ok":
+            problems.append(f"{name}: integrity check failed ({result})")
+    return problems
+
+
+def rotate(backup_folder=BACKUP_FOLDER, keep=KEEP_BACKUPS):
+    """Delete all but the newest `keep` backups. Returns the deleted directories."""
+    backups = list_backups(backup_folder)
+    removed = backups[:max(len(backups) - keep, 0)]
+    for path in removed:
+        shutil.rmtree(path)
+    return removed
+
+
+def run(upload_folder, backup_folder=BACKUP_FOLDER, keep=KEEP_BACKUPS):
+    """Back up, verify the new backup, then rotate old ones.
+
+    Old backups are only rotated away once the new one has verified —
+    a failing backup never costs us a good one.
+    """
+    backup_dir = create_backup(upload_folder, backup_folder)
+    problems = verify_backup(backup_dir)
+    removed = [] if problems else rotate(backup_folder, keep)
+    return backup_dir, problems, removed
+
+
+class BackupScheduler:
+    """Background thread that takes a backup every `interval_hours`.
+
+    Every worker process starts one, but they share a lock file in the
+    backup folder: the first to get it checks how old the newest backup
+    is and only backs up when it is due. The others find it fresh.
+    """
+
+    CHECK_EVERY_SECONDS = 300
+
+    def __init__(self, upload_folder, backup_folder, keep, interval_hours):
+        self.upload_folder = upload_folder
+        self.backup_folder = backup_folder
+        self.keep = keep
+        self.interval = datetime.timedelta(hours=interval_hours)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self.last_result = None
+
+    def ensure_started(self):
+        """Start the thread in this process (threads do not survive fork())."""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="backup", daemon=True)
+            self._thread.start()
+
+    def _due(self):
+        backups = list_backups(self.backup_folder)
+        if not backups:
+            return True
+        newest = datetime.datetime.strptime(
+            os.path.basename(backups[-1]), _STAMP_FORMAT
+        ).replace(tzinfo=datetime.timezone.utc)
+        return datetime.datetime.now(datetime.timezone.utc) - newest >= self.interval
+
+    def run_if_due(self):
+        os.makedirs(self.backup_folder, exist_ok=True)
+        with open(os.path.join(self.backup_folder, ".lock"), "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None  # another worker is backing up right now
+            if not self._due():
+                return None
+            self.last_result = run(self.upload_folder, self.backup_folder, self.keep)
+            return self.last_result
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_if_due()
+            except (OSError, sqlite3.Error) as exc:
+                self.last_result = (None, [str(exc)], [])
+            time.sleep(self.CHECK_EVERY_SECONDS)
+
+
+scheduler = None
+
+
+def init_app(app):
+    """Read backup settings, register the CLI command and the scheduler."""
+    import click
+
+    backup_folder = app.config.get("BACKUP_FOLDER") or BACKUP_FOLDER
+    keep = int(app.config.get("BACKUP_KEEP") or KEEP_BACKUPS)
+
+    @app.cli.command("backup")
+    @click.option("--keep", default=keep, show_default=True, type=click.IntRange(min=1),
+                  help="How many backups to keep after rotating.")
+    @click.option("--verify-only", is_flag=True,
+                  help="Check existing backups instead of taking a new one.")
+    def backup_command(keep, verify_only):
+        """Back up the database and uploads without stopping the app."""
+        if verify_only:
+            for backup_dir in list_backups(backup_folder):
+                problems = verify_backup(backup_dir)
+                print(f"{backup_dir}: {'OK' if not problems else '; '.join(problems)}")
+            return
+        backup_dir, problems, removed = run(app.config["UPLOAD_FOLDER"], backup_folder, keep)
+        if problems:
+            raise click.ClickException(f"{backup_dir} failed verification: {'; '.join(problems)}")
+        print(f"Backed up to {backup_dir} (verified); removed {len(removed)} old backup(s)")
+
+    global scheduler
+    interval_hours = float(app.config.get("BACKUP_INTERVAL_HOURS") or 0)
+    if interval_hours <= 0:
+        scheduler = None
+        return
+    scheduler = BackupScheduler(app.config["UPLOAD_FOLDER"], backup_folder, keep, interval_hours)
+
+    @app.before_request
+    def _start_backup_scheduler():
+        scheduler.ensure_started()
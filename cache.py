@@ -0,0 +1,187 @@
+"""
+Cache Coherence — keeps in-process caches honest across worker processes.
+
+The problem:
+    In production we run several worker processes against ONE database
+    file. If worker A caches the client dropdown and worker B then adds a
+    client, worker A keeps serving the old list — nothing tells it the
+    data changed. There is no shared memory between processes.
+
+The solution (no Redis, no cache server — just SQLite):
+    1. Triggers in database.py bump a per-table counter in change_counters
+       on every INSERT, UPDATE and DELETE — in the same transaction as the
+       write itself, so the counter can never disagree with the data.
+    2. Each process keeps ONE long-lived "watcher" connection. SQLite's
+       PRAGMA data_version on that connection changes whenever ANY other
+       connection (in this process or another) commits a write.
+    3. At the start of every request, validate() runs the pragma. If the
+       number is unchanged, nothing anywhere has been written and every
+       cache is still valid — that is the one cheap query per request.
+       Only when it changes do we read change_counters to find out WHICH
+       tables moved, and clear just the caches that depend on them.
+
+Sharded storage (see database.py):
+    Each shard is its own file with its own data_version and its own
+    change_counters for tasks and attachments, so the watcher keeps one
+    connection per file. A table's version is the SUM of its counters
+    across the files: it moves whenever any shard's does.
+
+Usage:
+    @cached("users")
+    def user_choices():
+        ...  # runs a query — result is reused until the users table changes
+"""
+
+import os
+import threading
+from functools import wraps
+
+import database
+
+_lock = threading.Lock()
+
+# Per-process watcher state — reset automatically after a fork.
+# conns and data_versions are keyed by shard (None = the main/common file).
+_watcher = {"pid": None, "path": None, "conns": {}, "data_versions": {}}
+_file_versions = {}   # (shard, table) → counter in that file
+_table_versions = {}  # table → summed over the files
+
+# Every cache created by @cached, so validate() can find and clear them
+_registry = []
+
+
+class _TableCache:
+    """A dict of cached results that depends on a set of tables.
+
+    The generation number guards against a subtle race: a thread that
+    started computing BEFORE a clear() must not store its (now stale)
+    result AFTER the clear. It only stores if the generation still matches.
+    """
+
+    def __init__(self, name, tables):
+        self.name = name
+        self.tables = frozenset(tables)
+        self.values = {}
+        self.generation = 0
+
+    def clear(self):
+        self.values.clear()
+        self.generation += 1
+
+
+def _get_watchers():
+    """Return this process's watcher connections, opening them if needed.
+
+    SQLite connections must never be shared across fork(), so a change
+    of process id means we are in a new worker and need our own
+    connection. The cached VALUES inherited from the parent are kept:
+    the table versions they were validated against are still
+    comparable, so the next validate() clears only what has changed
+    since. If database.configure() pointed us at another file, nothing
+    carries over. Caller must hold _lock.
+    """
+    pid = os.getpid()
+    path = (database.DATABASE_PATH, database.SHARDED)
+    if _watcher["path"] != path:
+        _file_versions.clear()
+        _table_versions.clear()
+        for cache in _registry:
+            cache.clear()
+    if _watcher["pid"] != pid or _watcher["path"] != path or not _watcher["conns"]:
+        shards = [None] + (list(database.SHARD_DEPARTMENTS) if database.SHARDED else [])
+        _watcher["conns"] = {
+            shard: database.connect(check_same_thread=False, department=shard)
+            for shard in shards
+        }
+        _watcher["pid"] = pid
+        _watcher["path"] = path
+        # data_version numbers are per-connection, so start counting afresh
+        _watcher["data_versions"] = {}
+    return _watcher["conns"]
+
+
+def validate():
+    """Check whether another connection has written, and clear stale caches.
+
+    Returns the set of table names that changed since the last call
+    (empty in the common case, where only PRAGMA data_version is run).
+    """
+    with _lock:
+        moved = []
+        for shard, conn in _get_watchers().items():
+            # "main." — a shard connection also sees the common file's counters
+            data_version = conn.execute("PRAGMA main.data_version").fetchone()[0]
+            if data_version != _watcher["data_versions"].get(shard):
+                _watcher["data_versions"][shard] = data_version
+                moved.append((shard, conn))
+        if not moved:
+            return set()
+
+        for shard, conn in moved:
+            for name, version in conn.execute(
+                "SELECT table_name, version FROM main.change_counters"
+            ):
+                _file_versions[(shard, name)] = version
+        totals = {}
+        for (shard, name), version in _file_versions.items():
+            totals[name] = totals.get(name, 0) + version
+        changed = {name for name, version in totals.items() if _table_versions.get(name) != version}
+        _table_versions.update(totals)
+
+        for cache in _registry:
+            if cache.tables & changed:
+                cache.clear()
+        return changed
+
+
+def table_versions():
+    """Return a copy of the last-seen version of every tracked table."""
+    with _lock:
+        return dict(_table_versions)
+
+
+def clear_all():
+    """Drop every cached value in this process (e.g. after a bulk import)."""
+    with _lock:
+        for cache in _registry:
+            cache.clear()
+
+
+def cached(*tables):
+    """Decorator: cache a function's result until any of `tables` changes.
+
+    Results are keyed by the function's positional arguments, so they
+    must be hashable. The cached value is shared by every thread in the
+    process — return data that callers will not mutate.
+    """
+
+    def decorator(f):
+        cache = _TableCache(f.__qualname__, tables)
+        _registry.append(cache)
+
+        @wraps(f)
+        def wrapper(*args):
+            with _lock:
+                if args in cache.values:
+                    return cache.values[args]
+                generation = cache.generation
+
+            value = f(*args)
+
+            with _lock:
+                if cache.generation == generation:
+                    cache.values[args] = value
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def init_app(app):
+    """Validate caches once at the start of every request."""
+
+    @app.before_request
+    def _validate_caches():
+        validate()
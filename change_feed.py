@@ -0,0 +1,183 @@
+"""
+Change Feed — tails the change_feed table and wakes anyone waiting on it.
+
+Triggers in database.py append one row to change_feed for every task
+or client INSERT, UPDATE and DELETE. This module lets the rest of the
+app react to those rows without every listener polling the database:
+
+    - ONE background thread per worker process polls for new rows.
+      It first runs PRAGMA data_version (see cache.py), so while nothing
+      is being written each poll costs a single cheap read.
+    - New rows go into a small in-memory buffer, and every waiting
+      listener (e.g. each open dashboard's live stream) is woken up.
+
+So a hundred open dashboards cost one poll per second in total — not
+a hundred.
+
+Usage:
+    cursor = feed.current_id()
+    events, complete = feed.wait(cursor, timeout=15)
+    # complete=False means we fell behind the buffer: reload from scratch
+
+    # From a coroutine (the ASGI server) — waits without holding a thread:
+    events, complete = await feed.wait_async(cursor, timeout=15)
+"""
+
+import asyncio
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+import database
+
+POLL_SECONDS = 1.0
+BUFFER_SIZE = 2000
+BATCH_SIZE = 500
+
+# Rows older than this are deleted; listeners that fall further behind
+# simply reload their full state instead of replaying events
+RETAIN_FOR = "-7 days"
+PRUNE_EVERY_SECONDS = 3600
+
+
+class ChangeFeed:
+    """Per-process tail of the change_feed table."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._events = collections.deque(maxlen=BUFFER_SIZE)
+        self._last_id = None
+        self._pid = None
+        self._thread = None
+        # (event loop, future) for each coroutine in wait_async()
+        self._async_waiters = set()
+
+    def _ensure_started(self):
+        """Start the poller thread in this process. Caller holds _condition.
+
+        Threads do not survive fork(), so a new worker starts its own.
+        """
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._events.clear()
+        self._last_id = None
+        self._async_waiters.clear()
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        conn = database.connect()
+        conn.row_factory = sqlite3.Row
+        with self._condition:
+            self._last_id = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM change_feed"
+            ).fetchone()[0]
+            self._notify()
+
+        data_version = None
+        last_prune = 0.0
+        while True:
+            try:
+                current_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current_version != data_version:
+                    data_version = current_version
+                    if self._fetch_new(conn) == BATCH_SIZE:
+                        data_version = None  # more waiting — go round again now
+                        continue
+                if time.monotonic() - last_prune > PRUNE_EVERY_SECONDS:
+                    conn.execute(
+                        "DELETE FROM change_feed WHERE changed_at < DATETIME('now', ?)",
+                        (RETAIN_FOR,),
+                    )
+                    conn.commit()
+                    last_prune = time.monotonic()
+            except sqlite3.OperationalError:
+                # e.g. "database is locked" during a long write — try next time
+                data_version = None
+            time.sleep(POLL_SECONDS)
+
+    def _fetch_new(self, conn):
+        rows = conn.execute(
+            "SELECT * FROM change_feed WHERE id > ? ORDER BY id LIMIT ?",
+            (self._last_id, BATCH_SIZE),
+        ).fetchall()
+        if rows:
+            with self._condition:
+                self._events.extend(dict(row) for row in rows)
+                self._last_id = rows[-1]["id"]
+                self._notify()
+        return len(rows)
+
+    def _notify(self):
+        """Wake every waiter, threads and coroutines. Caller holds _condition."""
+        self._condition.notify_all()
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_set_done, future)
+            except RuntimeError:
+                pass  # that event loop has been closed
+
+    def _collect(self, after_id):
+        """(events, complete) for wait() and wait_async(). Caller holds _condition."""
+        if self._last_id is None or self._last_id <= after_id:
+            return [], True
+        events = [event for event in self._events if event["id"] > after_id]
+        complete = bool(events) and events[0]["id"] == after_id + 1
+        return events, complete
+
+    def current_id(self, timeout=5.0):
+        """The id of the newest change this process has seen."""
+        with self._condition:
+            self._ensure_started()
+            self._condition.wait_for(lambda: self._last_id is not None, timeout)
+            return self._last_id or 0
+
+    def wait(self, after_id, timeout):
+        """Wait up to `timeout` seconds for changes newer than `after_id`.
+
+        Returns (events, complete). `events` is every buffered change with
+        id > after_id (empty on timeout). `complete` is False when some of
+        those changes are no longer in the buffer — the caller should then
+        rebuild its state from the database rather than trust the events.
+        """
+        with self._condition:
+            self._ensure_started()
+            self._condition.wait_for(
+                lambda: self._last_id is not None and self._last_id > after_id, timeout
+            )
+            return self._collect(after_id)
+
+    async def wait_async(self, after_id, timeout):
+        """wait() for a coroutine: the same answer, but no thread is held.
+
+        The poller thread wakes the coroutine through its event loop, so
+        any number of waiting streams cost one future each.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            self._ensure_started()
+            if self._last_id is not None and self._last_id > after_id:
+                return self._collect(after_id)
+            self._async_waiters.add((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard((loop, future))
+        with self._condition:
+            return self._collect(after_id)
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# One shared instance per process
+feed = ChangeFeed()
@@ -0,0 +1,144 @@
+"""
+Client Rollups — each client's open, overdue and completed task counts.
+
+The problem:
+    The client list showed only client columns. Counting each client's
+    tasks row by row would be one query per client (N+1), on every
+    render, for numbers that rarely change.
+
+The solution — one grouped count, cached per client:
+    counts(client_ids) counts the tasks of a whole page of clients with
+    ONE query:
+
+        SELECT client_id, COUNT(*), SUM(...), ... FROM tasks
+        WHERE client_id IN (<the page>) GROUP BY client_id
+
+    idx_tasks_client_status_due holds client_id, status and due_date,
+    so SQLite answers it from the index alone. The result is kept in a
+    per-process cache, one entry per client.
+
+How it stays correct:
+    Triggers (database.py) bump a client's row in client_task_versions
+    whenever one of its tasks is added, removed, or changes status, due
+    date or client. Each cache entry remembers the client's version.
+
+    - While the tasks table's change counter (cache.py) has not moved,
+      nothing about any task has changed: every entry is served as it
+      is, with no query at all.
+    - When it has moved, the versions of the clients asked for are read
+      (one small indexed query) and only those whose version changed are
+      counted again — an edit to one client's task recounts that client
+      alone, not the page.
+    - "Overdue" depends on the date, so everything is recounted on the
+      first request of each day (UTC, like DATE('now') in the query).
+
+Sharded storage (see database.py):
+    A client's tasks can be in any department's shard, so both queries
+    run on every shard (database.fan_out) and are summed. Each shard
+    keeps its own client_task_versions; a client's version is the sum.
+"""
+
+import collections
+import os
+import threading
+import time
+
+import cache
+import database
+
+FIELDS = ("total", "open", "overdue", "completed")
+
+_COUNT_QUERY = """
+    SELECT client_id,
+           COUNT(*) AS total,
+           SUM(status IN ('open', 'in_progress')) AS open,
+           SUM(due_date < DATE('now') AND status NOT IN ('completed', 'cancelled')) AS overdue,
+           SUM(status = 'completed') AS completed
+    FROM tasks
+    WHERE client_id IN ({marks})
+    GROUP BY client_id
+"""
+
+_VERSION_QUERY = "SELECT client_id, version FROM client_task_versions WHERE client_id IN ({marks})"
+
+
+def _summed(query, client_ids, columns):
+    """Run a per-client query on every shard; {client_id: [summed columns]}."""
+    sql = query.format(marks=", ".join("?" * len(client_ids)))
+
+    def fetch(conn):
+        return conn.execute(sql, client_ids).fetchall()
+
+    totals = collections.defaultdict(lambda: [0] * columns)
+    for rows in database.fan_out(fetch):
+        for row in rows:
+            total = totals[row[0]]
+            for index in range(columns):
+                total[index] += row[index + 1] or 0
+    return totals
+
+
+class ClientRollups:
+    """Per-process cache of client task counts, recounted per client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # client_id → (tasks counter it was checked at, client version, counts)
+        self._entries = {}
+        self._day = None
+        self._pid = os.getpid()
+        self.hits = 0
+        self.recounted = 0
+
+    def counts(self, client_ids):
+        """{client_id: {"total", "open", "overdue", "completed"}} for these clients."""
+        client_ids = list(dict.fromkeys(client_ids))
+        if not client_ids:
+            return {}
+        checked_at = cache.table_versions().get("tasks")
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        with self._lock:
+            if self._pid != os.getpid() or self._day != day:
+                self._reset()
+                self._day = day
+            entries = {client_id: self._entries[client_id]
+                       for client_id in client_ids if client_id in self._entries}
+        unchecked = [client_id for client_id in client_ids
+                     if checked_at is None or entries.get(client_id, (None,))[0] != checked_at]
+
+        if unchecked:
+            # Versions are read BEFORE counting: a write landing in between
+            # leaves a newer count under an older version, so it is simply
+            # counted again next time — never the other way round.
+            versions = _summed(_VERSION_QUERY, unchecked, 1)
+            stale = {client_id for client_id in unchecked
+                     if client_id not in entries or entries[client_id][1] != versions[client_id][0]}
+            counted = _summed(_COUNT_QUERY, sorted(stale), len(FIELDS)) if stale else {}
+            for client_id in unchecked:
+                figures = (dict(zip(FIELDS, counted[client_id])) if client_id in stale
+                           else entries[client_id][2])
+                entries[client_id] = (checked_at, versions[client_id][0], figures)
+            with self._lock:
+                if self._day == day:
+                    self._entries.update((client_id, entries[client_id]) for client_id in unchecked)
+                self.recounted += len(stale)
+        with self._lock:
+            self.hits += len(client_ids) - len(unchecked)
+
+        return {client_id: entries[client_id][2] for client_id in client_ids}
+
+    def stats(self):
+        with self._lock:
+            return {"clients": len(self._entries), "hits": self.hits, "recounted": self.recounted}
+
+
+# One shared cache per process
+rollups = ClientRollups()
+
+
+def counts(client_ids):
+    """Task counts for a page of clients — see ClientRollups.counts()."""
+    return rollups.counts(client_ids)
@@ -9,36 +9,370 @@ Why SQLite?
 
 This module provides helper functions to get a database connection
 and to initialise the schema (create tables if they don't exist).
+
+Where is the database?
+- By default, mj_limited.db next to this file
+- Set DATABASE_PATH (env var or app config) to use another file
+- Set DATABASE_PATH=:memory: for a throwaway in-memory database shared
+  by every connection in the process — ideal for tests and benchmarks
+
+Sharded storage (optional, DATABASE_SHARDED=1):
+    SQLite lets one writer at a time into a file, so with every
+    department in mj_limited.db a Finance import queues behind an HR
+    edit. In sharded mode each department's tasks and attachments (with
+    their status history and rollups) live in a file of their own:
+
+        mj_limited.db                        → users, clients, audit log (common)
+        mj_limited_finance.db, mj_limited_hr.db, ...  → one shard per department
+
+    The routing layer below decides which file a query goes to:
+    - get_db(department) opens one shard, with the common file ATTACHed
+      read-only as "common" — so "JOIN users" / "JOIN clients" work
+      unchanged, and a shard writer never locks the common file.
+    - task_db(id) opens the shard that holds a task or attachment: each
+      shard numbers its rows from its own block of ids.
+    - fan_out(work) runs a query on every shard in parallel and returns
+      the per-shard results for the caller to merge (admin-wide views).
+    - get_db() with no department is the common file.
+    All files use WAL journaling in this mode, so readers of one file
+    never hold up its writer.
+
+    In single-file mode (the default) the same calls all lead to
+    mj_limited.db and fan_out runs once, so callers are written once
+    for both modes. Choose the mode when the database is created:
+    existing tasks are not moved into shards.
 """
 
+import collections
+import concurrent.futures
+import functools
+import re
 import sqlite3
 import os
+import threading
+import urllib.request
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(__file__), "mj_limited.db")
+DATABASE_PATH = os.getenv("DATABASE_PATH", DEFAULT_DATABASE_PATH)
+
+# Bump this whenever init_db() gains a new table, column, index or trigger.
+# It is stored in the database file itself (PRAGMA user_version), so
+# startup can tell in one cheap read whether any schema work is needed.
+SCHEMA_VERSION = 14
+
+# Tables whose writes are counted in change_counters (see init_db)
+TRACKED_TABLES = ("users", "clients", "saved_views", "tasks", "attachments")
+# ...and which file each is in, in sharded storage
+COMMON_TABLES = ("users", "clients", "saved_views")
+SHARDED_TABLES = ("tasks", "attachments")
+
+# --- Sharded storage (see the module docstring) ---
+SHARDED = os.getenv("DATABASE_SHARDED", "0") == "1"
+
+# One shard per department, and the block of ids each numbers its tasks
+# and attachments from: Administration 1 to 1,000,000,000, Client
+# Services from 1,000,000,001, and so on. Only ever APPEND a department —
+# reordering would send existing ids to the wrong shard.
+SHARD_DEPARTMENTS = ("Administration", "Client Services", "Finance", "HR", "Management & Strategy")
+SHARD_ID_SPAN = 1_000_000_000
+
+# Name of the common file inside a shard connection
+COMMON_SCHEMA = "common"
+
+# Threads per process for fan_out(), shared by every request thread
+FAN_OUT_THREADS = 4 * len(SHARD_DEPARTMENTS)
+
+# A plain ":memory:" database is private to ONE connection — useless when
+# every request opens its own. A named shared-cache URI lets all
+# connections in the process see the same in-memory database.
+_MEMORY_URI = "file:mj_limited?mode=memory&cache=shared"
+
+# The shared in-memory database is destroyed when its last connection
+# closes, so we hold one open for the life of the process
+_memory_anchor = None
+_shard_anchors = {}  # the same, for in-memory shards
+
+# fan_out()'s thread pool — threads do not survive fork(), so each
+# worker process creates its own on first use
+_pool = {"pid": None, "executor": None}
+_pool_lock = threading.Lock()
+
+
+def configure(path, sharded=None):
+    """Point the module at a different database (called by create_app).
+
+    Must be called before the first get_db() of a process, e.g. from
+    the app factory using app.config["DATABASE_PATH"]. sharded=True or
+    False switches sharded storage on or off; None leaves it as it is.
+    """
+    global DATABASE_PATH, SHARDED
+    DATABASE_PATH = path
+    if sharded is not None:
+        SHARDED = sharded
+
+
+def shard_slug(department):
+    """"Client Services" → "client_services", for shard file names."""
+    if department not in SHARD_DEPARTMENTS:
+        raise ValueError(f"No shard for department {department!r}")
+    return re.sub(r"[^a-z0-9]+", "_", department.lower()).strip("_")
+
+
+def shard_path(department):
+    """Where one department's shard lives — next to the common file.
+
+    "Client Services" → mj_limited_client_services.db. For ":memory:"
+    it is a named in-memory database, like the common one.
+    """
+    slug = shard_slug(department)
+    if DATABASE_PATH == ":memory:":
+        return f"file:mj_limited_{slug}?mode=memory&cache=shared"
+    stem, extension = os.path.splitext(DATABASE_PATH)
+    return f"{stem}_{slug}{extension or '.db'}"
+
+
+def _file_uri(path, mode):
+    return f"file:{urllib.request.pathname2url(os.path.abspath(path))}?mode={mode}"
+
+
+def connect(check_same_thread=True, department=None):
+    """Open a raw SQLite connection to the configured database.
+
+    get_db() is what routes use; this lower-level helper exists for the
+    few places that need a connection with different settings (e.g. the
+    long-lived watcher connection in cache.py). In sharded storage,
+    `department` picks a shard (with the common file attached); without
+    it you get the common file.
+    """
+    global _memory_anchor
+    if SHARDED and department is not None:
+        return _connect_shard(department, check_same_thread)
+    if DATABASE_PATH == ":memory:":
+        if _memory_anchor is None:
+            _memory_anchor = sqlite3.connect(_MEMORY_URI, uri=True, check_same_thread=False)
+        return sqlite3.connect(
+            _MEMORY_URI, uri=True, check_same_thread=check_same_thread
+        )
+    return sqlite3.connect(DATABASE_PATH, check_same_thread=check_same_thread)
+
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), "mj_limited.db")
+def _connect_shard(department, check_same_thread):
+    """A shard connection: the shard as main, the common file as "common".
+
+    The common file is attached READ-ONLY, so even BEGIN IMMEDIATE on a
+    shard only ever takes the shard's write lock. Writes to users and
+    clients go through get_db() instead. (A shared in-memory database
+    cannot be opened read-only, so there it is attached read-write.)
+    """
+    path = shard_path(department)
+    if DATABASE_PATH == ":memory:":
+        if path not in _shard_anchors:
+            _shard_anchors[path] = sqlite3.connect(path, uri=True, check_same_thread=False)
+        connect().close()  # make sure the common in-memory database exists
+        conn = sqlite3.connect(path, uri=True, check_same_thread=check_same_thread)
+        common = _MEMORY_URI
+    else:
+        conn = sqlite3.connect(_file_uri(path, "rwc"), uri=True,
+                               check_same_thread=check_same_thread)
+        common = _file_uri(DATABASE_PATH, "ro")
+    conn.execute(f"ATTACH DATABASE ? AS {COMMON_SCHEMA}", (common,))
+    return conn
 
 
-def get_db():
+def get_db(department=None):
     """Get a database connection with Row factory enabled.
 
     Row factory lets us access columns by name (row['title'])
     instead of by index (row[0]) — much more readable.
+
+    department only matters in sharded storage: it routes the
+    connection to that department's shard (see the module docstring).
     """
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = connect(department=department)
     conn.row_factory = sqlite3.Row
     # Enable foreign key enforcement (off by default in SQLite)
     conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
 
+def department_for_id(row_id):
+    """The department whose shard numbers this task or attachment id."""
+    index = (int(row_id) - 1) // SHARD_ID_SPAN
+    # Ids outside every block cannot exist; they go to the nearest shard,
+    # which simply does not find them
+    return SHARD_DEPARTMENTS[min(max(index, 0), len(SHARD_DEPARTMENTS) - 1)]
+
+
+def task_db(row_id):
+    """get_db() for the file that holds task (or attachment) `row_id`."""
+    return get_db(department_for_id(row_id) if SHARDED else None)
+
+
+def shard_departments(departments=None):
+    """The shards a query over `departments` (None = all) has to visit.
+
+    Single-file storage has one "shard", None — the main file.
+    """
+    if not SHARDED:
+        return [None]
+    if not departments:
+        return list(SHARD_DEPARTMENTS)
+    return [department for department in SHARD_DEPARTMENTS if department in departments]
+
+
+def _run_on(work, department):
+    conn = get_db(department)
+    try:
+        return work(conn)
+    finally:
+        conn.close()
+
+
+def _executor():
+    with _pool_lock:
+        if _pool["pid"] != os.getpid():
+            _pool["executor"] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=FAN_OUT_THREADS, thread_name_prefix="shard"
+            )
+            _pool["pid"] = os.getpid()
+        return _pool["executor"]
+
+
+def fan_out(work, departments=None):
+    """Run work(conn) on each shard in parallel; return the results as a list.
+
+    departments narrows the shards visited (e.g. a manager's own
+    department, or a list filter) — one shard runs in the calling
+    thread, with no pool hop. Each call gets its own connection, in
+    its own thread, so `work` must not use Flask's request or session
+    (read what it needs first) and must not call fan_out itself.
+
+    Single-file storage runs `work` once, on the main file, so callers
+    merge a one-item list and the same code serves both modes.
+    """
+    shards = shard_departments(departments)
+    if len(shards) <= 1:
+        return [_run_on(work, shard) for shard in shards]
+    return list(_executor().map(functools.partial(_run_on, work), shards))
+
+
+@functools.lru_cache(maxsize=64)
+def _row_class(columns):
+    return collections.namedtuple("Row", columns)
+
+
+def namedtuple_row(cursor, row):
+    """Compact row factory: each row is a plain named tuple.
+
+    sqlite3.Row keeps a reference to the cursor's description and builds
+    a name lookup on access; a named tuple is just the values, with the
+    column names stored once on a shared class. Templates read both the
+    same way (row.title), so list pages returning hundreds of rows use it:
+
+        conn.row_factory = database.namedtuple_row
+    """
+    columns = tuple(column[0] for column in cursor.description)
+    return _row_class(columns)._make(row)
+
+
 def init_db():
-    """Create all tables if they don't already exist.
+    """Create or upgrade the schema, unless it is already current.
+
+    Returns True if schema work was done, False if it was skipped.
+
+    Why check user_version first?
+    - Every worker process calls this on boot
+    - Re-running every CREATE ... IF NOT EXISTS and committing costs
+      a write lock and several statements — for no benefit once the
+      schema exists
+    - PRAGMA user_version is a single integer read from the file header
+
+    When work IS needed, it runs inside BEGIN IMMEDIATE so two workers
+    booting at the same moment cannot both try to upgrade the schema.
+
+    In sharded storage the common file and every shard are checked the
+    same way, each with its own user_version.
+    """
+    if not SHARDED:
+        return _init_file(connect(), _create_schema)
+
+    changed = _init_file(connect(), _create_common_schema)
+    for index, department in enumerate(SHARD_DEPARTMENTS):
+        # A plain connection: schema work must not see the attached common file
+        path = shard_path(department)
+        if DATABASE_PATH == ":memory:":
+            _connect_shard(department, True).close()  # creates the anchor
+            conn = sqlite3.connect(path, uri=True)
+        else:
+            conn = sqlite3.connect(path)
+        build = functools.partial(_create_task_schema, id_base=index * SHARD_ID_SPAN)
+        changed = _init_file(conn, build) or changed
+    return changed
+
+
+def _init_file(conn, build):
+    """Run build(cursor) on one database file unless its schema is current."""
+    if SHARDED and DATABASE_PATH != ":memory:":
+        # Persistent, and a no-op once set: lets readers and the one
+        # writer of each file work side by side
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            conn.execute("PRAGMA journal_mode = WAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return False
+
+    conn.isolation_level = None  # we manage the transaction ourselves
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-check: another worker may have finished while we waited
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            conn.execute("ROLLBACK")
+            return False
+        build(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return True
+
+
+def _add_column(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there.
 
-    This is safe to call on every app startup — IF NOT EXISTS
+    CREATE TABLE IF NOT EXISTS does nothing for a table that already
+    exists, so columns added in later versions need an ALTER TABLE on
+    databases created before them.
+    """
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _drop_column(cursor, table, column):
+    """Remove a column a later version no longer uses, if it is there."""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column in columns:
+        cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+
+def _create_schema(cursor):
+    """Create all tables, triggers and indexes if they don't already exist.
+
+    This is safe to run on an existing database — IF NOT EXISTS
     means it won't destroy existing data.
+
+    The single-file schema is the common part plus the task part; in
+    sharded storage they go to different files (see init_db).
     """
-    conn = get_db()
-    cursor = conn.cursor()
+    _create_common_schema(cursor)
+    _create_task_schema(cursor)
+
 
+def _create_common_schema(cursor):
+    """Users, clients and the audit log — never sharded."""
     # --- Users table ---
     # Stores all staff accounts with hashed passwords and role-based access
     cursor.execute("""
@@ -71,9 +405,139 @@ def init_db():
         )
     """)
 
+    # --- Saved views ---
+    # A user's named task-list filters (saved_views.py), shown in the
+    # navigation. query is the /tasks query string; the UNIQUE index
+    # also finds one user's views without a scan.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saved_views (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            query TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, name)
+        )
+    """)
+
+    # --- Change counters ---
+    _create_change_counters(cursor, COMMON_TABLES)
+
+    # --- Change feed ---
+    # An append-only log of WHICH task/client rows changed, written by
+    # triggers in the same transaction as the change itself — so every
+    # write path (HTML forms, JSON API batches, scripts) is covered.
+    # change_feed.py tails it to push live updates to open dashboards.
+    # For tasks, old_* columns hold the values before an UPDATE/DELETE,
+    # so a consumer can tell which departments/people were affected.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_feed (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            action TEXT NOT NULL CHECK(action IN ('insert', 'update', 'delete')),
+            department TEXT,
+            old_department TEXT,
+            assigned_to INTEGER,
+            old_assigned_to INTEGER,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS clients_{event.lower()}_feed AFTER {event} ON clients
+            BEGIN
+                INSERT INTO change_feed (table_name, row_id, action)
+                VALUES ('clients', {row}.id, '{event.lower()}');
+            END
+        """)
+
+    # --- Optimistic concurrency ---
+    # Every edit bumps version (see _create_task_schema for the details)
+    _add_column(cursor, "clients", "version", "INTEGER NOT NULL DEFAULT 1")
+
+    # --- List filters and sorting ---
+    # Supports the client list's status filter and default name order
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_clients_status_name ON clients (status, company_name)"
+    )
+
+    # --- Audit log ---
+    # Written in batches by audit.py. No foreign keys: the trail must
+    # outlive the tasks, clients and users it mentions. occurred_at is
+    # when the change happened, not when its batch was written.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY,
+            occurred_at TIMESTAMP NOT NULL,
+            user_id INTEGER,
+            action TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id INTEGER,
+            details TEXT
+        )
+    """)
+    # One index per filter on the audit page; ending each with id hands
+    # rows back newest first, so a page needs no sort
+    for name, columns in (
+        ("idx_audit_entity", "entity, entity_id, id"),
+        ("idx_audit_user", "user_id, id"),
+        ("idx_audit_action", "action, id"),
+    ):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON audit_log ({columns})")
+
+
+def _create_change_counters(cursor, tables):
+    """Change counters for `tables` — each file counts its own tables.
+
+    One row per table, bumped by triggers on every INSERT/UPDATE/DELETE.
+    cache.py reads these to decide which in-process caches are stale —
+    see the module docstring there for the full picture.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_counters (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table in tables:
+        cursor.execute(
+            "INSERT OR IGNORE INTO change_counters (table_name, version) VALUES (?, 0)",
+            (table,),
+        )
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            # Trigger bodies cannot take parameters, but the table name comes
+            # from our own constant — never from user input — so this is safe
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_counter
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE change_counters SET version = version + 1
+                    WHERE table_name = '{table}';
+                END
+            """)
+
+
+def _create_task_schema(cursor, id_base=None):
+    """Tasks, attachments and everything derived from them.
+
+    id_base is None for the single-file schema. For a shard it is where
+    the shard's block of ids starts (see SHARD_ID_SPAN). Users and
+    clients are in another file there, which foreign keys cannot reach,
+    so those columns are plain integers in a shard.
+    """
+    shard = id_base is not None
+    user_ref = "" if shard else " REFERENCES users(id)"
+    user_client_keys = "" if shard else """,
+            FOREIGN KEY (assigned_to) REFERENCES users(id),
+            FOREIGN KEY (client_id) REFERENCES clients(id),
+            FOREIGN KEY (created_by) REFERENCES users(id)"""
+    uploader_key = "" if shard else """,
+            FOREIGN KEY (uploaded_by) REFERENCES users(id)"""
+
     # --- Tasks table ---
     # Central work tracking — replaces the spreadsheets and email chains
-    cursor.execute("""
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
@@ -87,15 +551,13 @@ def init_db():
             created_by INTEGER NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (assigned_to) REFERENCES users(id),
-            FOREIGN KEY (client_id) REFERENCES clients(id),
-            FOREIGN KEY (created_by) REFERENCES users(id)
+            updated_by INTEGER{user_ref}{user_client_keys}
         )
     """)
 
     # --- Attachments table ---
     # File uploads linked to tasks — replaces emailing documents around
-    cursor.execute("""
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS attachments (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             task_id INTEGER NOT NULL,
@@ -104,10 +566,360 @@ def init_db():
             file_size INTEGER NOT NULL,
             uploaded_by INTEGER NOT NULL,
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
-            FOREIGN KEY (uploaded_by) REFERENCES users(id)
+            FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE{uploader_key}
+        )
+    """)
+
+    if shard:
+        # Start AUTOINCREMENT at this shard's block, so its ids are unique
+        # across all shards and say which shard a row is in
+        for table in SHARDED_TABLES:
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table, id_base, table),
+            )
+
+    # --- Change counters and feed ---
+    _create_change_counters(cursor, SHARDED_TABLES)
+    # Shards keep no change feed: its ids must form one sequence, which
+    # separate files cannot share, so live dashboard updates, reminders
+    # and reports stay single-file features
+    if not shard:
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS tasks_insert_feed AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO change_feed (table_name, row_id, action, department, assigned_to)
+                VALUES ('tasks', NEW.id, 'insert', NEW.department, NEW.assigned_to);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS tasks_update_feed AFTER UPDATE ON tasks
+            BEGIN
+                INSERT INTO change_feed (table_name, row_id, action, department,
+                                         old_department, assigned_to, old_assigned_to)
+                VALUES ('tasks', NEW.id, 'update', NEW.department,
+                        OLD.department, NEW.assigned_to, OLD.assigned_to);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS tasks_delete_feed AFTER DELETE ON tasks
+            BEGIN
+                INSERT INTO change_feed (table_name, row_id, action, old_department, old_assigned_to)
+                VALUES ('tasks', OLD.id, 'delete', OLD.department, OLD.assigned_to);
+            END
+        """)
+
+    # --- Status history and cycle-time rollups ---
+    # updated_by records who made the latest change, so the history
+    # trigger below knows who to credit (added in schema version 3)
+    _add_column(cursor, "tasks", "updated_by", f"INTEGER{user_ref}")
+
+    # Append-only log of every status transition. No foreign key to tasks:
+    # history must outlive a deleted or archived task.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_status_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            from_status TEXT,
+            to_status TEXT NOT NULL,
+            department TEXT NOT NULL,
+            assigned_to INTEGER,
+            changed_by INTEGER,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_status_history_task
+        ON task_status_history (task_id, to_status)
+    """)
+
+    # Pre-aggregated daily figures per department and assignee
+    # (assigned_to 0 = unassigned). Charts read these small tables
+    # instead of scanning tasks or the history.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_daily_rollup (
+            day TEXT NOT NULL,
+            department TEXT NOT NULL,
+            assigned_to INTEGER NOT NULL DEFAULT 0,
+            created_count INTEGER NOT NULL DEFAULT 0,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            cycle_days_total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, department, assigned_to)
+        ) WITHOUT ROWID
+    """)
+    # How many tasks completed each day took N whole days — enough to
+    # work out an exact median without storing every task's cycle time
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_cycle_histogram (
+            day TEXT NOT NULL,
+            department TEXT NOT NULL,
+            assigned_to INTEGER NOT NULL DEFAULT 0,
+            cycle_days INTEGER NOT NULL,
+            task_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, department, assigned_to, cycle_days)
+        ) WITHOUT ROWID
+    """)
 
-    conn.commit()
-    conn.close()
+    # The history row and the rollups are written by triggers, so they
+    # are part of the SAME transaction as the status change — they can
+    # never disagree with the tasks table.
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tasks_insert_history AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO task_status_history
+                (task_id, from_status, to_status, department, assigned_to, changed_by)
+            VALUES (NEW.id, NULL, NEW.status, NEW.department, NEW.assigned_to, NEW.created_by);
+
+            INSERT INTO task_daily_rollup (day, department, assigned_to, created_count)
+            VALUES (DATE('now'), NEW.department, COALESCE(NEW.assigned_to, 0), 1)
+            ON CONFLICT (day, department, assigned_to)
+            DO UPDATE SET created_count = created_count + 1;
+
+            -- Created already completed: counts as done on day one
+            INSERT INTO task_daily_rollup (day, department, assigned_to, completed_count)
+            SELECT DATE('now'), NEW.department, COALESCE(NEW.assigned_to, 0), 1
+            WHERE NEW.status = 'completed'
+            ON CONFLICT (day, department, assigned_to)
+            DO UPDATE SET completed_count = completed_count + 1;
+
+            INSERT INTO task_cycle_histogram (day, department, assigned_to, cycle_days, task_count)
+            SELECT DATE('now'), NEW.department, COALESCE(NEW.assigned_to, 0), 0, 1
+            WHERE NEW.status = 'completed'
+            ON CONFLICT (day, department, assigned_to, cycle_days)
+            DO UPDATE SET task_count = task_count + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tasks_status_history
+        AFTER UPDATE OF status ON tasks
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            -- Leaving 'completed' (re-opened): take back the completion we
+            -- counted, on the day/department/assignee it was counted under
+            INSERT INTO task_daily_rollup
+                (day, department, assigned_to, completed_count, cycle_days_total)
+            SELECT DATE(h.changed_at), h.department, COALESCE(h.assigned_to, 0), -1,
+                   -(julianday(h.changed_at) - julianday(OLD.created_at))
+            FROM task_status_history h
+            WHERE OLD.status = 'completed' AND h.task_id = OLD.id AND h.to_status = 'completed'
+            ORDER BY h.id DESC LIMIT 1
+            ON CONFLICT (day, department, assigned_to)
+            DO UPDATE SET completed_count = completed_count + excluded.completed_count,
+                          cycle_days_total = cycle_days_total + excluded.cycle_days_total;
+
+            INSERT INTO task_cycle_histogram
+                (day, department, assigned_to, cycle_days, task_count)
+            SELECT DATE(h.changed_at), h.department, COALESCE(h.assigned_to, 0),
+                   CAST(julianday(h.changed_at) - julianday(OLD.created_at) AS INTEGER), -1
+            FROM task_status_history h
+            WHERE OLD.status = 'completed' AND h.task_id = OLD.id AND h.to_status = 'completed'
+            ORDER BY h.id DESC LIMIT 1
+            ON CONFLICT (day, department, assigned_to, cycle_days)
+            DO UPDATE SET task_count = task_count + excluded.task_count;
+
+            INSERT INTO task_status_history
+                (task_id, from_status, to_status, department, assigned_to, changed_by)
+            VALUES (NEW.id, OLD.status, NEW.status, NEW.department, NEW.assigned_to,
+                    NEW.updated_by);
+
+            -- Entering 'completed': count it, with its cycle time
+            INSERT INTO task_daily_rollup
+                (day, department, assigned_to, completed_count, cycle_days_total)
+            SELECT DATE('now'), NEW.department, COALESCE(NEW.assigned_to, 0), 1,
+                   julianday('now') - julianday(NEW.created_at)
+            WHERE NEW.status = 'completed'
+            ON CONFLICT (day, department, assigned_to)
+            DO UPDATE SET completed_count = completed_count + 1,
+                          cycle_days_total = cycle_days_total + excluded.cycle_days_total;
+
+            INSERT INTO task_cycle_histogram
+                (day, department, assigned_to, cycle_days, task_count)
+            SELECT DATE('now'), NEW.department, COALESCE(NEW.assigned_to, 0),
+                   CAST(julianday('now') - julianday(NEW.created_at) AS INTEGER), 1
+            WHERE NEW.status = 'completed'
+            ON CONFLICT (day, department, assigned_to, cycle_days)
+            DO UPDATE SET task_count = task_count + 1;
+        END
+    """)
+    _backfill_status_history(cursor)
+
+    # --- Archival ---
+    # Partial index over closed tasks only, so archival.py finds the rows
+    # to move without scanning the (much larger) set of open work
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tasks_closed_updated ON tasks (updated_at)
+        WHERE status IN ('completed', 'cancelled')
+    """)
+
+    # --- Optimistic concurrency ---
+    # Every edit bumps version; a write carries the version its form was
+    # loaded with (UPDATE ... WHERE id = ? AND version = ?), so two people
+    # editing the same row cannot silently overwrite each other
+    _add_column(cursor, "tasks", "version", "INTEGER NOT NULL DEFAULT 1")
+
+    # --- List filters and sorting ---
+    # One index per filter the list pages offer (see query_planner.py).
+    # The (filter, created_at) pairs also hand back rows already in the
+    # default newest-first order, so SQLite can skip the sort step;
+    # (created_at, id) does the same for the unfiltered list, the most
+    # common page load of all.
+    for name, table, columns in (
+        ("idx_tasks_created", "tasks", "created_at, id"),
+        ("idx_tasks_status_created", "tasks", "status, created_at"),
+        ("idx_tasks_department_created", "tasks", "department, created_at"),
+        ("idx_tasks_assigned_created", "tasks", "assigned_to, created_at"),
+        ("idx_tasks_due_date", "tasks", "due_date"),
+    ):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    # --- Client rollups ---
+    # client_rollups.py counts each client's open/overdue/completed tasks
+    # with one GROUP BY client_id. This index holds every column that
+    # count reads, so it never touches the table itself; it also serves
+    # the client filter and delete check that idx_tasks_client (schema
+    # version 6) used to.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tasks_client_status_due ON tasks (client_id, status, due_date)"
+    )
+    cursor.execute("DROP INDEX IF EXISTS idx_tasks_client")
+
+    # One counter per client, bumped when one of its tasks is added or
+    # removed, or changes status, due date or client — the only changes
+    # that move its rollup (a new title does not). The rollup cache
+    # recounts just the clients whose counter moved.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS client_task_versions (
+            client_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    bump = """
+        INSERT INTO client_task_versions (client_id, version)
+        SELECT {row}.client_id, 1 WHERE {row}.client_id IS NOT NULL
+        ON CONFLICT (client_id) DO UPDATE SET version = version + 1;
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tasks_insert_client_version AFTER INSERT ON tasks
+        BEGIN {bump.format(row="NEW")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tasks_update_client_version AFTER UPDATE ON tasks
+        WHEN OLD.client_id IS NOT NEW.client_id OR OLD.status IS NOT NEW.status
+             OR OLD.due_date IS NOT NEW.due_date
+        BEGIN {bump.format(row="OLD")} {bump.format(row="NEW")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tasks_delete_client_version AFTER DELETE ON tasks
+        BEGIN {bump.format(row="OLD")} END
+    """)
+
+    # --- Saved view counts ---
+    # Same idea for saved_views.py, by department and by assignee: every
+    # task write bumps the old and new department's and assignee's rows,
+    # so a cached view count is recounted only if a scope it reads moved.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_scope_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    scopes = {
+        "NEW": "('department:' || NEW.department, 1), "
+               "('assignee:' || COALESCE(NEW.assigned_to, 'none'), 1)",
+        "OLD": "('department:' || OLD.department, 1), "
+               "('assignee:' || COALESCE(OLD.assigned_to, 'none'), 1)",
+    }
+    for event, rows in (("INSERT", scopes["NEW"]),
+                        ("UPDATE", scopes["OLD"] + ", " + scopes["NEW"]),
+                        ("DELETE", scopes["OLD"])):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tasks_{event.lower()}_scope_version AFTER {event} ON tasks
+            BEGIN
+                INSERT INTO task_scope_versions (scope, version) VALUES {rows}
+                ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+            END
+        """)
+
+    # --- Due-date reminders ---
+    # reminders.py loads its timer heap from the open tasks that have a
+    # due date. This partial index holds ONLY those rows, in due-date
+    # order, so loading never touches closed or undated tasks.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tasks_open_due ON tasks (due_date)
+        WHERE status IN ('open', 'in_progress') AND due_date IS NOT NULL
+    """)
+
+    # One row per notification sent. The primary key is the "claim": a
+    # worker inserts the row BEFORE sending, so two workers can never
+    # send the same reminder. due_date is part of the key, so moving a
+    # task's due date earns it a fresh reminder for the new date.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reminders_sent (
+            task_id INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK(kind IN ('reminder', 'escalation')),
+            due_date TEXT NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (task_id, kind, due_date)
+        )
+    """)
+
+    # --- Attachment compression at rest ---
+    # file_size stays the LOGICAL size (what the user uploaded and gets
+    # back). stored_size is the bytes on disk and encoding says how they
+    # were compressed (NULL = stored as uploaded, e.g. older files).
+    _add_column(cursor, "attachments", "stored_size", "INTEGER")
+    _add_column(cursor, "attachments", "encoding", "TEXT")
+
+    # --- Audit trail ---
+    # Schema version 13 kept copies of each task's previous status and
+    # assignee in the row itself, for the audit trail's "from" values.
+    # Edits now read them inside their own write transaction instead
+    # (routes/tasks.py), so the columns are gone again.
+    _drop_column(cursor, "tasks", "old_status")
+    _drop_column(cursor, "tasks", "old_assigned_to")
+
+
+def _backfill_status_history(cursor):
+    """Seed history and rollups for tasks that existed before version 3.
+
+    We cannot know their full past, so each task gets what we DO know:
+    created (as 'open') at created_at and, if completed, completed at
+    updated_at. Runs only while the history table is still empty.
+    """
+    if cursor.execute("SELECT 1 FROM task_status_history LIMIT 1").fetchone():
+        return
+    cursor.execute("""
+        INSERT INTO task_status_history
+            (task_id, from_status, to_status, department, assigned_to, changed_by, changed_at)
+        SELECT id, NULL, CASE WHEN status = 'completed' THEN 'open' ELSE status END,
+               department, assigned_to, created_by, created_at
+        FROM tasks
+    """)
+    cursor.execute("""
+        INSERT INTO task_status_history
+            (task_id, from_status, to_status, department, assigned_to, changed_by, changed_at)
+        SELECT id, 'open', 'completed', department, assigned_to, NULL, updated_at
+        FROM tasks WHERE status = 'completed'
+    """)
+    cursor.execute("""
+        INSERT INTO task_daily_rollup (day, department, assigned_to, created_count)
+        SELECT DATE(created_at), department, COALESCE(assigned_to, 0), COUNT(*)
+        FROM tasks GROUP BY 1, 2, 3
+    """)
+    cursor.execute("""
+        INSERT INTO task_daily_rollup
+            (day, department, assigned_to, completed_count, cycle_days_total)
+        SELECT DATE(updated_at), department, COALESCE(assigned_to, 0), COUNT(*),
+               SUM(julianday(updated_at) - julianday(created_at))
+        FROM tasks WHERE status = 'completed' GROUP BY 1, 2, 3
+        ON CONFLICT (day, department, assigned_to)
+        DO UPDATE SET completed_count = excluded.completed_count,
+                      cycle_days_total = excluded.cycle_days_total
+    """)
+    cursor.execute("""
+        INSERT INTO task_cycle_histogram (day, department, assigned_to, cycle_days, task_count)
+        SELECT DATE(updated_at), department, COALESCE(assigned_to, 0),
+               CAST(julianday(updated_at) - julianday(created_at) AS INTEGER), COUNT(*)
+        FROM tasks WHERE status = 'completed' GROUP BY 1, 2, 3, 4
+    """)
@@ -0,0 +1,242 @@
+"""
+Memory Tracing — which endpoints and which lines hold the memory.
+
+The problem:
+    Worker RSS creeps up over the day. The suspects are big result sets
+    (fetchall() in the task and client lists) and sqlite3.Row objects
+    kept alive while a template renders — but RSS alone cannot say which
+    request, or which line, the memory belongs to.
+
+The solution (opt-in, sampled):
+    With MEMORY_SAMPLE_RATE = 0.01, one request in a hundred is traced
+    with Python's tracemalloc:
+      - tracing STARTS when the request starts, so everything traced was
+        allocated by this request (or another thread meanwhile)
+      - just before a template renders, a snapshot records what is alive
+        at that moment — result sets, rows, the template context
+      - when the request ends, the PEAK traced memory is recorded for the
+        endpoint, and a second snapshot shows what the request allocated
+        and is STILL alive (the response body, caches filled, or a leak)
+      - tracing then STOPS, which frees all of its bookkeeping
+    Because tracing starts with the request, the end-of-request snapshot
+    already is the per-request diff — there is no baseline to subtract.
+
+    Each allocation is charged to the innermost line of OUR code in its
+    traceback (e.g. routes/tasks.py:128, the fetchall()), not to the
+    library line that happened to call malloc.
+
+Overhead:
+    Untraced requests pay for one random number. While a request is
+    traced, every allocation in the process is slower (roughly 2–4×),
+    so at most one request per worker is traced at a time and the rate
+    should stay low in production. Unset or 0 turns tracing off entirely.
+
+The figures are per worker process; see GET /admin/memory.
+"""
+
+import os
+import random
+import threading
+import tracemalloc
+
+from flask import before_render_template, g, request
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_FRAMES = 8      # traceback depth kept per allocation
+MAX_SITES = 1000        # allocation sites remembered per kind (largest kept)
+
+# Allocations made by tracemalloc itself or by the import system
+_IGNORE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+def rss_bytes():
+    """Resident memory of this process right now (None if unknown)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def max_rss_bytes():
+    """The most resident memory this process has ever had (None if unknown)."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+
+class MemoryTracer:
+    """Samples requests with tracemalloc and keeps per-process totals."""
+
+    def __init__(self, sample_rate, frames, root):
+        self.sample_rate = sample_rate
+        self.frames = frames
+        self.root = os.path.join(os.path.abspath(root), "")
+        self._tracing = threading.Lock()  # held while a request is traced
+        self._lock = threading.Lock()     # guards the totals below
+        self._endpoints = {}              # endpoint → totals
+        self._sites = {"at_render": {}, "retained": {}}  # site → [bytes, blocks]
+        self.samples = 0
+
+    # --- Per request ---------------------------------------------------
+
+    def start(self):
+        """Begin tracing this request if it is sampled. Returns True if so."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        if not self._tracing.acquire(blocking=False):
+            return False  # another request in this worker is being traced
+        if tracemalloc.is_tracing():
+            # Someone else is tracing (python -X tracemalloc) — leave it alone
+            self._tracing.release()
+            return False
+        tracemalloc.start(self.frames)
+        return True
+
+    def checkpoint(self):
+        """Snapshot what is alive now (called just before a template renders)."""
+        return tracemalloc.take_snapshot()
+
+    def finish(self, endpoint, at_render):
+        """Stop tracing and add this request's figures to the totals."""
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+            retained = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+            self._tracing.release()
+
+        # Tracing is off again, so the work below is not itself traced
+        retained_sites = self._group(retained)
+        render_sites = self._group(at_render) if at_render is not None else {}
+        with self._lock:
+            self.samples += 1
+            totals = self._endpoints.setdefault(endpoint, {
+                "samples": 0, "peak_bytes": 0, "peak_bytes_total": 0,
+                "retained_bytes_total": 0, "at_render_bytes_total": 0,
+            })
+            totals["samples"] += 1
+            totals["peak_bytes"] = max(totals["peak_bytes"], peak)
+            totals["peak_bytes_total"] += peak
+            totals["retained_bytes_total"] += sum(size for size, _ in retained_sites.values())
+            totals["at_render_bytes_total"] += sum(size for size, _ in render_sites.values())
+            self._merge("retained", retained_sites, endpoint)
+            self._merge("at_render", render_sites, endpoint)
+
+    # --- Aggregation ---------------------------------------------------
+
+    def _site(self, traceback):
+        """The innermost frame in our own code ("routes/tasks.py:128")."""
+        for frame in reversed(traceback):  # tracebacks run oldest → newest
+            filename = frame.filename
+            if filename.startswith(self.root) and "site-packages" not in filename:
+                return f"{os.path.relpath(filename, self.root)}:{frame.lineno}"
+        frame = traceback[-1]
+        return f"{frame.filename}:{frame.lineno}"
+
+    def _group(self, snapshot):
+        """{site: [bytes, blocks]} for one snapshot."""
+        sites = {}
+        # statistics() groups identical tracebacks in C; we only walk the groups
+        for stat in snapshot.filter_traces(_IGNORE).statistics("traceback"):
+            entry = sites.setdefault(self._site(stat.traceback), [0, 0])
+            entry[0] += stat.size
+            entry[1] += stat.count
+        return sites
+
+    def _merge(self, kind, sites, endpoint):
+        totals = self._sites[kind]
+        for site, (size, count) in sites.items():
+            entry = totals.setdefault(site, {"bytes": 0, "blocks": 0, "endpoints": set()})
+            entry["bytes"] += size
+            entry["blocks"] += count
+            entry["endpoints"].add(endpoint)
+        if len(totals) > MAX_SITES:
+            # Forget the smallest half so the table cannot grow without bound
+            keep = sorted(totals.items(), key=lambda item: -item[1]["bytes"])[:MAX_SITES // 2]
+            self._sites[kind] = dict(keep)
+
+    def stats(self, top=20):
+        """Per-endpoint peaks and the top allocation sites, averaged per sample."""
+        with self._lock:
+            endpoints = []
+            for name, totals in self._endpoints.items():
+                samples = totals["samples"]
+                endpoints.append({
+                    "endpoint": name,
+                    "samples": samples,
+                    "peak_bytes": totals["peak_bytes"],
+                    "avg_peak_bytes": totals["peak_bytes_total"] // samples,
+                    "avg_at_render_bytes": totals["at_render_bytes_total"] // samples,
+                    "avg_retained_bytes": totals["retained_bytes_total"] // samples,
+                })
+            endpoints.sort(key=lambda entry: -entry["peak_bytes"])
+
+            sites = {}
+            for kind, totals in self._sites.items():
+                largest = sorted(totals.items(), key=lambda item: -item[1]["bytes"])[:top]
+                sites[kind] = [
+                    {
+                        "site": site,
+                        "avg_bytes": entry["bytes"] // self.samples,
+                        "avg_blocks": entry["blocks"] // self.samples,
+                        "endpoints": sorted(entry["endpoints"]),
+                    }
+                    for site, entry in largest
+                ]
+            return {"samples": self.samples, "endpoints": endpoints, "sites": sites}
+
+
+# One tracer per process, created by init_app()
+tracer = None
+
+
+def stats(top=20):
+    """Process memory plus the sampled figures (tracing may be off)."""
+    result = {
+        "pid": os.getpid(),
+        "sample_rate": tracer.sample_rate if tracer else 0.0,
+        "rss_bytes": rss_bytes(),
+        "max_rss_bytes": max_rss_bytes(),
+    }
+    if tracer is not None:
+        result.update(tracer.stats(top))
+    return result
+
+
+def init_app(app):
+    """Hook sampled tracing into every request when MEMORY_SAMPLE_RATE > 0."""
+    global tracer
+    tracer = MemoryTracer(
+        app.config.get("MEMORY_SAMPLE_RATE", 0.0),
+        app.config.get("MEMORY_TRACE_FRAMES", DEFAULT_FRAMES),
+        app.root_path,
+    )
+    if tracer.sample_rate <= 0:
+        return
+
+    @app.before_request
+    def _start_tracing():
+        g.memory_traced = tracer.start()
+
+    def _before_render(sender, template, context, **extra):
+        # Only the first render: that is where the view's rows are alive
+        if g.get("memory_traced") and "memory_at_render" not in g:
+            g.memory_at_render = tracer.checkpoint()
+
+    # weak=False: the receiver is a local function and must not be collected
+    before_render_template.connect(_before_render, app, weak=False)
+
+    @app.teardown_request
+    def _finish_tracing(exc):
+        if g.pop("memory_traced", False):
+            tracer.finish(request.endpoint or "(unmatched)", g.pop("memory_at_render", None))
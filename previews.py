@@ -0,0 +1,280 @@
+"""
+Attachment Previews — a glance at a file without downloading it.
+
+The problem:
+    To see what is in an attachment, people had to download the whole
+    file. For a big CSV export or a scanned image that is megabytes per
+    glance, and most glances only need the first few rows or a small
+    picture.
+
+The solution — small cached artifacts next to the blob:
+    After an upload, a background thread makes a preview and saves it in
+    UPLOAD_FOLDER beside the stored file:
+
+        <stored name>.preview.json   csv/txt: the first PREVIEW_ROWS rows
+        <stored name>.thumb.png      png/gif: a thumbnail at most
+        <stored name>.thumb.jpg      jpg/jpeg: THUMBNAIL_SIZE pixels
+
+    The task page reads the small JSON file (or links the thumbnail)
+    instead of ever opening the attachment itself. A table preview reads
+    at most PREVIEW_BYTES of the file, so a 5MB CSV costs the same as a
+    small one. Each artifact is written to a temporary name and renamed
+    into place, so a reader never sees half of one.
+
+How it runs:
+    Each worker process has one PreviewWorker: a bounded queue and a
+    thread that works through it. Uploads (sync and ASGI) submit() the
+    new file and return straight away. If the queue is full the file
+    is simply skipped — the task page submits any previewable
+    attachment that has no preview yet, which is also how files
+    uploaded before this feature get one. A file that fails (a corrupt
+    image, say) is remembered and not retried by this process.
+
+Optional dependency:
+    Thumbnails need Pillow (pip install Pillow). Without it, images
+    have no preview; csv/txt previews need only the standard library.
+"""
+
+import collections
+import csv
+import io
+import json
+import os
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional — pip install Pillow
+    Image = None
+
+PREVIEW_ROWS = 20
+PREVIEW_COLUMNS = 12
+PREVIEW_CELL_CHARS = 80
+PREVIEW_BYTES = 64 * 1024
+THUMBNAIL_SIZE = (240, 240)
+QUEUE_SIZE = 1000
+
+TABLE_TYPES = {"csv", "txt"}
+IMAGE_TYPES = {"png", "jpg", "jpeg", "gif"}
+
+
+def available():
+    """Whether image thumbnails can be made (Pillow is installed)."""
+    return Image is not None
+
+
+def _extension(filename):
+    """Original extension of a stored name: "abc.csv.gz" → "csv"."""
+    name = filename[:-3] if filename.endswith(".gz") else filename
+    return name.rsplit(".", 1)[-1].lower()
+
+
+def kind(filename):
+    """"table", "image" or None — what kind of preview a stored file gets."""
+    extension = _extension(filename)
+    if extension in TABLE_TYPES:
+        return "table"
+    if extension in IMAGE_TYPES and available():
+        return "image"
+    return None
+
+
+def table_name(filename):
+    return f"{filename}.preview.json"
+
+
+def thumbnail_name(filename):
+    """JPEG photos stay JPEG (much smaller); png and gif keep transparency as PNG."""
+    return f"{filename}.thumb." + ("jpg" if _extension(filename) in ("jpg", "jpeg") else "png")
+
+
+def _artifact(filename):
+    return table_name(filename) if kind(filename) == "table" else thumbnail_name(filename)
+
+
+def _write_atomic(path, write):
+    """write(file) to a temporary name, then rename it into place."""
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, "wb") as target:
+            write(target)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _table(source, extension):
+    """The first PREVIEW_ROWS rows of a text file, reading at most PREVIEW_BYTES."""
+    head = source.read(PREVIEW_BYTES + 1)
+    truncated = len(head) > PREVIEW_BYTES
+    head = head[:PREVIEW_BYTES]
+    if truncated:
+        head = head[:head.rfind(b"\n") + 1] or head  # drop a cut-off last line
+    text = head.decode("utf-8-sig", errors="replace")
+    lines = text.splitlines()
+    if extension == "csv":
+        rows = list(csv.reader(io.StringIO(text)))
+    else:
+        rows = [[line] for line in lines]
+    more = truncated or len(rows) > PREVIEW_ROWS
+    rows = [
+        [cell[:PREVIEW_CELL_CHARS] for cell in row[:PREVIEW_COLUMNS]]
+        for row in rows[:PREVIEW_ROWS]
+    ]
+    return {"rows": rows, "more": more}
+
+
+def generate(upload_folder, filename, encoding=None):
+    """Make the preview artifact for one stored attachment (in this thread)."""
+    # Imported here: routes.attachments imports this module for submit()
+    from routes.attachments import open_attachment
+
+    preview = kind(filename)
+    if preview is None:
+        return
+    path = os.path.join(upload_folder, _artifact(filename))
+    with open_attachment(upload_folder, filename, encoding) as source:
+        if preview == "table":
+            table = _table(source, _extension(filename))
+            _write_atomic(path, lambda target: target.write(json.dumps(table).encode()))
+            return
+        with Image.open(source) as image:
+            image.draft("RGB", THUMBNAIL_SIZE)  # JPEG: decode at a reduced scale
+            image.thumbnail(THUMBNAIL_SIZE)
+            if path.endswith(".jpg"):
+                image = image.convert("RGB")
+                _write_atomic(path, lambda target: image.save(target, "JPEG", quality=80))
+            else:
+                image = image.convert("RGBA")  # gif/palette → keeps transparency
+                _write_atomic(path, lambda target: image.save(target, "PNG", optimize=True))
+
+
+def read(upload_folder, filename):
+    """The preview to show for a stored attachment, or None if there is none (yet).
+
+        {"kind": "table", "rows": [[...], ...], "more": True}
+        {"kind": "image", "thumbnail": "<name in UPLOAD_FOLDER>"}
+    """
+    preview = kind(filename)
+    if preview == "table":
+        try:
+            with open(os.path.join(upload_folder, table_name(filename)), encoding="utf-8") as source:
+                return {"kind": "table", **json.load(source)}
+        except (OSError, ValueError):
+            return None
+    if preview == "image" and os.path.exists(os.path.join(upload_folder, thumbnail_name(filename))):
+        return {"kind": "image", "thumbnail": thumbnail_name(filename)}
+    return None
+
+
+def discard(upload_folder, filename):
+    """Remove an attachment's preview artifacts (when the attachment is deleted)."""
+    for name in (table_name(filename), thumbnail_name(filename)):
+        path = os.path.join(upload_folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class PreviewWorker:
+    """A bounded queue of attachments to preview and the thread that makes them."""
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._queue = collections.deque()
+        self._pending = set()     # stored names queued or being made
+        self._failed = set()      # stored names that could not be previewed
+        self._pid = os.getpid()
+        self._thread = None
+        self.generated = 0
+        self.skipped = 0          # queue full — picked up again from the task page
+        self.failures = 0
+        self.last_error = None
+
+    def ensure_started(self):
+        """Start the worker thread in this process (threads do not survive fork())."""
+        with self._condition:
+            if self._pid != os.getpid():
+                self._reset()  # a forked child: the parent's queue is the parent's
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="previews", daemon=True)
+            self._thread.start()
+
+    def submit(self, upload_folder, filename, encoding=None):
+        """Queue a stored attachment for a preview. Never waits."""
+        if kind(filename) is None:
+            return
+        self.ensure_started()
+        with self._condition:
+            if filename in self._pending or filename in self._failed:
+                return
+            if len(self._queue) >= self.queue_size:
+                self.skipped += 1
+                return
+            self._pending.add(filename)
+            self._queue.append((upload_folder, filename, encoding))
+            self._condition.notify()
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue)
+                upload_folder, filename, encoding = self._queue.popleft()
+            try:
+                generate(upload_folder, filename, encoding)
+            except FileNotFoundError:
+                pass  # deleted before its turn came
+            except Exception as exc:  # corrupt or unreadable file: remember, move on
+                with self._condition:
+                    self._failed.add(filename)
+                    self.failures += 1
+                    self.last_error = f"{filename}: {exc}"
+            else:
+                with self._condition:
+                    self.generated += 1
+            finally:
+                with self._condition:
+                    self._pending.discard(filename)
+                    self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until the queue is empty (tests and benchmarks)."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending, timeout)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queued": len(self._queue),
+                "queue_size": self.queue_size,
+                "generated": self.generated,
+                "skipped": self.skipped,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "thumbnails": available(),
+            }
+
+
+# One worker per process
+worker = PreviewWorker()
+
+
+def previews_for(upload_folder, attachments):
+    """{stored filename: preview} for the task page, queueing any that are missing.
+
+    Only small artifacts are opened here, never the attachments.
+    """
+    previews = {}
+    for attachment in attachments:
+        preview = read(upload_folder, attachment["filename"])
+        if preview is None:
+            worker.submit(upload_folder, attachment["filename"], attachment["encoding"])
+        else:
+            previews[attachment["filename"]] = preview
+    return previews
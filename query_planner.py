@@ -0,0 +1,357 @@
+"""
+Query Planner — turns list-page query strings into safe, indexed SQL.
+
+The task and client lists let users combine filters and pick a sort
+order, all through the URL:
+
+    /tasks?status=open&status=in_progress&department=Finance
+          &due_from=2025-01-01&due_to=2025-03-31&sort=due_date&order=asc
+
+Building that SQL by hand in every route is repetitive and risky, so
+each list declares what it allows instead:
+
+    TASK_LIST = ListQuery(
+        filters=[Choice("status", "t.status", TASK_STATUSES), ...],
+        sorts={"due_date": "t.due_date", ...},
+        default_sort="created_at",
+    )
+    plan = TASK_LIST.plan(request.args)
+    # plan.where, plan.params, plan.order_by, plan.form, plan.errors
+
+Guarantees:
+    - WHITELISTED: only declared filters and sort columns are ever used.
+      Values always travel as ? parameters, never inside the SQL text.
+    - TYPED: ids must be integers, dates must be YYYY-MM-DD, choices must
+      be one of the allowed values. Bad input is reported in plan.errors
+      and ignored, never passed to SQLite.
+    - INDEX-FRIENDLY: filters compile to plain column comparisons
+      (IN (...), >=, <=) that the indexes in database.py can serve —
+      never functions wrapped around a column, which would force a scan.
+    - CACHED: the SQL for each query SHAPE (which filters are present,
+      how many values each has, which sort) is built once and reused.
+      Identical SQL text also lets sqlite3's own statement cache skip
+      re-preparing the query.
+"""
+
+import datetime
+import functools
+
+
+class Filter:
+    """Base class: one URL parameter mapped to one SQL condition."""
+
+    def __init__(self, name, column):
+        self.name = name
+        self.column = column
+
+    @property
+    def parameters(self):
+        """The URL parameters this filter reads."""
+        return (self.name,)
+
+    def parse(self, args):
+        """Read and validate this filter from the query string.
+
+        Returns the clean value (None = not used); raises ValueError with a
+        user-facing message for invalid input.
+        """
+        raise NotImplementedError
+
+    def shape(self, value):
+        """What the SQL text depends on (not the values themselves)."""
+        return len(value)
+
+    def sql(self, shape):
+        raise NotImplementedError
+
+    def params(self, value):
+        return list(value)
+
+    def form(self, value):
+        """URL parameter → value(s), for re-filling the filter form."""
+        return {self.name: list(value or [])}
+
+
+def _values(args, name):
+    """All values for a parameter: ?x=a&x=b and ?x=a,b both give [a, b]."""
+    values = []
+    for raw in args.getlist(name):
+        values.extend(part.strip() for part in raw.split(","))
+    # Keep order, drop blanks and duplicates (they would only vary the shape)
+    return list(dict.fromkeys(value for value in values if value))
+
+
+class Choice(Filter):
+    """Multi-select from a fixed list of values: column IN (?, ?, ...)."""
+
+    def __init__(self, name, column, choices, label=None):
+        super().__init__(name, column)
+        self.choices = tuple(choices)
+        self.label = label or name.replace("_", " ")
+
+    def parse(self, args):
+        values = _values(args, self.name)
+        invalid = [value for value in values if value not in self.choices]
+        if invalid:
+            raise ValueError(f"Unknown {self.label}: {', '.join(invalid)}")
+        # Every choice selected is the same as no filter at all
+        if not values or len(values) == len(self.choices):
+            return None
+        return values
+
+    def sql(self, shape):
+        if shape == 1:
+            return f"{self.column} = ?"
+        return f"{self.column} IN ({', '.join('?' * shape)})"
+
+
+class IdChoice(Filter):
+    """Multi-select of row ids (users, clients). "none" matches NULL."""
+
+    NONE = "none"
+
+    def __init__(self, name, column, label=None):
+        super().__init__(name, column)
+        self.label = label or name.replace("_", " ")
+
+    def parse(self, args):
+        values = _values(args, self.name)
+        if not values:
+            return None
+        ids = []
+        for value in values:
+            if value == self.NONE:
+                continue
+            try:
+                ids.append(int(value))
+            except ValueError:
+                raise ValueError(f"Invalid {self.label}: {value}") from None
+        return (ids, self.NONE in values)
+
+    def shape(self, value):
+        ids, include_none = value
+        return (len(ids), include_none)
+
+    def sql(self, shape):
+        count, include_none = shape
+        parts = []
+        if count == 1:
+            parts.append(f"{self.column} = ?")
+        elif count:
+            parts.append(f"{self.column} IN ({', '.join('?' * count)})")
+        if include_none:
+            parts.append(f"{self.column} IS NULL")
+        return " OR ".join(parts) if len(parts) == 1 else f"({' OR '.join(parts)})"
+
+    def params(self, value):
+        return list(value[0])
+
+    def form(self, value):
+        if value is None:
+            return {self.name: []}
+        ids, include_none = value
+        return {self.name: [str(i) for i in ids] + ([self.NONE] if include_none else [])}
+
+
+class DateRange(Filter):
+    """Inclusive date range from <prefix>_from and <prefix>_to (YYYY-MM-DD)."""
+
+    def __init__(self, name, column, label=None):
+        super().__init__(name, column)
+        self.label = label or name.replace("_", " ")
+
+    @property
+    def parameters(self):
+        return (f"{self.name}_from", f"{self.name}_to")
+
+    def parse(self, args):
+        bounds = []
+        for parameter in self.parameters:
+            raw = (args.get(parameter) or "").strip()
+            if not raw:
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(datetime.date.fromisoformat(raw).isoformat())
+            except ValueError:
+                raise ValueError(f"Invalid {self.label} date: {raw} (use YYYY-MM-DD)") from None
+        if bounds == [None, None]:
+            return None
+        if None not in bounds and bounds[0] > bounds[1]:
+            raise ValueError(f"The {self.label} range ends before it starts")
+        return bounds
+
+    def shape(self, value):
+        return tuple(bound is not None for bound in value)
+
+    def sql(self, shape):
+        has_from, has_to = shape
+        if has_from and has_to:
+            return f"{self.column} BETWEEN ? AND ?"
+        return f"{self.column} >= ?" if has_from else f"{self.column} <= ?"
+
+    def params(self, value):
+        return [bound for bound in value if bound is not None]
+
+    def form(self, value):
+        return dict(zip(self.parameters, [bound or "" for bound in (value or [None, None])]))
+
+
+class Search(Filter):
+    """Substring search across several text columns (LIKE %term%)."""
+
+    MAX_LENGTH = 100
+
+    def __init__(self, name, columns):
+        super().__init__(name, None)
+        self.columns = tuple(columns)
+
+    def parse(self, args):
+        term = (args.get(self.name) or "").strip()
+        if not term:
+            return None
+        if len(term) > self.MAX_LENGTH:
+            raise ValueError(f"Search text is limited to {self.MAX_LENGTH} characters")
+        return term
+
+    def shape(self, value):
+        return 1
+
+    def sql(self, shape):
+        return "(" + " OR ".join(f"{column} LIKE ?" for column in self.columns) + ")"
+
+    def params(self, value):
+        return [f"%{value}%"] * len(self.columns)
+
+    def form(self, value):
+        return {self.name: value or ""}
+
+
+class Plan:
+    """The result of ListQuery.plan() — everything a route needs."""
+
+    def __init__(self, where, params, order_by, form, sort, order, errors):
+        self.where = where          # " AND ..." conditions (or "")
+        self.params = params        # values for the ? placeholders, in order
+        self.order_by = order_by    # "ORDER BY ..." clause
+        self.form = form            # clean URL values, for re-filling the filter form
+        self.sort = sort
+        self.order = order
+        self.errors = errors        # user-facing messages for ignored input
+
+
+class ListQuery:
+    """The filters and sort columns one list page allows."""
+
+    def __init__(self, filters, sorts, default_sort, default_order="desc", tiebreak="id"):
+        self.filters = {f.name: f for f in filters}
+        self.sorts = dict(sorts)
+        self.default_sort = default_sort
+        self.default_order = default_order
+        self.tiebreak = tiebreak  # makes the order total, so pages never shuffle
+
+    @property
+    def parameters(self):
+        """Every URL parameter that narrows the list (sort/order do not)."""
+        return [parameter for f in self.filters.values() for parameter in f.parameters]
+
+    def plan(self, args):
+        """Validate `args` (request.args) and build the SQL pieces."""
+        values, errors = {}, []
+        for name, filter_ in self.filters.items():
+            try:
+                value = filter_.parse(args)
+            except ValueError as error:
+                errors.append(str(error))
+                continue
+            if value is not None:
+                values[name] = value
+
+        sort = args.get("sort") or self.default_sort
+        if sort not in self.sorts:
+            errors.append(f"Cannot sort by {sort}")
+            sort = self.default_sort
+        order = (args.get("order") or self.default_order).lower()
+        if order not in ("asc", "desc"):
+            errors.append("Order must be asc or desc")
+            order = self.default_order
+
+        shape = tuple((name, self.filters[name].shape(value)) for name, value in values.items())
+        where, order_by = self._compile(shape, sort, order)
+        params, form = [], {"sort": sort, "order": order}
+        for name, filter_ in self.filters.items():
+            form.update(filter_.form(values.get(name)))
+            if name in values:
+                params.extend(filter_.params(values[name]))
+        return Plan(where, params, order_by, form, sort, order, errors)
+
+    @functools.lru_cache(maxsize=256)
+    def _compile(self, shape, sort, order):
+        """Build the SQL text for one query shape (cached)."""
+        where = "".join(f" AND {self.filters[name].sql(part)}" for name, part in shape)
+        column = self.sorts[sort]
+        direction = order.upper()
+        # NULLS LAST: e.g. tasks with no due date go after dated ones either way
+        order_by = (
+            f"ORDER BY {column} {direction} NULLS LAST, {self.tiebreak} {direction}"
+        )
+        return where, order_by
+
+    def cache_info(self):
+        return self._compile.cache_info()
+
+
+# --- The lists ---------------------------------------------------------------
+
+TASK_STATUSES = ("open", "in_progress", "completed", "cancelled")
+TASK_PRIORITIES = ("low", "medium", "high", "urgent")
+DEPARTMENTS = ("Administration", "Client Services", "Finance", "HR", "Management & Strategy")
+CLIENT_STATUSES = ("active", "inactive")
+INDUSTRIES = ("Accounting", "Legal", "Marketing", "Real Estate", "Technology")
+
+# Supporting indexes (database.py, "List filters and sorting"):
+#   status / department / assigned_to + created_at → filter and default sort
+#   created_at, id → the unfiltered list in its default order
+#   due_date → due-date ranges and sort;  client_id → client filter
+TASK_LIST = ListQuery(
+    filters=[
+        Choice("status", "t.status", TASK_STATUSES),
+        Choice("priority", "t.priority", TASK_PRIORITIES),
+        Choice("department", "t.department", DEPARTMENTS),
+        IdChoice("assigned_to", "t.assigned_to", "assignee"),
+        IdChoice("client_id", "t.client_id", "client"),
+        DateRange("due", "t.due_date", "due"),
+        Search("search", ("t.title", "t.description")),
+    ],
+    sorts={
+        "created_at": "t.created_at",
+        "updated_at": "t.updated_at",
+        "due_date": "t.due_date",
+        "title": "t.title",
+        "status": "t.status",
+        "department": "t.department",
+        # urgent first when descending, not alphabetical
+        "priority": "CASE t.priority WHEN 'low' THEN 1 WHEN 'medium' THEN 2 "
+                    "WHEN 'high' THEN 3 WHEN 'urgent' THEN 4 END",
+    },
+    default_sort="created_at",
+    tiebreak="t.id",
+)
+
+# Supporting index: clients (status, company_name)
+CLIENT_LIST = ListQuery(
+    filters=[
+        Choice("status", "status", CLIENT_STATUSES),
+        Choice("industry", "industry", INDUSTRIES),
+        Search("search", ("company_name", "contact_name", "contact_email")),
+    ],
+    sorts={
+        "company_name": "company_name",
+        "contact_name": "contact_name",
+        "industry": "industry",
+        "status": "status",
+        "created_at": "created_at",
+    },
+    default_sort="company_name",
+    default_order="asc",
+)
@@ -0,0 +1,465 @@
+"""
+Reminders — tells people about tasks that are nearly due or overdue.
+
+Until now "overdue" only existed as a number on the dashboard; nobody
+was actually told. This module sends two kinds of notification:
+
+    reminder    REMINDER_DAYS_BEFORE days before the due date,
+                to the assignee (or the department's managers if the
+                task is unassigned)
+    escalation  ESCALATE_AFTER_DAYS days after the due date, if the task
+                is still open — to the assignee AND the managers
+
+How it avoids scanning the tasks table:
+    Each worker keeps a ReminderScheduler: a min-heap of
+    (fire_on, task_id, kind, due_date) entries, so "what is due now?"
+    is a look at the top of the heap. The heap is filled from the
+    idx_tasks_open_due partial index, which holds only open tasks that
+    have a due date, and only for a horizon of HORIZON_DAYS ahead. Each
+    new day loads just the next day's slice of the index.
+
+    After that, the scheduler never re-reads the whole list. It follows
+    change_feed.py: when a task is created, edited, closed or deleted,
+    only the changed rows are re-read (one query per batch of changes).
+    If a task's due date moves, its old heap entries are not searched
+    for — the scheduler remembers each task's current due date, and an
+    entry whose date no longer matches is thrown away when it reaches
+    the top ("lazy deletion", as in workload.py).
+
+How it fires:
+    Everything due is popped together and sent as ONE batch: one query
+    confirms the tasks are still open and finds the recipients, and the
+    notifier gets the whole list at once (the SMTP notifier sends each
+    person one email covering all their tasks).
+
+    Before sending, each notification is claimed with an INSERT into
+    reminders_sent. The primary key makes the claim atomic, so when
+    several workers (or a restart) reach the same reminder, exactly one
+    sends it. If the notifier fails, the claims are deleted again and
+    the batch is retried later.
+
+Where notifications go is pluggable (REMINDER_NOTIFIER):
+    file  → one JSON line per notification in REMINDER_FILE (default)
+    smtp  → email via SMTP_HOST:SMTP_PORT. For local testing, point it
+            at a debugging mail server, e.g.
+                python -m aiosmtpd -n -l localhost:1025
+
+Run it:
+    REMINDERS_ENABLED=1             → a background thread in each worker
+    flask --app app send-reminders  → one pass now (e.g. from cron)
+
+The scheduler follows the single-file change feed, so with sharded
+storage (database.py) neither runs.
+"""
+
+import datetime
+import heapq
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+from email.message import EmailMessage
+
+import database
+from change_feed import feed
+
+log = logging.getLogger(__name__)
+
+REMINDER_DAYS_BEFORE = 1
+ESCALATE_AFTER_DAYS = 1
+HORIZON_DAYS = 14
+REMINDER_FILE = "reminders.log"
+
+# Longest the thread sleeps without a change — a safety net for clock
+# changes; normally it wakes at midnight or when a task changes
+MAX_WAIT_SECONDS = 300
+RETRY_SECONDS = 300
+
+OPEN_STATUSES = ("open", "in_progress")
+
+# The WHERE clause repeats the partial index's condition word for word,
+# so idx_tasks_open_due can answer it. Tasks whose escalation has
+# already gone out for this due date need no timers.
+_OPEN_DUE_QUERY = f"""
+    SELECT t.id, t.due_date FROM {{source}}
+    WHERE t.status IN {OPEN_STATUSES} AND t.due_date IS NOT NULL
+      AND {{condition}}
+      AND NOT EXISTS (
+          SELECT 1 FROM reminders_sent r
+          WHERE r.task_id = t.id AND r.kind = 'escalation' AND r.due_date = t.due_date
+      )
+"""
+
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+# --- Notifiers ---------------------------------------------------------------
+
+class Notifier:
+    """Where notifications go. Subclasses implement send()."""
+
+    def send(self, events):
+        """Deliver a batch of events (dicts, see ReminderScheduler.fire).
+
+        Raise on failure: the batch is then un-claimed and retried.
+        """
+        raise NotImplementedError
+
+
+class FileNotifier(Notifier):
+    """Appends one JSON line per event — for development and testing."""
+
+    def __init__(self, path=REMINDER_FILE):
+        self.path = path
+
+    def send(self, events):
+        sent_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        with open(self.path, "a") as f:
+            for event in events:
+                f.write(json.dumps(dict(event, sent_at=sent_at)) + "\n")
+
+
+class SMTPNotifier(Notifier):
+    """Emails each recipient ONE message listing all of their tasks in the batch."""
+
+    def __init__(self, host="localhost", port=25, sender="portal@localhost",
+                 username=None, password=None, starttls=False, timeout=30):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def _messages(self, events):
+        by_recipient = {}
+        for event in events:
+            for address in event["recipients"]:
+                by_recipient.setdefault(address, []).append(event)
+        for address, mine in by_recipient.items():
+            overdue = sum(1 for event in mine if event["kind"] == "escalation")
+            message = EmailMessage()
+            message["From"] = self.sender
+            message["To"] = address
+            message["Subject"] = (
+                f"{overdue} overdue task(s) need attention" if overdue
+                else f"{len(mine)} task(s) due soon"
+            )
+            lines = []
+            for event in mine:
+                label = "OVERDUE" if event["kind"] == "escalation" else "Due"
+                lines.append(
+                    f"- [{label} {event['due_date']}] #{event['task_id']} {event['title']} "
+                    f"({event['department']}, {event['priority']}, "
+                    f"assigned to {event['assignee'] or 'nobody'})"
+                )
+            message.set_content("\n".join(lines) + "\n")
+            yield message
+
+    def send(self, events):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            for message in self._messages(events):
+                smtp.send_message(message)
+
+
+def notifier_from_config(config):
+    """Build the notifier named by REMINDER_NOTIFIER."""
+    kind = (config.get("REMINDER_NOTIFIER") or "file").lower()
+    if kind == "smtp":
+        return SMTPNotifier(
+            host=config.get("SMTP_HOST") or "localhost",
+            port=int(config.get("SMTP_PORT") or 25),
+            sender=config.get("SMTP_SENDER") or "portal@localhost",
+            username=config.get("SMTP_USERNAME") or None,
+            password=config.get("SMTP_PASSWORD") or None,
+            starttls=bool(config.get("SMTP_STARTTLS")),
+        )
+    if kind == "file":
+        return FileNotifier(config.get("REMINDER_FILE") or REMINDER_FILE)
+    raise ValueError(f"Unknown REMINDER_NOTIFIER: {kind} (use file or smtp)")
+
+
+# --- Scheduler -----------------------------------------------------------------
+
+class ReminderScheduler:
+    """Per-process timer heap over open tasks' due dates."""
+
+    def __init__(self, notifier, days_before=REMINDER_DAYS_BEFORE,
+                 escalate_after=ESCALATE_AFTER_DAYS, horizon_days=HORIZON_DAYS):
+        self.notifier = notifier
+        self.days_before = datetime.timedelta(days=days_before)
+        self.escalate_after = datetime.timedelta(days=escalate_after)
+        self.horizon = datetime.timedelta(days=horizon_days)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._reset()
+        self.last_error = None
+        self.sent = 0
+
+    def _reset(self):
+        self._heap = []             # [(fire_on, task_id, kind, due_date), ...]
+        self._due = {}              # task_id → due date it is scheduled for (the truth)
+        self._loaded_until = None   # tasks due on or before this date are in the heap
+
+    # --- Keeping the heap in step with the tasks table ---
+
+    def _schedule(self, task_id, due_date):
+        if self._due.get(task_id) == due_date:
+            return  # already scheduled for this date
+        try:
+            due = datetime.date.fromisoformat(due_date)
+        except ValueError:
+            self._due.pop(task_id, None)
+            return  # due_date is free text — ignore anything that is not a date
+        self._due[task_id] = due_date
+        heapq.heappush(self._heap, ((due - self.days_before).isoformat(), task_id, "reminder", due_date))
+        heapq.heappush(self._heap, ((due + self.escalate_after).isoformat(), task_id, "escalation", due_date))
+        # Too many stale entries? Rebuild the heap from the current dates.
+        if len(self._heap) > 4 * len(self._due) + 64:
+            entries, self._due = self._due, {}
+            self._heap = []
+            for tid, date in entries.items():
+                self._schedule(tid, date)
+
+    def _load(self, conn, until):
+        """Schedule every open task due after what is loaded, up to `until`."""
+        if self._loaded_until is None:
+            condition, params = "t.due_date <= ?", (until,)
+        else:
+            condition, params = "t.due_date > ? AND t.due_date <= ?", (self._loaded_until, until)
+        # INDEXED BY: without statistics SQLite guesses the status index
+        # is as good, and would then read every open task to check dates
+        query = _OPEN_DUE_QUERY.format(source="tasks t INDEXED BY idx_tasks_open_due",
+                                       condition=condition)
+        for task_id, due_date in conn.execute(query, params):
+            self._schedule(task_id, due_date)
+        self._loaded_until = until
+
+    def _refresh(self, conn, task_ids):
+        """Re-read just these tasks after the change feed reported them."""
+        task_ids = list(task_ids)
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            current = dict(conn.execute(
+                _OPEN_DUE_QUERY.format(source="tasks t",
+                                       condition=f"t.id IN ({_placeholders(chunk)})"),
+                chunk,
+            ).fetchall())
+            for task_id in chunk:
+                due_date = current.get(task_id)
+                if due_date is None or due_date > self._loaded_until:
+                    self._due.pop(task_id, None)  # closed, undated, deleted or beyond the horizon
+                else:
+                    self._schedule(task_id, due_date)
+
+    def advance(self, conn, today, changed_ids=()):
+        """Bring the heap up to date for `today` and the changed tasks."""
+        until = (today + self.horizon).isoformat()
+        if self._loaded_until is None or self._loaded_until < until:
+            self._load(conn, until)
+        if changed_ids:
+            self._refresh(conn, changed_ids)
+
+    # --- Firing ---
+
+    def _pop_due(self, today):
+        """Remove and return every live entry due on or before `today`."""
+        today_iso = today.isoformat()
+        due = []
+        while self._heap and self._heap[0][0] <= today_iso:
+            _, task_id, kind, due_date = heapq.heappop(self._heap)
+            if self._due.get(task_id) != due_date:
+                continue  # stale entry — lazy deletion
+            if kind == "escalation":
+                del self._due[task_id]  # nothing further to send for this date
+            elif due_date < today_iso:
+                continue  # already overdue: the escalation covers it
+            due.append((task_id, kind, due_date))
+        return due
+
+    def _events(self, conn, due, today):
+        """Turn popped entries into events, dropping tasks closed meanwhile."""
+        ids = sorted({task_id for task_id, _, _ in due})
+        tasks = {row["id"]: row for row in conn.execute(f"""
+            SELECT t.id, t.title, t.due_date, t.department, t.priority,
+                   u.full_name AS assignee, u.email AS assignee_email
+            FROM tasks t LEFT JOIN users u ON t.assigned_to = u.id
+            WHERE t.id IN ({_placeholders(ids)}) AND t.status IN {OPEN_STATUSES}
+        """, ids)}
+        departments = sorted({row["department"] for row in tasks.values()})
+        managers = {}
+        for department, email in conn.execute(f"""
+            SELECT department, email FROM users
+            WHERE role = 'manager' AND department IN ({_placeholders(departments)})
+        """, departments):
+            managers.setdefault(department, []).append(email)
+
+        events = []
+        for task_id, kind, due_date in due:
+            task = tasks.get(task_id)
+            if task is None or task["due_date"] != due_date:
+                continue
+            recipients = [task["assignee_email"]] if task["assignee_email"] else []
+            if kind == "escalation" or not recipients:
+                recipients += managers.get(task["department"], [])
+            events.append({
+                "kind": kind,
+                "task_id": task_id,
+                "title": task["title"],
+                "due_date": due_date,
+                "days_overdue": (today - datetime.date.fromisoformat(due_date)).days,
+                "department": task["department"],
+                "priority": task["priority"],
+                "assignee": task["assignee"],
+                "recipients": list(dict.fromkeys(recipients)),
+            })
+        return events
+
+    def _claim(self, conn, events):
+        """Record the events in reminders_sent; keep only those no one sent before."""
+        claimed = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for event in events:
+                if conn.execute(
+                    "INSERT INTO reminders_sent (task_id, kind, due_date) VALUES (?, ?, ?) "
+                    "ON CONFLICT DO NOTHING RETURNING task_id",
+                    (event["task_id"], event["kind"], event["due_date"]),
+                ).fetchone():
+                    claimed.append(event)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return claimed
+
+    def _unclaim(self, conn, events):
+        conn.executemany(
+            "DELETE FROM reminders_sent WHERE task_id = ? AND kind = ? AND due_date = ?",
+            [(event["task_id"], event["kind"], event["due_date"]) for event in events],
+        )
+        conn.commit()
+
+    def fire(self, conn, today):
+        """Send everything due by `today` as one batch. Returns the events sent."""
+        due = self._pop_due(today)
+        if not due:
+            return []
+        events = self._claim(conn, self._events(conn, due, today))
+        if not events:
+            return []
+        try:
+            self.notifier.send(events)
+        except Exception:
+            self._unclaim(conn, events)
+            self._reset()  # reload next time, so the un-claimed events come back
+            raise
+        self.sent += len(events)
+        return events
+
+    def run_once(self, conn, today=None):
+        """Load the heap and fire what is due — one pass, e.g. from cron."""
+        today = today or datetime.date.today()
+        self.advance(conn, today)
+        return self.fire(conn, today)
+
+    def pending(self):
+        """How many tasks have timers in the heap (for diagnostics)."""
+        with self._lock:
+            return len(self._due)
+
+    # --- Background thread ---
+
+    def ensure_started(self):
+        """Start the thread in this process (threads do not survive fork())."""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._reset()
+            self._thread = threading.Thread(target=self._loop, name="reminders", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        conn = database.connect()
+        conn.row_factory = sqlite3.Row
+        cursor = feed.current_id()
+        changed = set()
+        wait = 0
+        while True:
+            events, complete = feed.wait(cursor, timeout=wait)
+            if events:
+                cursor = events[-1]["id"]
+                changed.update(event["row_id"] for event in events if event["table_name"] == "tasks")
+            if not complete:
+                changed.clear()
+                self._reset()  # fell behind the feed: reload from the index
+
+            now = datetime.datetime.now()
+            try:
+                with self._lock:
+                    self.advance(conn, now.date(), changed)
+                    changed.clear()
+                    self.fire(conn, now.date())
+                self.last_error = None
+            except (OSError, sqlite3.Error, smtplib.SMTPException) as exc:
+                log.warning("Reminder batch failed, retrying later: %s", exc)
+                self.last_error = str(exc)
+                wait = RETRY_SECONDS
+                continue
+
+            # Entries only come due at midnight; changes wake us sooner
+            midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                                 datetime.time())
+            wait = min((midnight - now).total_seconds() + 1, MAX_WAIT_SECONDS)
+
+
+scheduler = None
+
+
+def init_app(app):
+    """Read reminder settings, register the CLI command and the scheduler."""
+    import click
+
+    def make_scheduler():
+        return ReminderScheduler(
+            notifier_from_config(app.config),
+            days_before=int(app.config.get("REMINDER_DAYS_BEFORE") or REMINDER_DAYS_BEFORE),
+            escalate_after=int(app.config.get("REMINDER_ESCALATE_AFTER_DAYS") or ESCALATE_AFTER_DAYS),
+        )
+
+    @app.cli.command("send-reminders")
+    @click.option("--date", "on_date", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+                  help="Act as if today were this date (YYYY-MM-DD).")
+    def send_reminders_command(on_date):
+        """Send due-date reminders and escalations that are due now."""
+        if database.SHARDED:
+            raise click.ClickException("Reminders need single-file storage (DATABASE_SHARDED is on)")
+        conn = database.get_db()
+        try:
+            events = make_scheduler().run_once(conn, on_date.date() if on_date else None)
+        finally:
+            conn.close()
+        kinds = [event["kind"] for event in events]
+        print(f"Sent {kinds.count('reminder')} reminder(s) and "
+              f"{kinds.count('escalation')} escalation(s)")
+
+    global scheduler
+    if not app.config.get("REMINDERS_ENABLED") or database.SHARDED:
+        scheduler = None
+        return
+    scheduler = make_scheduler()
+
+    @app.before_request
+    def _start_reminder_scheduler():
+        scheduler.ensure_started()
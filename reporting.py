@@ -0,0 +1,482 @@
+"""
+Reporting — management breakdowns over a columnar snapshot of tasks.
+
+Management wants department × assignee × week breakdowns, overdue
+ageing buckets and priority mixes. Each of those as another GROUP BY
+in routes/dashboard.py would be one more full scan of the tasks table
+per report, per request.
+
+Instead, each worker keeps a TaskSnapshot: the columns the reports
+need, held as NumPy arrays (one array per column, one position per
+task):
+
+    id            int64
+    status        int8    index into TASK_STATUSES (-1 = deleted row)
+    priority      int8    index into TASK_PRIORITIES
+    department    int8    index into DEPARTMENTS (len(DEPARTMENTS) = other)
+    assigned_to   int32   user id, 0 = unassigned
+    created       int32   day number (days since 1970-01-01)
+    due           int32   day number, NO_DAY if none or not a date
+    updated       int32   day number
+
+Every figure is then a handful of whole-array operations — comparisons
+build masks, np.bincount counts groups, np.digitize buckets ages — which
+run in C over contiguous memory. A million tasks report in milliseconds.
+
+Staying current without rescanning:
+    The tasks change counter (see cache.py) says in one read whether
+    anything changed. If it did, the change_feed rows since the
+    snapshot was taken say WHICH tasks, and only those rows are re-read
+    and patched into the arrays. A full rebuild only happens on first
+    use, or if the feed has been pruned past the snapshot.
+
+Memory-mapped snapshots (optional, REPORT_SNAPSHOT_DIR):
+    The arrays are also saved to disk as .npy files. A new worker maps
+    them instead of reading every task — the OS shares the pages between
+    workers — and catches up from the change feed. The mapping is
+    copy-on-write, so patching a worker's copy never touches the file.
+
+NumPy is in requirements.txt. If an older environment does not have it
+yet, the reports page explains how to install it and the rest of the
+portal is unaffected.
+"""
+
+import datetime
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # not installed yet — pip install -r requirements.txt
+    np = None
+
+from query_planner import DEPARTMENTS, TASK_PRIORITIES, TASK_STATUSES
+
+log = logging.getLogger(__name__)
+
+# --- Columns ---------------------------------------------------------------------
+
+NO_DAY = -(2 ** 31)            # "no date" in an int32 day column
+DELETED = -1                   # status code of a row deleted since the last compaction
+OTHER_DEPARTMENT = len(DEPARTMENTS)
+DEPARTMENT_LABELS = DEPARTMENTS + ("Other",)
+
+COLUMNS = (
+    ("id", "int64"),
+    ("status", "int8"),
+    ("priority", "int8"),
+    ("department", "int8"),
+    ("assigned_to", "int32"),
+    ("created", "int32"),
+    ("due", "int32"),
+    ("updated", "int32"),
+)
+
+OPEN_CODES = (TASK_STATUSES.index("open"), TASK_STATUSES.index("in_progress"))
+COMPLETED_CODE = TASK_STATUSES.index("completed")
+
+
+def _code(column, values, other=None):
+    whens = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values))
+    return f"CASE {column} {whens}" + (f" ELSE {other}" if other is not None else "") + " END"
+
+
+def _day(expression):
+    # julianday() is NULL for anything that is not a date — free-text
+    # due dates simply become NO_DAY
+    return f"COALESCE(CAST(julianday({expression}) - 2440587.5 AS INTEGER), {NO_DAY})"
+
+
+# SQLite turns the text columns into integer codes, so Python only ever
+# handles rows of plain ints. status and priority have CHECK constraints.
+_SNAPSHOT_QUERY = f"""
+    SELECT id,
+           {_code("status", TASK_STATUSES)},
+           {_code("priority", TASK_PRIORITIES)},
+           {_code("department", DEPARTMENTS, OTHER_DEPARTMENT)},
+           COALESCE(assigned_to, 0),
+           {_day("DATE(created_at)")},
+           {_day("due_date")},
+           {_day("DATE(updated_at)")}
+    FROM tasks
+"""
+
+# --- Report settings ---------------------------------------------------------------
+
+WEEKS_SHOWN = 12
+# Overdue ageing buckets: the lower bound (days overdue) of each
+AGEING_BOUNDS = (1, 8, 15, 31, 61, 91)
+AGEING_LABELS = ("1–7 days", "8–14 days", "15–30 days", "31–60 days", "61–90 days", "90+ days")
+
+# Rebuild the arrays without deleted rows once they are this share of them
+COMPACT_RATIO = 0.1
+# Re-save a disk snapshot once this share of rows changed since the last save
+RESAVE_RATIO = 0.05
+FETCH_CHUNK = 500
+# A *.partial snapshot directory this old belongs to a worker that died
+# while writing it; younger ones may still be being written
+STALE_PARTIAL_SECONDS = 3600
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def available():
+    return np is not None
+
+
+def day_number(date):
+    return (date - _EPOCH).days
+
+
+def _week(days):
+    """Monday-based week number of a day number (1970-01-05 was a Monday)."""
+    return (days - 4) // 7
+
+
+class TaskSnapshot:
+    """Per-process columnar copy of the tasks table, patched from the change feed."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._columns = None      # name → NumPy array
+        self._counter = None      # tasks change-counter version the arrays match
+        self._cursor = 0          # change_feed id the arrays include
+        self._deleted = 0
+        self._changed_since_save = 0
+        self.stats = {"rebuilds": 0, "loads": 0, "refreshes": 0, "rows_patched": 0,
+                      "save_errors": 0}
+
+    # --- Building ---
+
+    def _arrays(self, rows):
+        table = np.array(rows, dtype=np.int64).reshape(-1, len(COLUMNS))
+        return {name: table[:, i].astype(dtype) for i, (name, dtype) in enumerate(COLUMNS)}
+
+    def _rebuild(self, conn):
+        conn.execute("BEGIN")  # one read transaction: rows, cursor and counter agree
+        try:
+            cursor = conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed").fetchone()[0]
+            counter = _tasks_counter(conn)
+            columns = self._arrays(conn.execute(_SNAPSHOT_QUERY + " ORDER BY id").fetchall())
+        finally:
+            conn.rollback()
+        self._columns, self._cursor, self._counter = columns, cursor, counter
+        self._deleted = 0
+        self.stats["rebuilds"] += 1
+        self._save()
+
+    def _apply(self, rows, changed_ids):
+        """Patch re-read rows into the arrays; ids not in `rows` were deleted."""
+        columns = self._columns
+        ids = columns["id"]
+        fresh = self._arrays(rows)
+        changed = np.array(sorted(changed_ids), dtype=np.int64)
+
+        # Rows that no longer exist: mark deleted where we have them
+        gone = np.setdiff1d(changed, fresh["id"], assume_unique=True)
+        positions = np.searchsorted(ids, gone)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == gone[found]
+        newly_deleted = positions[found][columns["status"][positions[found]] != DELETED]
+        columns["status"][newly_deleted] = DELETED
+        self._deleted += len(newly_deleted)
+
+        # Rows that exist: overwrite in place, or append new ones
+        positions = np.searchsorted(ids, fresh["id"])
+        present = positions < len(ids)
+        present[present] = ids[positions[present]] == fresh["id"][present]
+        for name, _ in COLUMNS:
+            columns[name][positions[present]] = fresh[name][present]
+        if not present.all():
+            added = ~present
+            for name, _ in COLUMNS:
+                columns[name] = np.concatenate([columns[name], fresh[name][added]])
+            if not np.all(columns["id"][:-1] < columns["id"][1:]):
+                order = np.argsort(columns["id"], kind="stable")
+                for name, _ in COLUMNS:
+                    columns[name] = columns[name][order]
+
+        if self._deleted > COMPACT_RATIO * len(columns["id"]):
+            keep = columns["status"] != DELETED
+            for name, _ in COLUMNS:
+                columns[name] = columns[name][keep]
+            self._deleted = 0
+        self._changed_since_save += len(changed)
+
+    def _catch_up(self, conn):
+        """Bring the arrays up to date. Returns False if a rebuild is needed."""
+        counter = _tasks_counter(conn)
+        if counter == self._counter:
+            return True  # nothing written to tasks since — the common case
+        oldest = conn.execute("SELECT MIN(id) FROM change_feed").fetchone()[0]
+        if oldest is not None and oldest > self._cursor + 1:
+            return False  # the feed was pruned past us: we cannot know what changed
+        latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed").fetchone()[0]
+        changed = [row[0] for row in conn.execute(
+            "SELECT DISTINCT row_id FROM change_feed "
+            "WHERE id > ? AND id <= ? AND table_name = 'tasks'",
+            (self._cursor, latest),
+        )]
+        rows = []
+        for start in range(0, len(changed), FETCH_CHUNK):
+            chunk = changed[start:start + FETCH_CHUNK]
+            rows += conn.execute(
+                f"{_SNAPSHOT_QUERY} WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+        if changed:
+            self._apply(rows, changed)
+        self._cursor, self._counter = latest, counter
+        self.stats["refreshes"] += 1
+        self.stats["rows_patched"] += len(changed)
+        if self._changed_since_save > RESAVE_RATIO * max(len(self._columns["id"]), 1):
+            self._save()
+        return True
+
+    def refresh(self, conn):
+        """Make sure the arrays reflect the tasks table. Caller holds the lock."""
+        if self._columns is None and not self._load():
+            self._rebuild(conn)
+            return
+        if not self._catch_up(conn):
+            self._rebuild(conn)
+
+    # --- Disk snapshots (memory-mapped) ---
+
+    def _save(self):
+        """Write the arrays to disk for other workers, if REPORT_SNAPSHOT_DIR is set.
+
+        The disk copy only saves other workers a rebuild, so a failure
+        (disk full, another worker's cleanup) is logged, never raised:
+        the report is served from this process's arrays either way.
+        """
+        self._changed_since_save = 0
+        if not self.directory:
+            return
+        try:
+            self._write_snapshot()
+        except OSError as exc:
+            self.stats["save_errors"] += 1
+            log.warning("Could not save the report snapshot in %s: %s", self.directory, exc)
+
+    def _write_snapshot(self):
+        """Write the arrays to <directory>/<cursor>-<pid>/ and point CURRENT at it."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self._cursor}-{os.getpid()}"
+        target = os.path.join(self.directory, name)
+        if os.path.exists(target):
+            return
+        work = target + ".partial"
+        os.makedirs(work, exist_ok=True)
+        keep = self._columns["status"] != DELETED
+        for column, _ in COLUMNS:
+            np.save(os.path.join(work, f"{column}.npy"), self._columns[column][keep])
+        with open(os.path.join(work, "meta.json"), "w") as f:
+            json.dump({"cursor": self._cursor, "counter": self._counter}, f)
+        os.rename(work, target)
+        pointer = os.path.join(self.directory, "CURRENT")
+        temporary = f"{pointer}.{os.getpid()}.tmp"  # workers may save at once
+        with open(temporary, "w") as f:
+            f.write(name)
+        os.replace(temporary, pointer)
+        self._remove_old_snapshots(name)
+
+    def _remove_old_snapshots(self, name):
+        """Delete complete snapshots other than ours and the one CURRENT names.
+
+        Other workers may be writing their own *.partial directories right
+        now, so those are left alone unless they are clearly abandoned.
+        Workers that still have an older snapshot mapped are unaffected:
+        on POSIX the deleted files stay readable until they unmap them.
+        """
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                current = f.read().strip()  # another worker may have saved since
+        except OSError:
+            current = name
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if entry in (name, current, "CURRENT") or not os.path.isdir(path):
+                continue
+            if entry.endswith(".partial"):
+                try:
+                    if time.time() - os.path.getmtime(path) < STALE_PARTIAL_SECONDS:
+                        continue
+                except OSError:
+                    continue  # renamed into place meanwhile
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _load(self):
+        """Map the newest disk snapshot, if there is one. Returns True on success."""
+        if not self.directory:
+            return False
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                path = os.path.join(self.directory, f.read().strip())
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            # mmap_mode="c": copy-on-write — patches stay private to this process
+            columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c")
+                       for name, _ in COLUMNS}
+        except (OSError, ValueError):
+            return False
+        self._columns = columns
+        self._cursor, self._counter = meta["cursor"], meta["counter"]
+        self._deleted = self._changed_since_save = 0
+        self.stats["loads"] += 1
+        return True
+
+    # --- Reports ---
+
+    def report(self, conn, scope, today=None, metric="created"):
+        """Refresh, then compute every figure for `scope` (see build_report)."""
+        with self._lock:
+            started = time.perf_counter()
+            self.refresh(conn)
+            refreshed = time.perf_counter()
+            result = build_report(self._columns, scope, today or datetime.date.today(), metric)
+            result["timings"] = {
+                "refresh_ms": round((refreshed - started) * 1000, 2),
+                "compute_ms": round((time.perf_counter() - refreshed) * 1000, 2),
+                "rows": int(len(self._columns["id"]) - self._deleted),
+            }
+            return result
+
+
+def _tasks_counter(conn):
+    return conn.execute(
+        "SELECT version FROM change_counters WHERE table_name = 'tasks'"
+    ).fetchone()[0]
+
+
+def _scope_mask(columns, scope):
+    """Which rows `scope` may see — the same rules as the dashboard."""
+    mask = columns["status"] != DELETED
+    if scope[0] == "manager":
+        department = scope[1]
+        code = DEPARTMENTS.index(department) if department in DEPARTMENTS else OTHER_DEPARTMENT
+        mask &= columns["department"] == code
+    elif scope[0] == "staff":
+        mask &= columns["assigned_to"] == scope[1]
+    return mask
+
+
+def _count(keys, mask, size):
+    """np.bincount of keys[mask] over 0..size-1.
+
+    Rows outside the mask are sent to an extra bin that is then dropped,
+    which is cheaper than copying out the selected rows first.
+    """
+    return np.bincount(np.where(mask, keys, size), minlength=size + 1)[:size]
+
+
+def build_report(columns, scope, today, metric="created"):
+    """Every report figure, computed with whole-array operations.
+
+    metric: "created" counts tasks by the week they were created,
+            "completed" counts completed tasks by the week of their last update.
+    Returns plain lists and ints, ready for the template or JSON.
+    """
+    visible = _scope_mask(columns, scope)
+    status = columns["status"]
+    department = columns["department"].astype(np.intp)
+    due = columns["due"]
+    today_day = day_number(today)
+    n_departments, n_priorities = len(DEPARTMENT_LABELS), len(TASK_PRIORITIES)
+
+    is_open = visible & ((status == OPEN_CODES[0]) | (status == OPEN_CODES[1]))
+
+    # --- Status totals ---
+    status_counts = _count(status.astype(np.intp), visible, len(TASK_STATUSES))
+
+    # --- Priority mix of open work, per department ---
+    mix = _count(
+        department * n_priorities + columns["priority"], is_open, n_departments * n_priorities
+    ).reshape(n_departments, n_priorities)
+
+    # --- Overdue ageing buckets, per department ---
+    overdue = is_open & (due != NO_DAY) & (due < today_day)
+    age_days = today_day - due[overdue].astype(np.int64)
+    bucket = np.digitize(age_days, AGEING_BOUNDS) - 1          # 0 .. len(bounds) - 1
+    n_buckets = len(AGEING_BOUNDS)
+    ageing = np.bincount(
+        department[overdue] * n_buckets + bucket, minlength=n_departments * n_buckets
+    ).reshape(n_departments, n_buckets)
+
+    # --- Department × assignee × week ---
+    if metric == "completed":
+        counted = visible & (status == COMPLETED_CODE)
+        days = columns["updated"]
+    else:
+        counted = visible
+        days = columns["created"]
+    first_week = _week(today_day) - WEEKS_SHOWN + 1
+    week = _week(days.astype(np.intp)) - first_week
+    counted &= (days != NO_DAY) & (week >= 0) & (week < WEEKS_SHOWN)
+    # User ids are small integers, so they index the cube directly (0 =
+    # unassigned) — no sorting to find the distinct assignees
+    assigned = columns["assigned_to"]
+    n_users = int(assigned.max(initial=0)) + 1
+    cube = _count(
+        (department * n_users + assigned) * WEEKS_SHOWN + week,
+        counted,
+        n_departments * n_users * WEEKS_SHOWN,
+    ).reshape(n_departments, n_users, WEEKS_SHOWN)
+    per_pair = cube.sum(axis=2)
+    department_weeks = cube.sum(axis=1)
+
+    week_labels = [
+        (_EPOCH + datetime.timedelta(days=int((first_week + i) * 7 + 4))).strftime("%d %b")
+        for i in range(WEEKS_SHOWN)
+    ]
+    breakdown = [
+        {
+            "department": DEPARTMENT_LABELS[d],
+            "assigned_to": int(a),
+            "weeks": cube[d, a].tolist(),
+            "total": int(per_pair[d, a]),
+        }
+        for d, a in zip(*np.nonzero(per_pair))
+    ]
+
+    shown = [d for d in range(n_departments) if mix[d].any() or ageing[d].any()
+             or department_weeks[d].any()]
+    return {
+        "metric": metric,
+        "today": today.isoformat(),
+        "status_counts": dict(zip(TASK_STATUSES, status_counts.tolist())),
+        "open_tasks": int(is_open.sum()),
+        "overdue_tasks": int(overdue.sum()),
+        "departments": [DEPARTMENT_LABELS[d] for d in shown],
+        "priority_mix": {
+            "labels": list(TASK_PRIORITIES),
+            "rows": [{"department": DEPARTMENT_LABELS[d], "counts": mix[d].tolist(),
+                      "total": int(mix[d].sum())} for d in shown],
+        },
+        "ageing": {
+            "labels": list(AGEING_LABELS),
+            "rows": [{"department": DEPARTMENT_LABELS[d], "counts": ageing[d].tolist(),
+                      "total": int(ageing[d].sum())} for d in shown],
+            "totals": ageing.sum(axis=0).tolist(),
+        },
+        "weekly": {
+            "labels": week_labels,
+            "series": [{"department": DEPARTMENT_LABELS[d], "data": department_weeks[d].tolist()}
+                       for d in shown],
+            "breakdown": breakdown,
+        },
+    }
+
+
+# One snapshot per process; init_app() points it at REPORT_SNAPSHOT_DIR
+snapshot = TaskSnapshot()
+
+
+def init_app(app):
+    """Read reporting settings from config."""
+    global snapshot
+    snapshot = TaskSnapshot(app.config.get("REPORT_SNAPSHOT_DIR") or None)
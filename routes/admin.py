@@ -0,0 +1,120 @@
+"""
+Admin Routes — operational views for administrators.
+
+These pages are about the running system rather than business data:
+    GET /admin/admission  → concurrency limits, queue depth and rejections
+    GET /admin/storage    → attachment bytes uploaded vs. bytes on disk,
+                            and the preview worker's queue
+    GET /admin/memory     → RSS, per-endpoint peaks, top allocation sites
+    GET /admin/audit      → search the audit trail (renders audit.html)
+
+Admin only — every route uses @role_required("admin").
+The figures are per worker process: with several Gunicorn workers,
+each request may be answered by a different one.
+"""
+
+import os
+from flask import Blueprint, jsonify, render_template, request
+from routes.auth import login_required, role_required
+from database import fan_out, get_db
+import admission
+import audit
+import memtrace
+import previews
+import typeahead
+
+admin_bp = Blueprint("admin", __name__)
+
+
+@admin_bp.route("/admission", methods=["GET"])
+@login_required
+@role_required("admin")
+def admission_stats():
+    """Admission-control counters for this worker, as JSON."""
+    return jsonify(pid=os.getpid(), classes=admission.stats())
+
+
+@admin_bp.route("/storage", methods=["GET"])
+@login_required
+@role_required("admin")
+def storage_stats():
+    """Attachment storage by file type: logical vs. stored bytes, as JSON.
+
+    logical = what users uploaded; stored = what is on disk after
+    compression at rest (see routes/attachments.py).
+    """
+    def fetch(conn):
+        return conn.execute(
+            "SELECT original_filename, encoding, file_size, stored_size FROM attachments"
+        ).fetchall()
+
+    types = {}
+    for row in (row for rows in fan_out(fetch) for row in rows):
+        extension = row["original_filename"].rsplit(".", 1)[-1].lower()
+        entry = types.setdefault(extension, {
+            "type": extension, "files": 0, "compressed_files": 0,
+            "logical_bytes": 0, "stored_bytes": 0,
+        })
+        entry["files"] += 1
+        entry["compressed_files"] += row["encoding"] is not None
+        entry["logical_bytes"] += row["file_size"]
+        entry["stored_bytes"] += row["stored_size"] or row["file_size"]
+
+    types = sorted(types.values(), key=lambda entry: -entry["logical_bytes"])
+    logical = sum(entry["logical_bytes"] for entry in types)
+    stored = sum(entry["stored_bytes"] for entry in types)
+    return jsonify(
+        types=types,
+        logical_bytes=logical,
+        stored_bytes=stored,
+        ratio=round(logical / stored, 2) if stored else None,
+        previews=previews.worker.stats(),
+    )
+
+
+@admin_bp.route("/memory", methods=["GET"])
+@login_required
+@role_required("admin")
+def memory_stats():
+    """Memory use of this worker and what sampled requests allocated, as JSON.
+
+    Per-endpoint figures and allocation sites only fill in when
+    MEMORY_SAMPLE_RATE is above 0 (see memtrace.py). ?top= sets how
+    many allocation sites to list (default 20).
+    """
+    top = max(1, min(request.args.get("top", 20, type=int), 200))
+    return jsonify(memtrace.stats(top))
+
+
+@admin_bp.route("/audit", methods=["GET"])
+@login_required
+@role_required("admin")
+def audit_log():
+    """Search the audit trail, 50 events per page (?before=<id> for older).
+
+    Filters: entity (task/client/attachment), entity_id, user_id, action.
+    Events reach the table a second or so after the change (audit.py).
+    """
+    filters = {
+        "entity": request.args.get("entity", "") if request.args.get("entity") in audit.ENTITIES else "",
+        "entity_id": request.args.get("entity_id", type=int),
+        "user_id": request.args.get("user_id", type=int),
+        "action": request.args.get("action", "") if request.args.get("action") in audit.ACTIONS else "",
+    }
+    before_id = request.args.get("before", type=int)
+
+    conn = get_db()
+    events, next_before_id = audit.search(conn, before_id=before_id, **filters)
+    conn.close()
+
+    user_label = typeahead.user_index().label(filters["user_id"]) if filters["user_id"] else ""
+    return render_template(
+        "audit.html",
+        events=events,
+        next_before_id=next_before_id,
+        filters=filters,
+        user_label=user_label or "",
+        writer=audit.writer.stats(),
+        entities=audit.ENTITIES,
+        actions=audit.ACTIONS,
+    )
@@ -0,0 +1,708 @@
+"""
+JSON API (version 1) — machine-readable access for integrations.
+
+Until now, integrations scraped the HTML of /tasks and /dashboard. That
+makes the server render whole Jinja2 pages (and dropdowns) only for the
+caller to throw the HTML away. These routes return just the data.
+
+    GET  /api/v1/tasks               → tasks, newest first (keyset-paginated)
+    GET  /api/v1/tasks/<id>          → one task
+    GET  /api/v1/clients             → clients A-Z (admin/manager)
+    GET  /api/v1/clients/<id>        → one client (admin/manager)
+    GET  /api/v1/dashboard           → the same figures the dashboard shows
+    POST /api/v1/batch               → many reads/writes in ONE transaction
+
+Authentication is the same session cookie the browser uses, checked by
+the same @login_required / @role_required decorators — they return JSON
+401/403 responses for this blueprint instead of redirecting.
+
+Role rules (routes.auth.role_filter, as on the dashboard):
+    Admin:   every task
+    Manager: tasks in their own department
+    Staff:   tasks assigned to them
+
+Performance features:
+    ?fields=id,title,status   Sparse fieldsets — only the columns asked for
+                              are selected, joined and serialised.
+    ?limit=50&after=<cursor>  Keyset pagination — each page continues from
+                              the last row's sort key (WHERE id < ?), so page
+                              500 is as cheap as page 1. OFFSET would make
+                              SQLite walk and discard every earlier row.
+    ETag / If-None-Match      The ETag is built from the table change
+                              counters (cache.py), so an unchanged
+                              collection is answered with 304 Not Modified
+                              WITHOUT running its query at all.
+
+Optimistic concurrency:
+    Tasks and clients carry a version number that every write bumps.
+    Batch update/delete operations may include the "version" they last
+    read; the write is then one conditional statement
+    (WHERE id = ? AND version = ?) and fails with 409 Conflict if
+    someone else changed the row in between, instead of overwriting it.
+
+Sharded storage (see database.py):
+    /tasks reads each shard in parallel — at most limit + 1 rows from
+    each — and merges them by id, which is still one global order
+    because every shard numbers its tasks from its own range.
+    A batch is one transaction, which cannot span shard files, so
+    /batch answers 503 Service Unavailable in sharded mode.
+"""
+
+import base64
+import hashlib
+import heapq
+import json
+import sqlite3
+import time
+from flask import Blueprint, request, session, jsonify, make_response
+from routes.auth import login_required, role_required, role_filter
+from routes.dashboard import dashboard_data
+from database import fan_out, get_db, task_db
+import database
+from query_planner import TASK_LIST, CLIENT_LIST, TASK_STATUSES, TASK_PRIORITIES, CLIENT_STATUSES
+import audit
+import cache
+
+api_bp = Blueprint("api", __name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BATCH_OPERATIONS = 100
+
+# Public field name → SQL expression. Only names listed here can ever be
+# selected, so ?fields= can never inject SQL.
+TASK_FIELDS = {
+    "id": "t.id",
+    "title": "t.title",
+    "description": "t.description",
+    "status": "t.status",
+    "priority": "t.priority",
+    "department": "t.department",
+    "assigned_to": "t.assigned_to",
+    "assigned_name": "u.full_name",
+    "client_id": "t.client_id",
+    "client_name": "c.company_name",
+    "due_date": "t.due_date",
+    "created_by": "t.created_by",
+    "created_at": "t.created_at",
+    "updated_at": "t.updated_at",
+    "version": "t.version",
+}
+TASK_DEFAULT_FIELDS = (
+    "id", "title", "status", "priority", "department",
+    "assigned_to", "assigned_name", "client_id", "client_name", "due_date", "version",
+)
+
+CLIENT_FIELDS = {
+    "id": "c.id",
+    "company_name": "c.company_name",
+    "contact_name": "c.contact_name",
+    "contact_email": "c.contact_email",
+    "contact_phone": "c.contact_phone",
+    "industry": "c.industry",
+    "status": "c.status",
+    "notes": "c.notes",
+    "created_at": "c.created_at",
+    "updated_at": "c.updated_at",
+    "version": "c.version",
+}
+CLIENT_DEFAULT_FIELDS = (
+    "id", "company_name", "contact_name", "contact_email", "industry", "status", "version",
+)
+
+# Columns a batch write may set
+TASK_WRITABLE = (
+    "title", "description", "status", "priority", "department",
+    "assigned_to", "client_id", "due_date",
+)
+CLIENT_WRITABLE = (
+    "company_name", "contact_name", "contact_email", "contact_phone",
+    "industry", "status", "notes",
+)
+
+
+class ApiError(Exception):
+    """An error that becomes a JSON response with the given HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_bp.errorhandler(ApiError)
+def _handle_api_error(error):
+    return jsonify(error=error.message), error.status
+
+
+# --- Helpers ---------------------------------------------------------------
+
+
+def _parse_fields(raw, allowed, default):
+    """Turn ?fields=a,b,c into a validated list of field names."""
+    if not raw:
+        return list(default)
+    if not isinstance(raw, str):
+        raise ApiError("fields must be a comma-separated string")
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def _parse_limit():
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor, *types):
+    """Decode an ?after= cursor made by _encode_cursor().
+
+    `types` is the expected type of each value, e.g. (int,) for a task
+    cursor — anything else is a tampered or stale cursor, not a 500.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ApiError("Invalid cursor")
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(isinstance(value, kind) and not isinstance(value, bool)
+                   for value, kind in zip(values, types))
+    ):
+        raise ApiError("Invalid cursor")
+    return values
+
+
+def _select_list(fields, field_map, always):
+    """SELECT list for the requested fields plus any columns we need internally."""
+    names = list(dict.fromkeys(list(always) + fields))
+    return names, ", ".join(f"{field_map[name]} AS {name}" for name in names)
+
+
+def _etag(*tables, dated=False):
+    """Build an ETag from table versions, the caller's scope and the URL.
+
+    The same URL can return different data for different users, so the
+    user's identity and role are part of the tag. dated=True adds
+    today's date (UTC, like DATE('now')) for payloads that change at
+    midnight without any write — e.g. the overdue count.
+    """
+    versions = cache.table_versions()
+    parts = [f"{table}:{versions.get(table)}" for table in tables]
+    parts += [str(session.get("user_id")), str(session.get("role")), request.full_path]
+    if dated:
+        parts.append(time.strftime("%Y-%m-%d", time.gmtime()))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _not_modified(etag):
+    """Return a 304 response if the client already has this version."""
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def _json_with_etag(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # "private": per-user data; "no-cache": always revalidate with the ETag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _fetch_task(conn, task_id, fields):
+    _, select = _select_list(fields, TASK_FIELDS, ["id"])
+    where, params = role_filter()
+    row = conn.execute(
+        f"""SELECT {select} FROM tasks t
+            LEFT JOIN users u ON t.assigned_to = u.id
+            LEFT JOIN clients c ON t.client_id = c.id
+            WHERE t.id = ?{where}""",
+        [task_id] + params,
+    ).fetchone()
+    if row is None:
+        raise ApiError("Task not found", 404)
+    return {name: row[name] for name in fields}
+
+
+def _fetch_client(conn, client_id, fields):
+    _, select = _select_list(fields, CLIENT_FIELDS, ["id"])
+    row = conn.execute(
+        f"SELECT {select} FROM clients c WHERE c.id = ?", (client_id,)
+    ).fetchone()
+    if row is None:
+        raise ApiError("Client not found", 404)
+    return {name: row[name] for name in fields}
+
+
+# --- Collections -----------------------------------------------------------
+
+
+@api_bp.route("/tasks", methods=["GET"])
+@login_required
+def list_tasks():
+    """Tasks visible to the caller, newest first, one page at a time.
+
+    Accepts the same filters as the task list page (query_planner.TASK_LIST),
+    e.g. ?status=open,in_progress&due_from=2025-01-01. Results always come
+    newest first — keyset cursors depend on that order, so ?sort= is ignored.
+    """
+    etag = _etag("tasks", "users", "clients")
+    cached_response = _not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    fields = _parse_fields(request.args.get("fields"), TASK_FIELDS, TASK_DEFAULT_FIELDS)
+    limit = _parse_limit()
+    names, select = _select_list(fields, TASK_FIELDS, ["id"])
+
+    # Only join the tables the requested fields actually need
+    joins = ""
+    if "assigned_name" in names:
+        joins += " LEFT JOIN users u ON t.assigned_to = u.id"
+    if "client_name" in names:
+        joins += " LEFT JOIN clients c ON t.client_id = c.id"
+
+    plan = TASK_LIST.plan(request.args)
+    if plan.errors:
+        raise ApiError("; ".join(plan.errors))
+    where, params = role_filter()
+    where += plan.where
+    params += plan.params
+    if request.args.get("after"):
+        (last_id,) = _decode_cursor(request.args["after"], int)
+        where += " AND t.id < ?"
+        params.append(last_id)
+
+    def fetch(conn):
+        return conn.execute(
+            f"SELECT {select} FROM tasks t{joins} WHERE 1=1{where} ORDER BY t.id DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+
+    results = fan_out(fetch, plan.form["department"])
+    rows = list(heapq.merge(*results, key=lambda row: row["id"], reverse=True))[:limit + 1]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor([rows[-1]["id"]]) if has_more else None
+    return _json_with_etag(
+        {"data": [{name: row[name] for name in fields} for row in rows], "next": next_cursor},
+        etag,
+    )
+
+
+@api_bp.route("/tasks/<int:task_id>", methods=["GET"])
+@login_required
+def get_task(task_id):
+    """A single task, if the caller's role allows them to see it."""
+    etag = _etag("tasks", "users", "clients")
+    cached_response = _not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    fields = _parse_fields(request.args.get("fields"), TASK_FIELDS, TASK_FIELDS)
+    conn = task_db(task_id)
+    try:
+        task = _fetch_task(conn, task_id, fields)
+    finally:
+        conn.close()
+    return _json_with_etag({"data": task}, etag)
+
+
+@api_bp.route("/clients", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def list_clients():
+    """Clients A-Z, one page at a time.
+
+    Accepts the client list page's filters (query_planner.CLIENT_LIST),
+    e.g. ?industry=Legal,Marketing&search=ltd. Always sorted A-Z.
+    """
+    etag = _etag("clients")
+    cached_response = _not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    fields = _parse_fields(request.args.get("fields"), CLIENT_FIELDS, CLIENT_DEFAULT_FIELDS)
+    limit = _parse_limit()
+    names, select = _select_list(fields, CLIENT_FIELDS, ["id", "company_name"])
+
+    plan = CLIENT_LIST.plan(request.args)
+    if plan.errors:
+        raise ApiError("; ".join(plan.errors))
+    where, params = plan.where, list(plan.params)
+    if request.args.get("after"):
+        last_name, last_id = _decode_cursor(request.args["after"], str, int)
+        # Row-value comparison: continue after (name, id) in sort order
+        where += " AND (c.company_name, c.id) > (?, ?)"
+        params.extend([last_name, last_id])
+
+    conn = get_db()
+    rows = conn.execute(
+        f"SELECT {select} FROM clients c WHERE 1=1{where} ORDER BY c.company_name, c.id LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (
+        _encode_cursor([rows[-1]["company_name"], rows[-1]["id"]]) if has_more else None
+    )
+    return _json_with_etag(
+        {"data": [{name: row[name] for name in fields} for row in rows], "next": next_cursor},
+        etag,
+    )
+
+
+@api_bp.route("/clients/<int:client_id>", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def get_client(client_id):
+    """A single client."""
+    etag = _etag("clients")
+    cached_response = _not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    fields = _parse_fields(request.args.get("fields"), CLIENT_FIELDS, CLIENT_FIELDS)
+    conn = get_db()
+    try:
+        client = _fetch_client(conn, client_id, fields)
+    finally:
+        conn.close()
+    return _json_with_etag({"data": client}, etag)
+
+
+@api_bp.route("/dashboard", methods=["GET"])
+@login_required
+def dashboard_summary():
+    """The dashboard's summary figures and chart series, as JSON."""
+    # Dated: the overdue count moves at midnight with no table changing
+    etag = _etag("tasks", "users", "clients", dated=True)
+    cached_response = _not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    summary, charts = dashboard_data()
+    return _json_with_etag({"summary": summary, "charts": charts}, etag)
+
+
+# --- Batch -----------------------------------------------------------------
+
+
+def _require_role(*roles):
+    if session.get("role") not in roles:
+        raise ApiError("Forbidden", 403)
+
+
+def _clean_task_fields(fields, creating):
+    """Validate writable task fields. Returns a dict of column → value."""
+    if not isinstance(fields, dict):
+        raise ApiError("fields must be an object")
+    unknown = [name for name in fields if name not in TASK_WRITABLE]
+    if unknown:
+        raise ApiError(f"Unknown or read-only field(s): {', '.join(unknown)}")
+    values = dict(fields)
+    if creating:
+        values.setdefault("status", "open")
+        values.setdefault("priority", "medium")
+        if not str(values.get("title") or "").strip():
+            raise ApiError("Title is required")
+        if not str(values.get("department") or "").strip():
+            raise ApiError("Department is required")
+    if "title" in values and not str(values["title"] or "").strip():
+        raise ApiError("Title is required")
+    if "status" in values and values["status"] not in TASK_STATUSES:
+        raise ApiError(f"Status must be one of: {', '.join(TASK_STATUSES)}")
+    if "priority" in values and values["priority"] not in TASK_PRIORITIES:
+        raise ApiError(f"Priority must be one of: {', '.join(TASK_PRIORITIES)}")
+    return values
+
+
+def _clean_client_fields(fields, creating):
+    """Validate writable client fields. Returns a dict of column → value."""
+    if not isinstance(fields, dict):
+        raise ApiError("fields must be an object")
+    unknown = [name for name in fields if name not in CLIENT_WRITABLE]
+    if unknown:
+        raise ApiError(f"Unknown or read-only field(s): {', '.join(unknown)}")
+    values = dict(fields)
+    required = ("company_name", "contact_name", "contact_email")
+    for name in required:
+        if (creating or name in values) and not str(values.get(name) or "").strip():
+            raise ApiError(f"{name} is required")
+    if creating:
+        values.setdefault("status", "active")
+    if "status" in values and values["status"] not in CLIENT_STATUSES:
+        raise ApiError("Status must be 'active' or 'inactive'")
+    return values
+
+
+def _insert(conn, table, values):
+    columns = ", ".join(values)
+    placeholders = ", ".join("?" for _ in values)
+    cursor = conn.execute(
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", list(values.values())
+    )
+    return cursor.lastrowid
+
+
+def _update(conn, table, row_id, values, version=None, extra_where="", extra_params=(),
+            returning="version"):
+    """One conditional UPDATE that bumps the row's version.
+
+    Returns the RETURNING row (the new version, plus any other columns
+    asked for), or None if no row matched.
+    """
+    if not values:
+        raise ApiError("No fields to update")
+    assignments = ", ".join(f"{name} = ?" for name in values)
+    params = list(values.values()) + [row_id]
+    if version is not None:
+        extra_where = " AND version = ?" + extra_where
+        extra_params = (version,) + tuple(extra_params)
+    return conn.execute(
+        f"UPDATE {table} SET {assignments}, updated_at = CURRENT_TIMESTAMP, "
+        f"version = version + 1 WHERE id = ?{extra_where} RETURNING {returning}",
+        params + list(extra_params),
+    ).fetchone()
+
+
+def _delete(conn, table, row_id, version=None, extra_where=""):
+    """One conditional DELETE. Returns True if a row was deleted."""
+    params = [row_id]
+    if version is not None:
+        extra_where = " AND version = ?" + extra_where
+        params.append(version)
+    return conn.execute(
+        f"DELETE FROM {table} WHERE id = ?{extra_where} RETURNING id", params
+    ).fetchone() is not None
+
+
+def _write_failed(conn, table, row_id, version, noun):
+    """Raise the right error for a write that matched no row.
+
+    Only runs on failure — the successful path never reads first.
+    """
+    current = conn.execute(f"SELECT version FROM {table} WHERE id = ?", (row_id,)).fetchone()
+    if current is None or version is None or current["version"] == version:
+        # Missing — or hidden from this user (e.g. staff, someone else's task)
+        raise ApiError(f"{noun} not found", 404)
+    raise ApiError(
+        f"{noun} was changed by someone else (now version {current['version']}, "
+        f"you sent {version})",
+        409,
+    )
+
+
+def _op_task_get(conn, op):
+    fields = _parse_fields(op.get("fields"), TASK_FIELDS, TASK_FIELDS)
+    return _fetch_task(conn, op.get("id"), fields)
+
+
+def _op_task_create(conn, op):
+    _require_role("admin", "manager")
+    values = _clean_task_fields(op.get("fields") or {}, creating=True)
+    values["created_by"] = session["user_id"]
+    return {"id": _insert(conn, "tasks", values)}
+
+
+def _update_task(conn, op, values, extra_where="", extra_params=()):
+    """_update() for a task, noting its status and assignee changes for the audit trail.
+
+    The old values are read first. The batch holds BEGIN IMMEDIATE, so
+    nothing can change them before the UPDATE, whose RETURNING gives the
+    new values as stored. Only real changes are noted, under the
+    private "_changes" key that batch() takes off before replying.
+    """
+    before = conn.execute(
+        "SELECT status, assigned_to FROM tasks WHERE id = ?", (op.get("id"),)
+    ).fetchone()
+    row = _update(conn, "tasks", op.get("id"), values, op.get("version"),
+                  extra_where, extra_params, returning="version, status, assigned_to")
+    if row is None:
+        _write_failed(conn, "tasks", op.get("id"), op.get("version"), "Task")
+    changes = []
+    for column, action in (("status", "status"), ("assigned_to", "reassign")):
+        if before[column] != row[column]:
+            changes.append((action, {"via": "api", "from": before[column], "to": row[column]}))
+    return {"id": op.get("id"), "version": row["version"], "_changes": changes}
+
+
+def _op_task_update(conn, op):
+    _require_role("admin", "manager")
+    values = _clean_task_fields(op.get("fields") or {}, creating=False)
+    if not values:
+        raise ApiError("No fields to update")
+    values["updated_by"] = session["user_id"]
+    return _update_task(conn, op, values)
+
+
+def _op_task_set_status(conn, op):
+    """Status-only update — the one write staff may make, on their own tasks."""
+    values = _clean_task_fields({"status": op.get("status")}, creating=False)
+    values["updated_by"] = session["user_id"]
+    extra_where, extra_params = "", ()
+    if session.get("role") == "staff":
+        extra_where, extra_params = " AND assigned_to = ?", (session["user_id"],)
+    return _update_task(conn, op, values, extra_where, extra_params)
+
+
+def _op_task_delete(conn, op):
+    """Delete a task; its attachment rows go with it (ON DELETE CASCADE)."""
+    _require_role("admin", "manager")
+    if not _delete(conn, "tasks", op.get("id"), op.get("version")):
+        _write_failed(conn, "tasks", op.get("id"), op.get("version"), "Task")
+    return {"id": op.get("id")}
+
+
+def _op_client_get(conn, op):
+    _require_role("admin", "manager")
+    fields = _parse_fields(op.get("fields"), CLIENT_FIELDS, CLIENT_FIELDS)
+    return _fetch_client(conn, op.get("id"), fields)
+
+
+def _op_client_create(conn, op):
+    _require_role("admin", "manager")
+    values = _clean_client_fields(op.get("fields") or {}, creating=True)
+    return {"id": _insert(conn, "clients", values)}
+
+
+def _op_client_update(conn, op):
+    _require_role("admin", "manager")
+    values = _clean_client_fields(op.get("fields") or {}, creating=False)
+    row = _update(conn, "clients", op.get("id"), values, op.get("version"))
+    if row is None:
+        _write_failed(conn, "clients", op.get("id"), op.get("version"), "Client")
+    return {"id": op.get("id"), "version": row["version"]}
+
+
+def _op_client_delete(conn, op):
+    _require_role("admin")
+    deleted = _delete(
+        conn, "clients", op.get("id"), op.get("version"),
+        " AND NOT EXISTS (SELECT 1 FROM tasks WHERE client_id = clients.id)",
+    )
+    if not deleted:
+        linked_tasks = conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE client_id = ?", (op.get("id"),)
+        ).fetchone()[0]
+        if linked_tasks > 0:
+            raise ApiError(f"Cannot delete client with {linked_tasks} linked task(s)", 409)
+        _write_failed(conn, "clients", op.get("id"), op.get("version"), "Client")
+    return {"id": op.get("id")}
+
+
+BATCH_OPERATIONS = {
+    "task.get": _op_task_get,
+    "task.create": _op_task_create,
+    "task.update": _op_task_update,
+    "task.set_status": _op_task_set_status,
+    "task.delete": _op_task_delete,
+    "client.get": _op_client_get,
+    "client.create": _op_client_create,
+    "client.update": _op_client_update,
+    "client.delete": _op_client_delete,
+}
+
+
+# Audit trail entries (audit.py) for each kind of write. Status and
+# assignee changes are recorded on top, from each task write's "_changes"
+# (so task.set_status records only a status change, as the HTML form does)
+AUDITED_OPERATIONS = {
+    "task.create": ("create", "task"),
+    "task.update": ("update", "task"),
+    "task.delete": ("delete", "task"),
+    "client.create": ("create", "client"),
+    "client.update": ("update", "client"),
+    "client.delete": ("delete", "client"),
+}
+
+
+def _audit_batch(operations, results, changes):
+    """Record a committed batch's writes in the audit trail.
+
+    `changes` holds each operation's status and assignee changes, with
+    their old and new values (see _update_task).
+    """
+    for op, result, op_changes in zip(operations, results, changes):
+        audited = AUDITED_OPERATIONS.get(op["op"])
+        if audited is not None:
+            action, entity = audited
+            audit.record(action, entity, result["id"], {"via": "api"})
+        for action, details in op_changes:
+            audit.record(action, "task", result["id"], details)
+
+
+@api_bp.route("/batch", methods=["POST"])
+@login_required
+def batch():
+    """Run many operations in one request and ONE database transaction.
+
+    Body: {"operations": [{"op": "task.set_status", "id": 4, "status": "completed"},
+                          {"op": "task.get", "id": 4, "fields": "id,status"}, ...]}
+
+    All or nothing: if any operation fails, every write in the batch is
+    rolled back and the response names the operation that failed.
+    Results are returned in the same order as the operations. Once the
+    batch commits, its writes are recorded in the audit trail.
+    """
+    if database.SHARDED:
+        raise ApiError("Batches need single-file storage", 503)
+    body = request.get_json(silent=True)
+    operations = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ApiError("Body must be an object with a non-empty 'operations' list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ApiError(f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    # Shape checks up front, before a transaction is opened
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or str(op.get("op")) not in BATCH_OPERATIONS:
+            raise ApiError(f"Operation {index}: unknown op")
+        for key in ("id", "version"):
+            value = op.get(key)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+                raise ApiError(f"Operation {index} ({op['op']}): {key} must be an integer")
+
+    conn = get_db()
+    conn.isolation_level = None  # explicit transaction below
+    # IMMEDIATE takes the write lock up front, so a batch never fails
+    # half-way through because another writer got in first
+    writes = any(not op["op"].endswith(".get") for op in operations)
+    conn.execute("BEGIN IMMEDIATE" if writes else "BEGIN")
+    results = []
+    try:
+        for index, op in enumerate(operations):
+            try:
+                results.append(BATCH_OPERATIONS[op["op"]](conn, op))
+            except ApiError as error:
+                raise ApiError(f"Operation {index} ({op['op']}): {error.message}", error.status)
+            except sqlite3.IntegrityError as error:
+                # e.g. assigned_to pointing at a user that does not exist
+                raise ApiError(f"Operation {index} ({op['op']}): {error}", 409)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    changes = [result.pop("_changes", ()) for result in results]
+    _audit_batch(operations, results, changes)
+    return jsonify(results=results)
@@ -0,0 +1,103 @@
+"""
+Archive Routes — search and export tasks moved out by archival.py.
+
+    GET /archive          → search archived tasks (renders archive.html)
+    GET /archive/export   → download the matching archived tasks as CSV
+
+Admin and manager only. The everyday task list and dashboard never
+open the archive database — only these two routes ATTACH it. With
+sharded storage (database.py) there is no archive and both redirect.
+"""
+
+import csv
+import io
+
+from flask import (
+    Blueprint, Response, flash, redirect, request, session, render_template,
+    stream_with_context, url_for,
+)
+from routes.auth import login_required, role_required
+from database import get_db
+import database
+import archival
+
+archive_bp = Blueprint("archive", __name__)
+
+
+@archive_bp.before_request
+def _single_file_only():
+    if database.SHARDED:
+        flash("The archive is not available with sharded storage", "error")
+        return redirect(url_for("dashboard.dashboard"))
+
+
+EXPORT_COLUMNS = (
+    "id", "title", "status", "priority", "department", "assigned_name",
+    "client_name", "due_date", "created_at", "updated_at", "archived_at",
+)
+
+
+def _filters():
+    return {
+        "search": request.args.get("search", "").strip(),
+        "department": request.args.get("department", ""),
+        "status": request.args.get("status", ""),
+    }
+
+
+@archive_bp.route("", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def archive_list():
+    """Search archived tasks, 50 per page (?before=<id> for the next page)."""
+    filters = _filters()
+    before_id = request.args.get("before", type=int)
+
+    conn = get_db()
+    archival.attach(conn)
+    tasks, next_before_id = archival.search(conn, before_id=before_id, **filters)
+    conn.close()
+
+    return render_template(
+        "archive.html",
+        tasks=tasks,
+        next_before_id=next_before_id,
+        filters=filters,
+        role=session.get("role"),
+    )
+
+
+@archive_bp.route("/export", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def export_archive():
+    """Stream every matching archived task as CSV.
+
+    Rows are written as they are read, so exporting years of history
+    never holds the whole result in memory.
+    """
+    filters = _filters()
+
+    def generate():
+        conn = get_db()
+        try:
+            archival.attach(conn)
+            rows, _ = archival.search(conn, limit=None, **filters)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            for row in rows:
+                writer.writerow([row[column] for column in EXPORT_COLUMNS])
+                if buffer.tell() > 8192:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=archived_tasks.csv"},
+    )
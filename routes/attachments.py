@@ -12,13 +12,46 @@ Security considerations:
     - File size is limited by MAX_CONTENT_LENGTH in app config (5MB)
     - Files are stored in uploads/ (not directly web-accessible)
     - send_from_directory prevents path traversal attacks
+
+Compression at rest:
+    Text-like formats (csv, txt and the legacy doc/xls) usually shrink
+    5-10x, so they are gzipped AS THEY STREAM IN and saved as
+    "<unique>.<ext>.gz". Already-compressed formats are saved as-is.
+    On download, a browser that accepts gzip gets the stored bytes
+    unchanged with "Content-Encoding: gzip" and decompresses them
+    itself; anything else gets them decompressed on the fly.
+
+Previews:
+    After an upload, previews.py makes a small preview of csv/txt and
+    image files in the background. GET /attachments/preview/<filename>
+    serves an image's thumbnail; the task page shows table previews
+    inline.
+
+Download all:
+    GET /attachments/task/<id>/zip streams every file on a task as one
+    ZIP, built on the fly while it downloads — no temporary file, and
+    only one small chunk in memory at a time however big the bundle.
+
+Sharded storage (see database.py):
+    Attachment rows live in their task's shard. Task and attachment ids
+    name their shard (task_db()); a download by stored filename asks
+    every shard in parallel.
 """
 
+import datetime
+import gzip
 import os
 import uuid
-from flask import Blueprint, request, session, redirect, url_for, flash, current_app, send_from_directory
+import zipfile
+from flask import (
+    Blueprint, Response, request, session, redirect, url_for, flash, current_app,
+    send_file, send_from_directory, stream_with_context,
+)
 from routes.auth import login_required
-from database import get_db
+from database import fan_out, task_db
+import audit
+import archival
+import previews
 
 attachments_bp = Blueprint("attachments", __name__)
 
@@ -29,6 +62,20 @@ ALLOWED_EXTENSIONS = {
 }
 
 
+# Formats that are already compressed (docx/xlsx are ZIP files
+# themselves). Deflating them again costs CPU and saves almost nothing,
+# so they go into the bundle as-is.
+STORED_EXTENSIONS = {"pdf", "docx", "xlsx", "png", "jpg", "jpeg", "gif"}
+
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Compressible formats → how they are encoded at rest. gzip is also an
+# HTTP Content-Encoding, so stored files can be sent without re-encoding.
+COMPRESS_AT_REST = {"csv": "gzip", "txt": "gzip", "doc": "gzip", "xls": "gzip"}
+COMPRESS_LEVEL = 6  # zlib's default: most of the saving for a fraction of level 9's CPU
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
 def allowed_file(filename):
     """Check if a filename has an allowed extension.
 
@@ -38,6 +85,113 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+class UploadWriter:
+    """Writes an upload to disk chunk by chunk, gzipping it if `encoding` says so.
+
+    upload_file() below feeds it from the parsed form; the async upload
+    (routes/attachments_async.py) feeds it chunks as they arrive.
+    """
+
+    def __init__(self, filepath, encoding):
+        self.filepath = filepath
+        self.size = 0
+        self._raw = open(filepath, "wb")
+        self._file = self._raw
+        if encoding == "gzip":
+            self._file = gzip.GzipFile(
+                filename="", mode="wb", fileobj=self._raw, compresslevel=COMPRESS_LEVEL, mtime=0
+            )
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        """Finish the file. Returns (logical_size, stored_size)."""
+        if self._file is not self._raw:
+            self._file.close()  # writes the gzip trailer; leaves _raw open
+        self._raw.close()
+        return self.size, os.path.getsize(self.filepath)
+
+    def discard(self):
+        """Abandon a partly written upload."""
+        self._raw.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+
+def _save_upload(file, filepath, encoding):
+    """Write an uploaded file to disk. Returns (logical_size, stored_size).
+
+    With encoding="gzip" the upload is compressed chunk by chunk as it
+    is read, so the raw file never has to fit in memory or touch disk.
+    """
+    writer = UploadWriter(filepath, encoding)
+    try:
+        for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b""):
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close()
+
+
+def stored_name(original_filename):
+    """(unique name on disk, encoding at rest) for an uploaded file."""
+    extension = original_filename.rsplit(".", 1)[1].lower()
+    encoding = COMPRESS_AT_REST.get(extension)
+    return f"{uuid.uuid4().hex}.{extension}" + (".gz" if encoding == "gzip" else ""), encoding
+
+
+def insert_attachment(conn, task_id, filename, original_filename, sizes, encoding, user_id):
+    """Record a saved upload. Returns the new attachment id (caller commits)."""
+    file_size, stored_size = sizes
+    return conn.execute(
+        """
+        INSERT INTO attachments (task_id, filename, original_filename, file_size,
+                                 stored_size, encoding, uploaded_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (task_id, filename, original_filename, file_size, stored_size, encoding, user_id),
+    ).lastrowid
+
+
+def find_download(filename):
+    """The attachment row for a stored filename, checking the archive too (or None)."""
+    found = fan_out(lambda conn: conn.execute(
+        "SELECT original_filename, file_size, encoding FROM attachments WHERE filename = ?",
+        (filename,),
+    ).fetchone())
+    attachment = next((row for row in found if row is not None), None)
+    if attachment is None:
+        # The task may have been archived — its attachment rows moved with it
+        attachment = archival.find_attachment(filename)
+    return attachment
+
+
+def task_attachments(task_id):
+    """(task, attachments) for a ZIP of one task's files; task is None if missing."""
+    conn = task_db(task_id)
+    task = conn.execute("SELECT id, assigned_to FROM tasks WHERE id = ?", (task_id,)).fetchone()
+    attachments = []
+    if task is not None:
+        attachments = conn.execute(
+            "SELECT filename, original_filename, file_size, encoding, uploaded_at FROM attachments "
+            "WHERE task_id = ? ORDER BY uploaded_at, id",
+            (task_id,),
+        ).fetchall()
+    conn.close()
+    return task, attachments
+
+
+def open_attachment(upload_folder, filename, encoding=None):
+    """Open a stored attachment for reading its ORIGINAL bytes."""
+    path = os.path.join(upload_folder, filename)
+    if encoding == "gzip":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
 @attachments_bp.route("/upload/<int:task_id>", methods=["POST"])
 @login_required
 def upload_file(task_id):
@@ -47,7 +201,7 @@ def upload_file(task_id):
     the file as binary data, not URL-encoded text. Flask makes this
     available via request.files instead of request.form.
     """
-    conn = get_db()
+    conn = task_db(task_id)
     task = conn.execute("SELECT id FROM tasks WHERE id = ?", (task_id,)).fetchone()
     if task is None:
         conn.close()
@@ -75,25 +229,21 @@ def upload_file(task_id):
 
     # Generate unique filename to prevent collisions
     original_filename = file.filename
-    extension = original_filename.rsplit(".", 1)[1].lower()
-    unique_filename = f"{uuid.uuid4().hex}.{extension}"
+    unique_filename, encoding = stored_name(original_filename)
 
-    # Save file to disk
+    # Save file to disk (compressed as it streams in, for text-like types)
     filepath = os.path.join(current_app.config["UPLOAD_FOLDER"], unique_filename)
-    file.save(filepath)
-    file_size = os.path.getsize(filepath)
+    sizes = _save_upload(file, filepath, encoding)
 
     # Record in database
-    conn.execute(
-        """
-        INSERT INTO attachments (task_id, filename, original_filename, file_size, uploaded_by)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (task_id, unique_filename, original_filename, file_size, session["user_id"]),
-    )
+    attachment_id = insert_attachment(conn, task_id, unique_filename, original_filename,
+                                      sizes, encoding, session["user_id"])
     conn.commit()
     conn.close()
 
+    previews.worker.submit(current_app.config["UPLOAD_FOLDER"], unique_filename, encoding)
+    audit.record("create", "attachment", attachment_id,
+                 {"task_id": task_id, "filename": original_filename, "size": sizes[0]})
     flash("File uploaded successfully", "success")
     return redirect(url_for("tasks.task_detail", task_id=task_id))
 
@@ -114,20 +264,161 @@ def download_file(filename):
         flash("File not found", "error")
         return redirect(url_for("tasks.task_list"))
 
-    # Look up original filename for the download
-    conn = get_db()
-    attachment = conn.execute(
-        "SELECT original_filename FROM attachments WHERE filename = ?", (filename,)
-    ).fetchone()
-    conn.close()
-
+    # Look up original filename (and how it is stored) for the download
+    attachment = find_download(filename)
     download_name = attachment["original_filename"] if attachment else filename
+    encoding = attachment["encoding"] if attachment else None
+
+    if encoding is None:
+        return send_from_directory(
+            upload_folder,
+            filename,
+            as_attachment=True,
+            download_name=download_name,
+        )
+
+    if request.accept_encodings[encoding]:
+        # Send the compressed bytes as they are; the browser decompresses
+        response = send_from_directory(
+            upload_folder, filename, as_attachment=True, download_name=download_name
+        )
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = send_file(
+            open_attachment(upload_folder, filename, encoding),
+            as_attachment=True,
+            download_name=download_name,
+        )
+        response.content_length = attachment["file_size"]
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@attachments_bp.route("/preview/<filename>", methods=["GET"])
+@login_required
+def preview_thumbnail(filename):
+    """An image attachment's thumbnail, made by previews.py after upload.
+
+    Stored names are unique and a thumbnail never changes, so browsers
+    may keep it for a day without asking again.
+    """
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    name = previews.thumbnail_name(filename)
+    if previews.kind(filename) != "image" or not os.path.exists(os.path.join(upload_folder, name)):
+        return Response("No preview", 404, mimetype="text/plain")
+    response = send_from_directory(upload_folder, name, max_age=86400)
+    response.cache_control.public = False
+    response.cache_control.private = True  # behind the login — not for shared caches
+    return response
+
+
+class _ZipSink:
+    """Write-only stream for zipfile: holds written bytes until drained.
+
+    It has no seek(), so zipfile writes each file's sizes and CRC AFTER
+    its data (a "data descriptor") instead of going back to patch the
+    header — which is what makes streaming possible.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_names(attachments):
+    """Archive names from original filenames: no folders, no duplicates."""
+    names, seen = [], set()
+    for attachment in attachments:
+        name = attachment["original_filename"].replace("/", "_").replace("\\", "_").strip() or "file"
+        stem, dot, extension = name.rpartition(".")
+        if not dot:
+            stem, extension = name, ""
+        candidate, number = name, 2
+        while candidate.lower() in seen:
+            candidate = f"{stem} ({number}){dot}{extension}"
+            number += 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def _zip_time(uploaded_at, path):
+    """ZIP timestamp for a file — its upload time, else its modification time."""
+    try:
+        moment = datetime.datetime.fromisoformat(str(uploaded_at))
+    except ValueError:
+        moment = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+    return max(moment, datetime.datetime(1980, 1, 1)).timetuple()[:6]  # ZIP starts at 1980
+
+
+def _stream_zip(upload_folder, attachments):
+    """Yield a ZIP of the attachments, a chunk at a time."""
+    sink = _ZipSink()
+    missing = []
+    with zipfile.ZipFile(sink, "w") as bundle:
+        for attachment, name in zip(attachments, _zip_names(attachments)):
+            path = os.path.join(upload_folder, attachment["filename"])
+            if not os.path.isfile(path):
+                missing.append(name)
+                continue
+            info = zipfile.ZipInfo(name, date_time=_zip_time(attachment["uploaded_at"], path))
+            extension = name.rsplit(".", 1)[-1].lower()
+            info.compress_type = (
+                zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            )
+            info.file_size = attachment["file_size"]
+            source = open_attachment(upload_folder, attachment["filename"], attachment["encoding"])
+            with source, bundle.open(info, "w") as target:
+                for chunk in iter(lambda: source.read(ZIP_CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+        if missing:
+            bundle.writestr("MISSING.txt", "These files could not be found on the server:\n"
+                            + "".join(f"{name}\n" for name in missing))
+    yield sink.drain()  # the central directory, written on close
+
+
+@attachments_bp.route("/task/<int:task_id>/zip", methods=["GET"])
+@login_required
+def download_all(task_id):
+    """Download every attachment on a task as one ZIP file.
+
+    One query finds all the files; the ZIP is then streamed straight
+    from UPLOAD_FOLDER, so the database connection is closed before the
+    first byte is sent.
+    """
+    task, attachments = task_attachments(task_id)
+    if task is None:
+        flash("Task not found", "error")
+        return redirect(url_for("tasks.task_list"))
+
+    # Same rule as the task page: staff only see their own tasks
+    if session.get("role") == "staff" and task["assigned_to"] != session.get("user_id"):
+        flash("You can only view tasks assigned to you", "error")
+        return redirect(url_for("tasks.task_list"))
+
+    if not attachments:
+        flash("This task has no attachments", "error")
+        return redirect(url_for("tasks.task_detail", task_id=task_id))
 
-    return send_from_directory(
-        upload_folder,
-        filename,
-        as_attachment=True,
-        download_name=download_name,
+    return Response(
+        stream_with_context(_stream_zip(current_app.config["UPLOAD_FOLDER"], attachments)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=task-{task_id}-attachments.zip"},
     )
 
 
@@ -138,7 +429,7 @@ def delete_attachment(attachment_id):
 
     Only the uploader, admins, or managers can delete attachments.
     """
-    conn = get_db()
+    conn = task_db(attachment_id)
     attachment = conn.execute(
         "SELECT * FROM attachments WHERE id = ?", (attachment_id,)
     ).fetchone()
@@ -163,6 +454,7 @@ def delete_attachment(attachment_id):
     )
     if os.path.exists(filepath):
         os.remove(filepath)
+    previews.discard(current_app.config["UPLOAD_FOLDER"], attachment["filename"])
 
     # Delete the database record
     conn.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
@@ -171,5 +463,7 @@ def delete_attachment(attachment_id):
 
     task_id = attachment["task_id"]
 
+    audit.record("delete", "attachment", attachment_id,
+                 {"task_id": task_id, "filename": attachment["original_filename"]})
     flash("Attachment deleted successfully", "success")
     return redirect(url_for("tasks.task_detail", task_id=task_id))
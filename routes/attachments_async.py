@@ -0,0 +1,255 @@
+"""
+Async Attachment Transfers — the ASGI versions of upload and download.
+
+Under the ASGI server (asgi.py) these three views replace the ones in
+routes/attachments.py for the same URLs:
+    POST /attachments/upload/<task_id>
+    GET  /attachments/download/<filename>
+    GET  /attachments/task/<task_id>/zip
+
+They behave the same — same checks, same flash messages, same files on
+disk, same audit events — but while waiting for the client's next chunk
+they hold no thread. Blocking steps (a query, writing or reading one
+chunk of a file) go through request.run(), a small thread pool.
+
+The sync views stay the reference: validation, naming, compression at
+rest and the database rows all come from the helpers in
+routes/attachments.py, so the two cannot drift apart.
+
+Differences from the sync views:
+    - The upload is parsed as it arrives (Werkzeug's sans-IO multipart
+      decoder) and written straight to UPLOAD_FOLDER; Flask would first
+      spool it to a temporary file.
+    - Downloads send the whole file: no ETag, If-Modified-Since or Range
+      support. (HEAD requests are served by the sync view.)
+"""
+
+import mimetypes
+import os
+from functools import wraps
+from urllib.parse import quote
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+from werkzeug.security import safe_join
+
+import audit
+import previews
+from asgi import AsgiResponse
+from routes.attachments import (
+    ALLOWED_EXTENSIONS, UPLOAD_CHUNK_SIZE, UploadWriter, _stream_zip, allowed_file,
+    find_download, insert_attachment, open_attachment, stored_name, task_attachments,
+)
+from database import task_db
+
+
+def login_required(view):
+    """Async counterpart of routes.auth.login_required."""
+
+    @wraps(view)
+    async def decorated_view(request, **kwargs):
+        if "user_id" not in request.session:
+            request.flash("Please log in to access this page", "error")
+            return request.redirect("auth.login")
+        return await view(request, **kwargs)
+
+    return decorated_view
+
+
+def _task_exists(task_id):
+    conn = task_db(task_id)
+    task = conn.execute("SELECT id FROM tasks WHERE id = ?", (task_id,)).fetchone()
+    conn.close()
+    return task is not None
+
+
+def _save_attachment(task_id, unique_filename, original_filename, sizes, encoding, user_id):
+    conn = task_db(task_id)
+    attachment_id = insert_attachment(conn, task_id, unique_filename, original_filename,
+                                      sizes, encoding, user_id)
+    conn.commit()
+    conn.close()
+    return attachment_id
+
+
+class _TooLarge(Exception):
+    """The upload passed MAX_CONTENT_LENGTH while it was being received."""
+
+
+def _too_large(request):
+    """Same response as the app's 413 handler."""
+    request.flash("File too large. Maximum size is 5MB.", "error")
+    location = request.referrer or request.url_for("dashboard.dashboard")
+    return AsgiResponse(status=302, headers={"Location": location})
+
+
+@login_required
+async def upload_file(request, task_id):
+    """Upload a file and attach it to a task, writing it as it arrives."""
+    if not await request.run(_task_exists, task_id):
+        request.flash("Task not found", "error")
+        return request.redirect("tasks.task_list")
+
+    limit = request.app.config.get("MAX_CONTENT_LENGTH")
+    if limit and (request.content_length or 0) > limit:
+        return _too_large(request)
+
+    mimetype, options = parse_options_header(request.headers.get("Content-Type", ""))
+    if mimetype != "multipart/form-data" or not options.get("boundary"):
+        request.flash("No file provided", "error")
+        return request.redirect("tasks.task_detail", task_id=task_id)
+
+    decoder = MultipartDecoder(options["boundary"].encode("latin-1"))
+    upload_folder = request.app.config["UPLOAD_FOLDER"]
+    writer = None        # UploadWriter while the file part is being received
+    in_file = False
+    pending = bytearray()
+    received = 0
+    original_filename = unique_filename = encoding = None
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if limit and received > limit:
+                raise _TooLarge()
+            decoder.receive_data(chunk)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File) and event.name == "file" and writer is None:
+                    if not event.filename:
+                        request.flash("No file selected", "error")
+                        return request.redirect("tasks.task_detail", task_id=task_id)
+                    if not allowed_file(event.filename):
+                        request.flash(
+                            f"File type not allowed. Accepted: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
+                            "error",
+                        )
+                        return request.redirect("tasks.task_detail", task_id=task_id)
+                    original_filename = event.filename
+                    unique_filename, encoding = stored_name(original_filename)
+                    writer = await request.run(
+                        UploadWriter, os.path.join(upload_folder, unique_filename), encoding
+                    )
+                    in_file = True
+                elif isinstance(event, Data) and in_file:
+                    pending += event.data
+                    # The decoder hands back small pieces; write in full chunks
+                    if len(pending) >= UPLOAD_CHUNK_SIZE or not event.more_data:
+                        await request.run(writer.write, bytes(pending))
+                        pending.clear()
+                    in_file = event.more_data
+                event = decoder.next_event()
+            if isinstance(event, Epilogue):
+                break
+        if writer is None:
+            request.flash("No file provided", "error")
+            return request.redirect("tasks.task_detail", task_id=task_id)
+        if in_file:
+            raise ValueError("upload ended in the middle of the file")
+        sizes = await request.run(writer.close)
+    except BaseException as error:
+        # Too large, malformed, client gone or cancelled: leave no half-written file
+        if writer is not None:
+            await request.run(writer.discard)
+        if isinstance(error, _TooLarge):
+            return _too_large(request)
+        if isinstance(error, ValueError):
+            return AsgiResponse("Malformed upload", 400, mimetype="text/plain")
+        raise
+
+    user_id = request.session["user_id"]
+    attachment_id = await request.run(
+        _save_attachment, task_id, unique_filename, original_filename, sizes, encoding, user_id
+    )
+    previews.worker.submit(upload_folder, unique_filename, encoding)
+    audit.record("create", "attachment", attachment_id,
+                 {"task_id": task_id, "filename": original_filename, "size": sizes[0]},
+                 user_id=user_id)
+    request.flash("File uploaded successfully", "success")
+    return request.redirect("tasks.task_detail", task_id=task_id)
+
+
+def _content_disposition(download_name):
+    """attachment; filename=... with a UTF-8 filename* for non-ASCII names (as send_file does)."""
+    try:
+        download_name.encode("ascii")
+    except UnicodeEncodeError:
+        fallback = download_name.encode("ascii", "ignore").decode("ascii")
+        return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(download_name, safe='')}"
+    return f"attachment; filename=\"{download_name}\""
+
+
+def _open_download(path):
+    """(open file, size on disk) or None if it is not there."""
+    if not os.path.isfile(path):
+        return None
+    return open(path, "rb"), os.path.getsize(path)
+
+
+@login_required
+async def download_file(request, filename):
+    """Download an attached file, streamed from disk a chunk at a time."""
+    upload_folder = request.app.config["UPLOAD_FOLDER"]
+    path = safe_join(upload_folder, filename)
+    opened = await request.run(_open_download, path) if path else None
+    if opened is None:
+        request.flash("File not found", "error")
+        return request.redirect("tasks.task_list")
+    source, size = opened
+
+    try:
+        attachment = await request.run(find_download, filename)
+    except BaseException:
+        await request.run(source.close)
+        raise
+    download_name = attachment["original_filename"] if attachment else filename
+    encoding = attachment["encoding"] if attachment else None
+
+    headers = {
+        "Content-Disposition": _content_disposition(download_name),
+        "Content-Type": mimetypes.guess_type(download_name)[0] or "application/octet-stream",
+    }
+    if encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if request.accept_encodings[encoding]:
+            # Send the compressed bytes as they are; the browser decompresses
+            headers["Content-Encoding"] = encoding
+        else:
+            await request.run(source.close)
+            source = await request.run(open_attachment, upload_folder, filename, encoding)
+            size = attachment["file_size"]
+    headers["Content-Length"] = str(size)
+    return AsgiResponse(request.file_chunks(source), headers=headers)
+
+
+@login_required
+async def download_all(request, task_id):
+    """Download every attachment on a task as one ZIP, streamed as it is built."""
+    task, attachments = await request.run(task_attachments, task_id)
+    if task is None:
+        request.flash("Task not found", "error")
+        return request.redirect("tasks.task_list")
+
+    # Same rule as the task page: staff only see their own tasks
+    session = request.session
+    if session.get("role") == "staff" and task["assigned_to"] != session.get("user_id"):
+        request.flash("You can only view tasks assigned to you", "error")
+        return request.redirect("tasks.task_list")
+
+    if not attachments:
+        request.flash("This task has no attachments", "error")
+        return request.redirect("tasks.task_detail", task_id=task_id)
+
+    return AsgiResponse(
+        request.iterate(_stream_zip(request.app.config["UPLOAD_FOLDER"], attachments)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=task-{task_id}-attachments.zip"},
+    )
+
+
+# Endpoint → async view, looked up by asgi.AsgiApp for every request
+ASYNC_VIEWS = {
+    "attachments.upload_file": upload_file,
+    "attachments.download_file": download_file,
+    "attachments.download_all": download_all,
+}
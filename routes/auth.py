@@ -14,13 +14,25 @@ Role-based access:
 """
 
 from functools import wraps
-from flask import Blueprint, request, session, redirect, url_for, flash, render_template, abort
+from flask import Blueprint, request, session, redirect, url_for, flash, render_template, abort, jsonify
 from werkzeug.security import check_password_hash
 from database import get_db
 
 auth_bp = Blueprint("auth", __name__)
 
 
+def _not_logged_in():
+    """Response for a request without a session.
+
+    Browsers are redirected to the login page; JSON API clients
+    (routes/api.py) get a 401 they can act on instead of an HTML page.
+    """
+    if request.blueprint == "api":
+        return jsonify(error="Authentication required"), 401
+    flash("Please log in to access this page", "error")
+    return redirect(url_for("auth.login"))
+
+
 def login_required(f):
     """Decorator that protects routes — only logged-in users can access them.
 
@@ -36,8 +48,7 @@ def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if "user_id" not in session:
-            flash("Please log in to access this page", "error")
-            return redirect(url_for("auth.login"))
+            return _not_logged_in()
         return f(*args, **kwargs)
 
     return decorated_function
@@ -55,9 +66,10 @@ def role_required(*roles):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if "user_id" not in session:
-                flash("Please log in to access this page", "error")
-                return redirect(url_for("auth.login"))
+                return _not_logged_in()
             if session.get("role") not in roles:
+                if request.blueprint == "api":
+                    return jsonify(error="Forbidden"), 403
                 abort(403)
             return f(*args, **kwargs)
 
@@ -66,6 +78,30 @@ def role_required(*roles):
     return decorator
 
 
+def role_filter():
+    """Build WHERE clause fragments based on the current user's role.
+
+    Returns (where_clause, params) tuple that can be appended to any
+    query against the tasks table (aliased as 't').
+
+    Why a helper function?
+    - The dashboard, the client pages and the JSON API all need the
+      same role-based filter
+    - DRY principle: define the logic once, use it everywhere
+    - If roles change later, we only update one place
+    """
+    role = session.get("role")
+    user_id = session.get("user_id")
+    department = session.get("department")
+
+    if role == "staff":
+        return " AND t.assigned_to = ?", [user_id]
+    elif role == "manager":
+        return " AND t.department = ?", [department]
+    else:
+        return "", []
+
+
 @auth_bp.route("/", methods=["GET"])
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -3,58 +3,120 @@ Client Management Routes — CRUD for MJ Limited's external clients.
 
 Same POST-based pattern as tasks:
     GET    /clients              → list all clients
+    GET    /clients/<id>         → one client and its tasks
     POST   /clients/create       → create a client
     POST   /clients/<id>/edit    → update a client
     POST   /clients/<id>/delete  → delete a client
 
 Only admins and managers can access client management.
 Staff accessing /clients receive 403 Forbidden via @role_required.
+
+Edits and deletes carry the client's version number from the form and
+are single conditional statements — see "Optimistic concurrency" in
+routes/tasks.py. Every successful write is recorded in the audit trail
+(audit.py) after it commits.
+
+Each client's open, overdue and completed task counts (on the list,
+the detail page, and behind the delete check) come from
+client_rollups.py: one grouped count for the whole page, cached per
+client until that client's tasks change.
 """
 
+import heapq
 from flask import Blueprint, request, session, redirect, url_for, flash, render_template
-from routes.auth import login_required, role_required
-from database import get_db
+from routes.auth import login_required, role_required, role_filter
+from database import fan_out, get_db
+import database
+from query_planner import CLIENT_LIST
+import audit
+import client_rollups
 
 clients_bp = Blueprint("clients", __name__)
 
+# Most recent tasks shown on a client's page (the task list has the rest)
+RECENT_TASKS = 50
+
+
+def _write_failed(conn, client_id):
+    """Explain why a conditional write matched no row (runs only on failure)."""
+    current = conn.execute("SELECT 1 FROM clients WHERE id = ?", (client_id,)).fetchone()
+    if current is None:
+        return "Client not found"
+    return ("This client was changed by someone else after you opened it. "
+            "Nothing was saved — check the latest details and try again.")
+
 
 @clients_bp.route("", methods=["GET"])
 @login_required
 @role_required("admin", "manager")
 def client_list():
-    """List all clients with optional search and status filtering."""
-    conn = get_db()
+    """List all clients with optional search, filtering and sorting.
 
-    query = "SELECT * FROM clients WHERE 1=1"
-    params = []
+    ?status= and ?industry= may be repeated; ?sort= and ?order= pick the
+    order. See query_planner.CLIENT_LIST for everything allowed.
+    """
+    plan = CLIENT_LIST.plan(request.args)
+    for error in plan.errors:
+        flash(error, "error")
 
-    if request.args.get("status"):
-        query += " AND status = ?"
-        params.append(request.args["status"])
+    conn = get_db()
+    clients = conn.execute(
+        f"SELECT * FROM clients WHERE 1=1{plan.where} {plan.order_by}", plan.params
+    ).fetchall()
+    conn.close()
 
-    if request.args.get("search"):
-        query += " AND (company_name LIKE ? OR contact_name LIKE ? OR contact_email LIKE ?)"
-        search_term = f"%{request.args['search']}%"
-        params.extend([search_term, search_term, search_term])
+    return render_template(
+        "clients.html",
+        clients=clients,
+        rollups=client_rollups.counts([client["id"] for client in clients]),
+        role=session.get("role"),
+        filters=plan.form,
+    )
 
-    if request.args.get("industry"):
-        query += " AND industry = ?"
-        params.append(request.args["industry"])
 
-    query += " ORDER BY company_name ASC"
+@clients_bp.route("/<int:client_id>", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def client_detail(client_id):
+    """One client: details, task counts and their most recent tasks.
 
-    clients = conn.execute(query, params).fetchall()
+    The counts cover all of the client's tasks; the list below them
+    follows the task list's rules, so a manager sees their own
+    department's tasks.
+    """
+    conn = get_db()
+    client = conn.execute("SELECT * FROM clients WHERE id = ?", (client_id,)).fetchone()
     conn.close()
+    if client is None:
+        flash("Client not found", "error")
+        return redirect(url_for("clients.client_list"))
+
+    where, params = role_filter()
+
+    def fetch(conn):
+        return conn.execute(
+            f"""
+            SELECT t.id, t.title, t.status, t.priority, t.department, t.due_date,
+                   t.created_at, u.full_name AS assigned_name
+            FROM tasks t
+            LEFT JOIN users u ON t.assigned_to = u.id
+            WHERE t.client_id = ?{where}
+            ORDER BY t.created_at DESC, t.id DESC
+            LIMIT ?
+            """,
+            [client_id] + params + [RECENT_TASKS],
+        ).fetchall()
+
+    tasks = list(heapq.merge(*fan_out(fetch), key=lambda task: (task["created_at"], task["id"]),
+                             reverse=True))[:RECENT_TASKS]
 
     return render_template(
-        "clients.html",
-        clients=clients,
+        "client_detail.html",
+        client=client,
+        counts=client_rollups.counts([client_id])[client_id],
+        tasks=tasks,
+        recent_limit=RECENT_TASKS,
         role=session.get("role"),
-        filters={
-            "search": request.args.get("search", ""),
-            "status": request.args.get("status", ""),
-            "industry": request.args.get("industry", ""),
-        },
     )
 
 
@@ -85,7 +147,7 @@ def create_client():
         return redirect(url_for("clients.client_list"))
 
     conn = get_db()
-    conn.execute(
+    client_id = conn.execute(
         """
         INSERT INTO clients (company_name, contact_name, contact_email,
                             contact_phone, industry, status, notes)
@@ -100,10 +162,11 @@ def create_client():
             status,
             request.form.get("notes", "").strip(),
         ),
-    )
+    ).lastrowid
     conn.commit()
     conn.close()
 
+    audit.record("create", "client", client_id, {"company_name": company_name})
     flash("Client created successfully", "success")
     return redirect(url_for("clients.client_list"))
 
@@ -114,20 +177,13 @@ def create_client():
 def edit_client(client_id):
     """Update an existing client."""
     conn = get_db()
-    existing = conn.execute(
-        "SELECT * FROM clients WHERE id = ?", (client_id,)
-    ).fetchone()
-    if existing is None:
-        conn.close()
-        flash("Client not found", "error")
-        return redirect(url_for("clients.client_list"))
-
-    conn.execute(
+    updated = conn.execute(
         """
         UPDATE clients SET company_name=?, contact_name=?, contact_email=?,
                contact_phone=?, industry=?, status=?, notes=?,
-               updated_at=CURRENT_TIMESTAMP
-        WHERE id = ?
+               updated_at=CURRENT_TIMESTAMP, version=version + 1
+        WHERE id = ? AND version = ?
+        RETURNING version, status
         """,
         (
             request.form.get("company_name", "").strip(),
@@ -138,11 +194,19 @@ def edit_client(client_id):
             request.form.get("status", "active"),
             request.form.get("notes", "").strip(),
             client_id,
+            request.form.get("version", type=int),
         ),
-    )
+    ).fetchone()
+    if updated is None:
+        message = _write_failed(conn, client_id)
+        conn.close()
+        flash(message, "error")
+        return redirect(url_for("clients.client_list"))
     conn.commit()
     conn.close()
 
+    audit.record("update", "client", client_id,
+                 {"version": updated["version"], "status": updated["status"]})
     flash("Client updated successfully", "success")
     return redirect(url_for("clients.client_list"))
 
@@ -154,33 +218,40 @@ def delete_client(client_id):
     """Delete a client. Admin only.
 
     Checks for linked tasks before deletion — if this client has tasks
-    assigned to them, the delete is blocked with a flash message.
+    assigned to them, the delete is blocked with a flash message. The
+    check is part of the DELETE itself (NOT EXISTS), so a task linked a
+    moment earlier by someone else can never slip through.
+
+    The number of linked tasks for the message comes from the client's
+    cached rollup. With sharded storage the tasks are in other files, so
+    that count is checked first and the DELETE follows — not one atomic
+    step.
     """
+    linked = client_rollups.counts([client_id])[client_id]["total"] if database.SHARDED else 0
+    no_tasks = "" if database.SHARDED else "AND NOT EXISTS (SELECT 1 FROM tasks WHERE client_id = clients.id)"
     conn = get_db()
-    existing = conn.execute(
-        "SELECT * FROM clients WHERE id = ?", (client_id,)
+    deleted = None if linked else conn.execute(
+        f"""
+        DELETE FROM clients
+        WHERE id = ? AND version = ?
+          {no_tasks}
+        RETURNING id, company_name
+        """,
+        (client_id, request.form.get("version", type=int)),
     ).fetchone()
-    if existing is None:
-        conn.close()
-        flash("Client not found", "error")
-        return redirect(url_for("clients.client_list"))
-
-    # Check for linked tasks — cannot delete a client with active work
-    linked_tasks = conn.execute(
-        "SELECT COUNT(*) FROM tasks WHERE client_id = ?", (client_id,)
-    ).fetchone()[0]
-    if linked_tasks > 0:
-        conn.close()
-        flash(
-            f"Cannot delete client with {linked_tasks} linked task(s). "
-            "Reassign or delete the tasks first.",
-            "error",
+    if deleted is None:
+        linked = client_rollups.counts([client_id])[client_id]["total"]
+        message = (
+            f"Cannot delete client with {linked} linked task(s). "
+            "Reassign or delete the tasks first."
+            if linked else _write_failed(conn, client_id)
         )
+        conn.close()
+        flash(message, "error")
         return redirect(url_for("clients.client_list"))
-
-    conn.execute("DELETE FROM clients WHERE id = ?", (client_id,))
     conn.commit()
     conn.close()
 
+    audit.record("delete", "client", client_id, {"company_name": deleted["company_name"]})
     flash("Client deleted successfully", "success")
     return redirect(url_for("clients.client_list"))
@@ -15,169 +15,482 @@ Why different views per role?
     overdue counts. Managers need their department's picture, not data
     from departments they don't manage. This is the "Principle of Least
     Privilege" — show people only what they need.
+
+Live updates:
+    GET /dashboard/stream is a Server-Sent Events (SSE) stream. When a
+    task or client changes, it pushes ONLY the figures and chart series
+    that changed; charts.js patches them into the page in place. Nobody
+    needs to press F5, and an idle dashboard costs almost nothing:
+    one shared poller per worker watches the change feed
+    (change_feed.py), and dashboards with the same scope (e.g. all
+    admins) share one recomputation per change.
+
+    An open stream is a long-lived request. Under the ASGI server
+    (asgi.py) it is an async view that holds no thread while it waits,
+    so hundreds of open dashboards are cheap. Under Gunicorn's threads
+    each one holds a thread, so admission control caps them per worker.
+
+Sharded storage (see database.py):
+    The task figures are computed per shard with database.fan_out() and
+    added together. A manager's figures come from their department's
+    shard alone; admin and staff figures (a staff member's tasks may sit
+    in any department) are read from every shard in parallel. Shards
+    have no change feed, so the live stream is not offered there.
 """
 
-from flask import Blueprint, session, render_template
-from routes.auth import login_required
-from database import get_db
+import collections
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, Response, request, session, render_template, stream_with_context
+from routes.auth import login_required, role_filter
+from database import fan_out, get_db
+import database
+from cache import cached
+from change_feed import feed
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
+# Seconds between keep-alive comments (stops proxies closing idle streams)
+HEARTBEAT_SECONDS = 15
+# Streams end after this long; the browser reconnects automatically.
+# Long-lived requests would otherwise stop workers from ever recycling.
+MAX_STREAM_SECONDS = 300
+
+# How many weeks the throughput and cycle-time charts cover
+WEEKS_SHOWN = 12
 
-def _role_filter():
-    """Build WHERE clause fragments based on the current user's role.
+# Latest figures per scope — (feed cursor, summary, charts)
+_snapshots = {}
+_snapshots_lock = threading.Lock()
 
-    Returns (where_clause, params) tuple that can be appended to any
-    query against the tasks table (aliased as 't').
 
-    Why a helper function?
-    - Summary stats and chart data both need the same role-based filter
-    - DRY principle: define the logic once, use it everywhere
-    - If roles change later, we only update one place
+def _rollup_filter():
+    """Role filter for the rollup tables (same rules as routes.auth.role_filter).
+
+    The rollups have no 't' alias and store "unassigned" as 0, so they
+    need their own small variant.
     """
     role = session.get("role")
-    user_id = session.get("user_id")
-    department = session.get("department")
-
     if role == "staff":
-        return " AND t.assigned_to = ?", [user_id]
+        return " AND assigned_to = ?", [session.get("user_id")]
     elif role == "manager":
-        return " AND t.department = ?", [department]
+        return " AND department = ?", [session.get("department")]
     else:
         return "", []
 
 
-@dashboard_bp.route("", methods=["GET"])
-@login_required
-def dashboard():
-    """Render the dashboard with summary stats and chart data.
+def _scope_departments():
+    """The shards holding the current user's tasks (None = all of them)."""
+    if session.get("role") == "manager":
+        return [session.get("department")]
+    return None
 
-    Everything is computed server-side and passed to the template.
-    Chart.js receives its data via {{ chart_data | tojson }} in a
-    <script> block — this is the standard Flask pattern for passing
-    Python data to JavaScript.
+
+def _recent_weeks():
+    """Monday dates (YYYY-MM-DD) of the last WEEKS_SHOWN weeks, oldest first.
+
+    Uses UTC, like SQLite's DATE('now') which stamped the rollups.
+    """
+    today = datetime.now(timezone.utc).date()
+    this_monday = today - timedelta(days=today.weekday())
+    return [
+        (this_monday - timedelta(weeks=n)).isoformat()
+        for n in range(WEEKS_SHOWN - 1, -1, -1)
+    ]
+
+
+def _median(histogram):
+    """Median of a histogram given as [(value, count), ...] sorted by value."""
+    total = sum(count for _, count in histogram)
+    if total <= 0:
+        return None
+    # The two middle positions (the same one when total is odd)
+    wanted = [(total - 1) // 2, total // 2]
+    found = []
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        while wanted and wanted[0] < seen:
+            found.append(value)
+            wanted.pop(0)
+    return sum(found) / len(found)
+
+
+def _throughput_charts():
+    """Completed-per-week and median cycle time, read from the rollups only.
+
+    The rollup tables are kept up to date by triggers (see database.py),
+    so this never scans tasks or the status history — a dozen weeks of
+    figures is a few small index range reads, however many tasks exist.
+    """
+    where, params = _rollup_filter()
+    weeks = _recent_weeks()
+    week_start = "DATE(day, 'weekday 0', '-6 days')"  # Monday of that week
+
+    def read(conn):
+        completed = conn.execute(
+            f"""SELECT {week_start} AS week, SUM(completed_count)
+                FROM task_daily_rollup WHERE day >= ?{where} GROUP BY week""",
+            [weeks[0]] + params,
+        ).fetchall()
+        histogram = conn.execute(
+            f"""SELECT {week_start} AS week, cycle_days, SUM(task_count)
+                FROM task_cycle_histogram WHERE day >= ?{where}
+                GROUP BY week, cycle_days""",
+            [weeks[0]] + params,
+        ).fetchall()
+        return completed, histogram
+
+    completed = collections.Counter()
+    cycle_counts = collections.Counter()
+    for shard_completed, shard_histogram in fan_out(read, _scope_departments()):
+        for week, count in shard_completed:
+            completed[week] += count or 0
+        for week, cycle_days, count in shard_histogram:
+            cycle_counts[(week, cycle_days)] += count
+
+    histograms = {}
+    for (week, cycle_days), count in sorted(cycle_counts.items()):
+        if count > 0:
+            histograms.setdefault(week, []).append((cycle_days, count))
+
+    labels = [datetime.strptime(week, "%Y-%m-%d").strftime("%d %b") for week in weeks]
+    return {
+        "completed_per_week": {
+            "labels": labels,
+            "data": [completed.get(week) or 0 for week in weeks],
+            "backgroundColor": "#4caf50",
+        },
+        "median_cycle_time": {
+            "labels": labels,
+            "data": [_median(histograms.get(week, [])) for week in weeks],
+            "backgroundColor": "#9c27b0",
+        },
+    }
+
+
+# Summary figure → condition, counted over the tasks in scope
+_SUMMARY_COUNTS = {
+    "total_tasks": "1=1",
+    "open_tasks": "status = 'open'",
+    "in_progress_tasks": "status = 'in_progress'",
+    "completed_tasks": "status = 'completed'",
+    "overdue_tasks": "due_date < DATE('now') AND status NOT IN ('completed', 'cancelled')",
+    "urgent_tasks": "priority = 'urgent' AND status NOT IN ('completed', 'cancelled')",
+}
+
+
+def _task_counts(where, params, by_department):
+    """Counts of the tasks in scope, keyed ("summary", figure) or (column, value).
+
+    Every figure is a count, so per-shard results simply add up.
+    """
+
+    def count(conn):
+        counts = collections.Counter()
+        for name, condition in _SUMMARY_COUNTS.items():
+            counts[("summary", name)] = conn.execute(
+                f"SELECT COUNT(*) FROM tasks t WHERE {condition}{where}", params
+            ).fetchone()[0]
+        for column in ("status", "priority") + (("department",) if by_department else ()):
+            for value, number in conn.execute(
+                f"SELECT {column}, COUNT(*) FROM tasks t WHERE 1=1{where} GROUP BY {column}",
+                params,
+            ):
+                counts[(column, value)] = number
+        return counts
+
+    return sum(fan_out(count, _scope_departments()), collections.Counter())
+
+
+def _grouped(counts, column, order):
+    """[(value, count)] for one GROUP BY column of _task_counts(), sorted by `order`."""
+    return sorted(
+        ((value, number) for (name, value), number in counts.items() if name == column),
+        key=lambda item: order(item[0]),
+    )
+
+
+def _workload(department=None):
+    """[(full_name, open task count)] for staff with open work, busiest first.
+
+    department limits it to that department's people — but their tasks
+    can be in any department, so every shard is asked.
+    """
+    query = """SELECT u.id, u.full_name, COUNT(t.id) as task_count
+               FROM users u LEFT JOIN tasks t ON u.id = t.assigned_to AND t.status != 'completed'
+               WHERE 1=1{} GROUP BY u.id HAVING task_count > 0"""
+    if department:
+        query, params = query.format(" AND u.department = ?"), (department,)
+    else:
+        query, params = query.format(""), ()
+
+    workload = collections.Counter()
+    for rows in fan_out(lambda conn: conn.execute(query, params).fetchall()):
+        for user_id, full_name, task_count in rows:
+            workload[(user_id, full_name)] += task_count
+    ranked = sorted(workload.items(), key=lambda item: (-item[1], item[0][0]))
+    return [(full_name, task_count) for (_, full_name), task_count in ranked]
+
+
+def dashboard_data():
+    """Compute the summary figures and chart series for the current user.
+
+    Returns (summary, charts). Shared by the HTML dashboard below and
+    the JSON API (routes/api.py), so both always agree.
     """
-    conn = get_db()
     role = session.get("role")
-    where, params = _role_filter()
+    where, params = role_filter()
+    counts = _task_counts(where, params, by_department=role == "admin")
 
     # --- Summary statistics ---
-    summary = {
-        "total_tasks": conn.execute(
-            f"SELECT COUNT(*) FROM tasks t WHERE 1=1{where}", params
-        ).fetchone()[0],
-        "open_tasks": conn.execute(
-            f"SELECT COUNT(*) FROM tasks t WHERE status = 'open'{where}", params
-        ).fetchone()[0],
-        "in_progress_tasks": conn.execute(
-            f"SELECT COUNT(*) FROM tasks t WHERE status = 'in_progress'{where}", params
-        ).fetchone()[0],
-        "completed_tasks": conn.execute(
-            f"SELECT COUNT(*) FROM tasks t WHERE status = 'completed'{where}", params
-        ).fetchone()[0],
-        "overdue_tasks": conn.execute(
-            f"SELECT COUNT(*) FROM tasks t WHERE due_date < DATE('now') AND status NOT IN ('completed', 'cancelled'){where}",
-            params,
-        ).fetchone()[0],
-        "urgent_tasks": conn.execute(
-            f"SELECT COUNT(*) FROM tasks t WHERE priority = 'urgent' AND status NOT IN ('completed', 'cancelled'){where}",
-            params,
-        ).fetchone()[0],
-    }
+    summary = {name: counts[("summary", name)] for name in _SUMMARY_COUNTS}
 
     # Only admin/manager see organisation-level metrics
     if role in ("admin", "manager"):
+        conn = get_db()
         summary["total_clients"] = conn.execute(
             "SELECT COUNT(*) FROM clients"
         ).fetchone()[0]
         summary["active_clients"] = conn.execute(
             "SELECT COUNT(*) FROM clients WHERE status = 'active'"
         ).fetchone()[0]
-
-    if role == "admin":
-        summary["total_staff"] = conn.execute(
-            "SELECT COUNT(*) FROM users"
-        ).fetchone()[0]
+        if role == "admin":
+            summary["total_staff"] = conn.execute(
+                "SELECT COUNT(*) FROM users"
+            ).fetchone()[0]
+        conn.close()
 
     # --- Chart data ---
     # Structured to match what Chart.js expects: labels, data, backgroundColor
     charts = {}
 
     # Tasks by status (all roles)
-    status_data = conn.execute(
-        f"SELECT status, COUNT(*) as count FROM tasks t WHERE 1=1{where} GROUP BY status ORDER BY status",
-        params,
-    ).fetchall()
+    status_data = _grouped(counts, "status", lambda status: status)
     status_colours = {
         "open": "#4895ef", "in_progress": "#f9a825",
         "completed": "#4caf50", "cancelled": "#9e9e9e",
     }
     charts["tasks_by_status"] = {
-        "labels": [r["status"].replace("_", " ").title() for r in status_data],
-        "data": [r["count"] for r in status_data],
-        "backgroundColor": [status_colours.get(r["status"], "#999") for r in status_data],
+        "labels": [status.replace("_", " ").title() for status, _ in status_data],
+        "data": [count for _, count in status_data],
+        "backgroundColor": [status_colours.get(status, "#999") for status, _ in status_data],
     }
 
     # Tasks by priority (all roles)
-    priority_data = conn.execute(
-        f"""SELECT priority, COUNT(*) as count FROM tasks t WHERE 1=1{where}
-            GROUP BY priority ORDER BY CASE priority
-            WHEN 'urgent' THEN 1 WHEN 'high' THEN 2
-            WHEN 'medium' THEN 3 WHEN 'low' THEN 4 END""",
-        params,
-    ).fetchall()
+    priority_order = {"urgent": 1, "high": 2, "medium": 3, "low": 4}
+    priority_data = _grouped(counts, "priority", lambda priority: priority_order.get(priority, 5))
     priority_colours = {
         "urgent": "#d32f2f", "high": "#f57c00",
         "medium": "#fbc02d", "low": "#66bb6a",
     }
     charts["tasks_by_priority"] = {
-        "labels": [r["priority"].title() for r in priority_data],
-        "data": [r["count"] for r in priority_data],
-        "backgroundColor": [priority_colours.get(r["priority"], "#999") for r in priority_data],
+        "labels": [priority.title() for priority, _ in priority_data],
+        "data": [count for _, count in priority_data],
+        "backgroundColor": [priority_colours.get(priority, "#999") for priority, _ in priority_data],
     }
 
     # Tasks by department (admin only)
     if role == "admin":
-        dept_data = conn.execute(
-            "SELECT department, COUNT(*) as count FROM tasks GROUP BY department ORDER BY department"
-        ).fetchall()
+        dept_data = _grouped(counts, "department", lambda department: department)
         charts["tasks_by_department"] = {
-            "labels": [r["department"] for r in dept_data],
-            "data": [r["count"] for r in dept_data],
+            "labels": [department for department, _ in dept_data],
+            "data": [count for _, count in dept_data],
             "backgroundColor": ["#4895ef", "#f9a825", "#4caf50", "#e91e63", "#9c27b0", "#00bcd4"][:len(dept_data)],
         }
 
     # Workload by user (admin sees all, manager sees their dept)
-    if role == "admin":
-        workload_data = conn.execute(
-            """SELECT u.full_name, COUNT(t.id) as task_count
-               FROM users u LEFT JOIN tasks t ON u.id = t.assigned_to AND t.status != 'completed'
-               GROUP BY u.id HAVING task_count > 0 ORDER BY task_count DESC"""
-        ).fetchall()
-        charts["workload_by_user"] = {
-            "labels": [r["full_name"] for r in workload_data],
-            "data": [r["task_count"] for r in workload_data],
-            "backgroundColor": "#4895ef",
-        }
-    elif role == "manager":
-        department = session.get("department")
-        workload_data = conn.execute(
-            """SELECT u.full_name, COUNT(t.id) as task_count
-               FROM users u LEFT JOIN tasks t ON u.id = t.assigned_to AND t.status != 'completed'
-               WHERE u.department = ? GROUP BY u.id HAVING task_count > 0 ORDER BY task_count DESC""",
-            (department,),
-        ).fetchall()
+    if role in ("admin", "manager"):
+        workload_data = _workload(session.get("department") if role == "manager" else None)
         charts["workload_by_user"] = {
-            "labels": [r["full_name"] for r in workload_data],
-            "data": [r["task_count"] for r in workload_data],
+            "labels": [full_name for full_name, _ in workload_data],
+            "data": [task_count for _, task_count in workload_data],
             "backgroundColor": "#4895ef",
         }
 
+    # Throughput and cycle time (all roles, scoped like everything else)
+    charts.update(_throughput_charts())
+
+    return summary, charts
+
+
+@dashboard_bp.route("", methods=["GET"])
+@login_required
+def dashboard():
+    """Render the dashboard with summary stats and chart data.
+
+    Everything is computed server-side and passed to the template.
+    Chart.js receives its data via {{ chart_data | tojson }} in a
+    <script> block — this is the standard Flask pattern for passing
+    Python data to JavaScript.
+    """
+    conn = get_db()
+    # Read the feed position BEFORE the figures: any change that lands in
+    # between is then re-sent by the live stream rather than missed
+    feed_cursor = conn.execute(
+        "SELECT COALESCE(MAX(id), 0) FROM change_feed"
+    ).fetchone()[0]
     conn.close()
+    summary, charts = dashboard_data()
 
     return render_template(
         "dashboard.html",
         summary=summary,
         charts=charts,
-        role=role,
+        role=session.get("role"),
+        feed_cursor=feed_cursor,
+    )
+
+
+def _scope_key():
+    """Who sees the same dashboard figures as the current user."""
+    role = session.get("role")
+    if role == "staff":
+        return ("staff", session.get("user_id"))
+    if role == "manager":
+        return ("manager", session.get("department"))
+    return ("admin",)
+
+
+@cached("users")
+def _department_user_ids(department):
+    """Ids of the users in a department (for the manager workload chart)."""
+    conn = get_db()
+    rows = conn.execute("SELECT id FROM users WHERE department = ?", (department,)).fetchall()
+    conn.close()
+    return frozenset(row["id"] for row in rows)
+
+
+def _is_relevant(event, scope):
+    """Could this change alter the figures shown for `scope`?"""
+    if scope[0] == "admin":
+        return True
+    if event["table_name"] == "clients":
+        return scope[0] == "manager"  # client counts are shown to managers
+    people = {event["assigned_to"], event["old_assigned_to"]}
+    if scope[0] == "staff":
+        return scope[1] in people
+    return (
+        scope[1] in (event["department"], event["old_department"])
+        or bool(people & _department_user_ids(scope[1]))
+    )
+
+
+def _scope_snapshot(cursor):
+    """Figures for the current user's scope as of feed position `cursor`.
+
+    Shared between every open stream with the same scope, so a change
+    is recomputed once per scope rather than once per open dashboard.
+    """
+    key = _scope_key()
+    with _snapshots_lock:
+        cached_snapshot = _snapshots.get(key)
+    if cached_snapshot and cached_snapshot[0] >= cursor:
+        return cached_snapshot[1], cached_snapshot[2]
+
+    summary, charts = dashboard_data()
+    with _snapshots_lock:
+        _snapshots[key] = (cursor, summary, charts)
+    return summary, charts
+
+
+def _delta(old, new):
+    """Only the summary values and chart series that differ."""
+    old_summary, old_charts = old
+    new_summary, new_charts = new
+    delta = {}
+    summary = {k: v for k, v in new_summary.items() if old_summary.get(k) != v}
+    if summary:
+        delta["summary"] = summary
+    charts = {k: v for k, v in new_charts.items() if old_charts.get(k) != v}
+    if charts:
+        delta["charts"] = charts
+    return delta
+
+
+def _sse(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _since():
+    """The feed position the page already has (?since=, or Last-Event-ID on reconnect)."""
+    since = request.headers.get("Last-Event-ID") or request.args.get("since") or 0
+    try:
+        return int(since)
+    except ValueError:
+        return 0
+
+
+def stream_start(since):
+    """Open a stream: (cursor, baseline figures, first message or None).
+
+    Shared by the sync view below and the async one
+    (routes/dashboard_async.py), like stream_step().
+    """
+    cursor = feed.current_id()
+    baseline = _scope_snapshot(cursor)
+    message = None
+    if cursor != since:
+        message = _sse("delta", {"summary": baseline[0], "charts": baseline[1]}, cursor)
+    return cursor, baseline, message
+
+
+def stream_step(scope, cursor, baseline, events, complete):
+    """Apply one feed.wait() result: (cursor, baseline, message or None)."""
+    if not events and complete:
+        return cursor, baseline, ": keep-alive\n\n"
+    cursor = events[-1]["id"] if events else feed.current_id()
+    if complete and not any(_is_relevant(event, scope) for event in events):
+        return cursor, baseline, None
+    snapshot = _scope_snapshot(cursor)
+    delta = _delta(baseline, snapshot)
+    return cursor, snapshot, _sse("delta", delta, cursor) if delta else None
+
+
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@dashboard_bp.route("/stream", methods=["GET"])
+@login_required
+def stream():
+    """Server-Sent Events: push dashboard changes to an open page.
+
+    ?since=<id> is the change-feed position the page was rendered at
+    (the browser sends Last-Event-ID instead when it reconnects). If
+    anything changed after it, the first message brings the page up to date.
+
+    This sync view holds a worker thread for as long as the page is
+    open, so admission control (admission.py, the "stream" class) lets
+    only a few run at once per worker. Under the ASGI server the async
+    view in routes/dashboard_async.py serves this URL instead, and holds
+    no thread while it waits.
+
+    Sharded storage has no change feed to follow: the answer is 204 No
+    Content, which tells EventSource to stop reconnecting.
+    """
+    if database.SHARDED:
+        return Response(status=204)
+    since = _since()
+    scope = _scope_key()
+
+    def generate():
+        # Tell EventSource how long to wait before reconnecting (ms)
+        yield "retry: 5000\n\n"
+        cursor, baseline, message = stream_start(since)
+        if message:
+            yield message
+
+        deadline = time.monotonic() + MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            events, complete = feed.wait(cursor, timeout=HEARTBEAT_SECONDS)
+            cursor, baseline, message = stream_step(scope, cursor, baseline, events, complete)
+            if message:
+                yield message
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers=STREAM_HEADERS,
     )
@@ -0,0 +1,90 @@
+"""
+Async Dashboard Stream — the ASGI version of GET /dashboard/stream.
+
+Under Gunicorn's threads, every open dashboard holds one worker thread
+for as long as its live stream is open (up to MAX_STREAM_SECONDS), so
+admission control lets only a few run per worker. Under the ASGI server
+(asgi.py) this view serves the URL instead: while it waits for the
+change feed it is a coroutine parked on a future (change_feed.py's
+wait_async()), not a thread, so hundreds of open dashboards cost almost
+nothing.
+
+The figures themselves still come from routes/dashboard.py —
+stream_start() and stream_step() are shared with the sync view, so the
+two send exactly the same messages. They read the user's scope from the
+Flask session, so they run on the I/O pool inside a request context
+that carries this user's session values (_as_user below). That only
+happens when something relevant changed; keep-alives and waiting never
+touch a thread.
+"""
+
+import asyncio
+
+from flask import session
+
+import database
+from asgi import AsgiResponse
+from change_feed import feed
+from routes.attachments_async import login_required
+from routes.dashboard import (
+    HEARTBEAT_SECONDS, MAX_STREAM_SECONDS, STREAM_HEADERS, _scope_key, stream_start, stream_step,
+)
+
+
+def _as_user(app, user, function, *args):
+    """Run a dashboard helper as `user` (their session values), outside a real request."""
+    with app.test_request_context():
+        session.update(user)
+        return function(*args)
+
+
+@login_required
+async def stream(request):
+    """Server-Sent Events: the same messages as the sync view, without a thread."""
+    if database.SHARDED:
+        return AsgiResponse(status=204)
+    since = request.headers.get("Last-Event-ID") or request.args.get("since") or 0
+    try:
+        since = int(since)
+    except ValueError:
+        since = 0
+    app = request.app
+    user = dict(request.session)
+
+    async def generate():
+        # Tell EventSource how long to wait before reconnecting (ms)
+        yield b"retry: 5000\n\n"
+        scope = await request.run(_as_user, app, user, _scope_key)
+        cursor, baseline, message = await request.run(_as_user, app, user, stream_start, since)
+        if message:
+            yield message.encode()
+
+        loop = asyncio.get_running_loop()
+        gone = asyncio.ensure_future(request.disconnected())
+        try:
+            deadline = loop.time() + MAX_STREAM_SECONDS
+            while loop.time() < deadline:
+                waiting = asyncio.ensure_future(feed.wait_async(cursor, HEARTBEAT_SECONDS))
+                await asyncio.wait({waiting, gone}, return_when=asyncio.FIRST_COMPLETED)
+                if gone.done():
+                    waiting.cancel()
+                    return
+                events, complete = waiting.result()
+                if not events and complete:
+                    yield b": keep-alive\n\n"
+                    continue
+                cursor, baseline, message = await request.run(
+                    _as_user, app, user, stream_step, scope, cursor, baseline, events, complete
+                )
+                if message:
+                    yield message.encode()
+        finally:
+            gone.cancel()
+
+    return AsgiResponse(generate(), mimetype="text/event-stream", headers=STREAM_HEADERS)
+
+
+# Endpoint → async view, merged into asgi.AsgiApp's table
+ASYNC_VIEWS = {
+    "dashboard.stream": stream,
+}
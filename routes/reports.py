@@ -0,0 +1,72 @@
+"""
+Report Routes — management breakdowns from the columnar snapshot.
+
+    GET /reports                    → report page (renders reports.html)
+    GET /reports?metric=completed   → weekly breakdown by completion week
+    GET /reports?format=json        → the same figures as JSON
+
+Admin and manager only. Admins see every department; managers see
+their own, using the same scoping rules as the dashboard. The figures
+come from reporting.py, so the page never runs a GROUP BY over tasks.
+The snapshot follows the single-file change feed, so with sharded
+storage (database.py) the page is not available.
+"""
+
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, session, url_for
+from routes.auth import login_required, role_required
+from database import get_db
+import database
+from cache import cached
+import reporting
+
+reports_bp = Blueprint("reports", __name__)
+
+METRICS = ("created", "completed")
+
+
+@cached("users")
+def _user_names():
+    """{user id: full name}, cached until users change."""
+    conn = get_db()
+    names = dict(conn.execute("SELECT id, full_name FROM users").fetchall())
+    conn.close()
+    return names
+
+
+@reports_bp.route("", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def report():
+    """Department × assignee × week, overdue ageing and priority mix."""
+    if not reporting.available():
+        flash("Reports need NumPy — ask an administrator to run: pip install -r requirements.txt", "error")
+        return redirect(url_for("dashboard.dashboard"))
+    if database.SHARDED:
+        flash("Reports are not available with sharded storage", "error")
+        return redirect(url_for("dashboard.dashboard"))
+
+    metric = request.args.get("metric", "created")
+    if metric not in METRICS:
+        metric = "created"
+    if session.get("role") == "manager":
+        scope = ("manager", session.get("department"))
+    else:
+        scope = ("admin",)
+
+    conn = get_db()
+    figures = reporting.snapshot.report(conn, scope, metric=metric)
+    conn.close()
+
+    names = _user_names()
+    for row in figures["weekly"]["breakdown"]:
+        row["assignee"] = names.get(row["assigned_to"], "Unassigned")
+
+    if request.args.get("format") == "json":
+        return jsonify(figures)
+    return render_template(
+        "reports.html",
+        figures=figures,
+        metric=metric,
+        metrics=METRICS,
+        role=session.get("role"),
+    )
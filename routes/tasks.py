@@ -8,46 +8,196 @@ as Flask routes that render Jinja2 templates.
 Server-rendered route conventions:
     GET    /tasks              → list all tasks (renders tasks.html)
     GET    /tasks/<id>         → task detail with attachments (renders task_detail.html)
+    GET    /tasks/<id>/description → full description as JSON (edit dialog)
     POST   /tasks/create       → create a task (redirects to /tasks)
+    POST   /tasks/import       → create many tasks from a CSV file (redirects to /tasks)
     POST   /tasks/<id>/edit    → update a task (redirects to /tasks)
     POST   /tasks/<id>/status  → update status only — staff (redirects to /tasks)
     POST   /tasks/<id>/delete  → delete a task (redirects to /tasks)
+    POST   /tasks/views        → save the current filters as a named view
+    POST   /tasks/views/<id>/delete → delete a saved view
+
+Saved views (saved_views.py) are shown in the navigation on every page
+with a count badge; the counts come from a per-process cache, so
+rendering the navigation costs no query while no task has changed.
 
 Why POST for everything?
     HTML forms only support GET and POST. Unlike a REST API where we use
     PUT and DELETE, server-rendered apps use POST with descriptive URLs.
     This is the standard approach in Django, Rails, Flask, and Laravel.
+
+Optimistic concurrency:
+    Every task has a version number, sent back by the edit, status and
+    delete forms in a hidden field. Each write is ONE statement that
+    only matches if nobody has changed the task since the form was
+    loaded:
+        UPDATE tasks SET ..., version = version + 1
+        WHERE id = ? AND version = ? RETURNING id
+    No row back means the write did not happen — only then do we read
+    the task again, to tell the user whether it was deleted or edited
+    by someone else. The usual case costs one round trip, not two.
+    Edits and status changes open a BEGIN IMMEDIATE transaction first
+    and read the status and assignee at that version inside it — the
+    "from" values for the audit trail. No other writer can get in
+    between, so those are exactly the values the UPDATE replaces.
+
+Audit trail:
+    Successful writes are recorded with audit.record() AFTER they
+    commit; audit.py writes them to the database in the background.
+
+Sharded storage (see database.py):
+    A task lives in its department's shard, and its id says which one,
+    so single-task routes open that shard with task_db(). The list reads
+    the shards its department filter names — every shard, in parallel,
+    if none — and merges their already-sorted rows. Moving a task to
+    another department would mean moving it to another file under a new
+    id, so in this mode the department is fixed once a task is created.
 """
 
-from flask import Blueprint, request, session, redirect, url_for, flash, render_template
+import csv
+import datetime
+import heapq
+import io
+from urllib.parse import parse_qsl
+
+from flask import (
+    Blueprint, current_app, request, session, redirect, url_for, flash, render_template, jsonify,
+)
+from werkzeug.datastructures import MultiDict
 from routes.auth import login_required, role_required
-from database import get_db
+import database
+from database import fan_out, get_db, namedtuple_row, task_db
+from query_planner import TASK_LIST, TASK_STATUSES, TASK_PRIORITIES, DEPARTMENTS
+import audit
+import previews
+import saved_views
+import typeahead
+import workload
 
 tasks_bp = Blueprint("tasks", __name__)
 
 
+@tasks_bp.app_context_processor
+def _saved_view_badges():
+    """saved_view_badges() for base.html — only called when the nav is drawn."""
+
+    def saved_view_badges():
+        if "user_id" not in session:
+            return []
+        return saved_views.badges(session["user_id"], session.get("role"))
+
+    return {"saved_view_badges": saved_view_badges}
+
+
+# Characters of the description shown under each title in the list
+PREVIEW_LENGTH = 80
+
+
+def _chosen(index, values):
+    """(id, label) for the ids selected in a filter, for re-showing them."""
+    chosen = []
+    for value in values:
+        if value != "none":
+            chosen.append((value, index.label(int(value)) or f"#{value}"))
+    return chosen
+
+
+def _before_write(conn, task_id, version):
+    """Start the write transaction and read the status and assignee it will replace.
+
+    This is the "from" side of the audit entries. BEGIN IMMEDIATE takes
+    the write lock before the read, so if the conditional UPDATE that
+    follows succeeds, these are exactly the values it replaced. None
+    means the UPDATE will match nothing either.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    return conn.execute(
+        "SELECT status, assigned_to FROM tasks WHERE id = ? AND version = ?",
+        (task_id, version),
+    ).fetchone()
+
+
+def _audit_edit(task_id, before, status, assigned_to):
+    """Audit entries for a task edit: status and assignee changes get their own."""
+    if before["status"] != status:
+        audit.record("status", "task", task_id, {"from": before["status"], "to": status})
+    if before["assigned_to"] != assigned_to:
+        audit.record("reassign", "task", task_id,
+                     {"from": before["assigned_to"], "to": assigned_to})
+
+
+def _write_failed(conn, task_id):
+    """Explain why a conditional write matched no row (runs only on failure)."""
+    current = conn.execute(
+        "SELECT assigned_to FROM tasks WHERE id = ?", (task_id,)
+    ).fetchone()
+    if current is None:
+        return "Task not found"
+    if session.get("role") == "staff" and current["assigned_to"] != session.get("user_id"):
+        return "You can only update tasks assigned to you"
+    return ("This task was changed by someone else after you opened it. "
+            "Nothing was saved — check the latest version and try again.")
+
+
+def _merge_sorted(results, order):
+    """One list from per-shard lists that are each in ORDER BY sort_value, id.
+
+    Matches the SQL order exactly, including NULLS LAST either way.
+    """
+    if len(results) == 1:
+        return results[0]
+    descending = order == "desc"
+
+    def key(task):
+        # NULLs sort after every value — i.e. "smallest" when descending
+        missing = task.sort_value is None
+        return (not missing if descending else missing, task.sort_value, task.id)
+
+    return list(heapq.merge(*results, key=key, reverse=descending))
+
+
 @tasks_bp.route("", methods=["GET"])
 @login_required
 def task_list():
-    """List all tasks, with optional filtering via query parameters.
+    """List all tasks, with optional filtering and sorting via query parameters.
 
-    Query parameters (submitted via GET form, all optional):
-        ?status=open
+    Query parameters (submitted via GET form, all optional, most repeatable):
+        ?status=open&status=in_progress
         ?priority=high
-        ?department=Finance
+        ?department=Finance&department=HR
+        ?assigned_to=3        (or "none" for unassigned)
+        ?client_id=2
+        ?due_from=2025-01-01&due_to=2025-03-31
         ?search=invoice
+        ?sort=due_date&order=asc
+
+    query_planner.TASK_LIST validates them and builds the SQL; anything
+    invalid is ignored and reported with a flash message. With sharded
+    storage only the shards of the chosen departments are read.
 
     Staff users only see tasks assigned to them.
     Managers and admins see all tasks.
 
-    The template receives the tasks, users, clients, and current filters
-    as context — it renders everything server-side.
-    """
-    conn = get_db()
+    Only the columns the table shows are selected. Descriptions can be
+    long, so SQLite sends just the first PREVIEW_LENGTH characters;
+    the full text is loaded by task_detail, or fetched from
+    /tasks/<id>/description when the edit dialog opens. Rows are compact named tuples.
 
-    # Start building the query
-    query = """
-        SELECT t.*, u.full_name AS assigned_name, c.company_name AS client_name
+    The template receives the tasks and current filters as context — it
+    renders everything server-side. Assignee and client pickers look
+    names up as the user types (see typeahead.py).
+    """
+    plan = TASK_LIST.plan(request.args)
+    for error in plan.errors:
+        flash(error, "error")
+
+    query = f"""
+        SELECT t.id, t.title, t.status, t.priority, t.department, t.assigned_to,
+               t.client_id, t.due_date, t.version,
+               substr(t.description, 1, {PREVIEW_LENGTH}) AS description_preview,
+               length(t.description) > {PREVIEW_LENGTH} AS description_truncated,
+               u.full_name AS assigned_name, c.company_name AS client_name,
+               {TASK_LIST.sorts[plan.sort]} AS sort_value
         FROM tasks t
         LEFT JOIN users u ON t.assigned_to = u.id
         LEFT JOIN clients c ON t.client_id = c.id
@@ -60,66 +210,103 @@ def task_list():
         query += " AND t.assigned_to = ?"
         params.append(session["user_id"])
 
-    # Apply optional filters from query string
-    if request.args.get("status"):
-        query += " AND t.status = ?"
-        params.append(request.args["status"])
-
-    if request.args.get("priority"):
-        query += " AND t.priority = ?"
-        params.append(request.args["priority"])
-
-    if request.args.get("department"):
-        query += " AND t.department = ?"
-        params.append(request.args["department"])
+    def fetch(conn):
+        conn.row_factory = namedtuple_row
+        return conn.execute(f"{query}{plan.where} {plan.order_by}", params + plan.params).fetchall()
 
-    # Search across title and description
-    if request.args.get("search"):
-        query += " AND (t.title LIKE ? OR t.description LIKE ?)"
-        search_term = f"%{request.args['search']}%"
-        params.extend([search_term, search_term])
+    tasks = _merge_sorted(fan_out(fetch, plan.form["department"]), plan.order)
 
-    query += " ORDER BY t.created_at DESC"
-
-    tasks = conn.execute(query, params).fetchall()
-
-    # For admin/manager: fetch users and clients for dropdowns
-    users = []
-    clients = []
+    # The assignee and client pickers search /typeahead as you type, so
+    # the page only needs names for the filter values already selected
+    chosen_users = chosen_clients = []
     if session.get("role") in ("admin", "manager"):
-        users = conn.execute(
-            "SELECT id, full_name, role, department FROM users ORDER BY full_name"
-        ).fetchall()
-        clients = conn.execute(
-            "SELECT id, company_name FROM clients WHERE status = 'active' ORDER BY company_name"
-        ).fetchall()
-
-    conn.close()
+        chosen_users = _chosen(typeahead.user_index(), plan.form["assigned_to"])
+        chosen_clients = _chosen(typeahead.client_index(), plan.form["client_id"])
 
     return render_template(
         "tasks.html",
         tasks=tasks,
-        users=users,
-        clients=clients,
+        chosen_users=chosen_users,
+        chosen_clients=chosen_clients,
         role=session.get("role"),
-        filters={
-            "search": request.args.get("search", ""),
-            "status": request.args.get("status", ""),
-            "priority": request.args.get("priority", ""),
-            "department": request.args.get("department", ""),
-        },
+        filters=plan.form,
+        current_query="" if plan.errors else saved_views.canonical_query(request.args)[0],
     )
 
 
+def _task_list_url(query):
+    return url_for("tasks.task_list") + (f"?{query}" if query else "")
+
+
+@tasks_bp.route("/views", methods=["POST"])
+@login_required
+def save_view():
+    """Save the task list's current filters under a name.
+
+    Saving again under the same name replaces that view's filters.
+    """
+    name = request.form.get("name", "").strip()
+    query, errors = saved_views.canonical_query(
+        MultiDict(parse_qsl(request.form.get("query", "")))
+    )
+    if not query:
+        errors.append("Choose some filters before saving a view")
+    if not name or len(name) > saved_views.MAX_NAME_LENGTH:
+        errors.append(f"View names are 1 to {saved_views.MAX_NAME_LENGTH} characters")
+    existing = saved_views.views_for(session["user_id"])
+    if (len(existing) >= saved_views.MAX_VIEWS_PER_USER
+            and name not in [view_name for _, view_name, _ in existing]):
+        errors.append(f"You can save up to {saved_views.MAX_VIEWS_PER_USER} views — delete one first")
+    if errors:
+        for error in errors:
+            flash(error, "error")
+        return redirect(_task_list_url(query))
+
+    conn = get_db()
+    conn.execute(
+        """
+        INSERT INTO saved_views (user_id, name, query) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, name) DO UPDATE SET query = excluded.query
+        """,
+        (session["user_id"], name, query),
+    )
+    conn.commit()
+    conn.close()
+
+    flash(f"View \"{name}\" saved", "success")
+    return redirect(_task_list_url(query))
+
+
+@tasks_bp.route("/views/<int:view_id>/delete", methods=["POST"])
+@login_required
+def delete_view(view_id):
+    """Delete one of your own saved views."""
+    conn = get_db()
+    deleted = conn.execute(
+        "DELETE FROM saved_views WHERE id = ? AND user_id = ? RETURNING id",
+        (view_id, session["user_id"]),
+    ).fetchone()
+    conn.commit()
+    conn.close()
+
+    if deleted is None:
+        flash("View not found", "error")
+    else:
+        saved_views.view_counts.forget(view_id)
+        flash("View deleted", "success")
+    return redirect(url_for("tasks.task_list"))
+
+
 @tasks_bp.route("/<int:task_id>", methods=["GET"])
 @login_required
 def task_detail(task_id):
     """View a single task with its attachments.
 
     Staff can only view tasks assigned to them.
-    The template shows upload/download forms for file attachments.
+    The template shows upload/download forms for file attachments, and
+    each file's preview (previews.py) if one has been made.
     """
-    conn = get_db()
+    conn = task_db(task_id)
 
     task = conn.execute(
         """
@@ -160,11 +347,31 @@ def task_detail(task_id):
         "task_detail.html",
         task=task,
         attachments=attachments,
+        previews=previews.previews_for(current_app.config["UPLOAD_FOLDER"], attachments),
         role=session.get("role"),
         user_id=session.get("user_id"),
     )
 
 
+@tasks_bp.route("/<int:task_id>/description", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def task_description(task_id):
+    """The full description and version of one task, as JSON.
+
+    The task list only carries a preview; the edit dialog fetches the
+    whole text from here when it opens.
+    """
+    conn = task_db(task_id)
+    task = conn.execute(
+        "SELECT description, version FROM tasks WHERE id = ?", (task_id,)
+    ).fetchone()
+    conn.close()
+    if task is None:
+        return jsonify(error="Task not found"), 404
+    return jsonify(description=task["description"] or "", version=task["version"])
+
+
 @tasks_bp.route("/create", methods=["POST"])
 @login_required
 @role_required("admin", "manager")
@@ -189,6 +396,8 @@ def create_task():
         errors.append("Title is required")
     if not department:
         errors.append("Department is required")
+    elif department not in DEPARTMENTS:
+        errors.append(f"Department must be one of: {', '.join(DEPARTMENTS)}")
 
     valid_statuses = ["open", "in_progress", "completed", "cancelled"]
     status = request.form.get("status", "open")
@@ -206,32 +415,186 @@ def create_task():
         return redirect(url_for("tasks.task_list"))
 
     # --- Insert into database ---
-    conn = get_db()
-    conn.execute(
-        """
-        INSERT INTO tasks (title, description, status, priority, department,
-                          assigned_to, client_id, due_date, created_by)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            title,
-            request.form.get("description", "").strip(),
-            status,
-            priority,
-            department,
-            request.form.get("assigned_to") or None,
-            request.form.get("client_id") or None,
-            request.form.get("due_date") or None,
-            session["user_id"],
-        ),
-    )
-    conn.commit()
+    # "auto" in the Assign To dropdown picks the least-loaded staff
+    # member in the department (see workload.py)
+    due_date = request.form.get("due_date") or None
+    conn = get_db(department)
+    with workload.index_for(department).assigning(conn) as assign:
+        assigned_to = assign(department, priority, due_date, status,
+                             request.form.get("assigned_to") or None)
+        task_id = conn.execute(
+            """
+            INSERT INTO tasks (title, description, status, priority, department,
+                              assigned_to, client_id, due_date, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                title,
+                request.form.get("description", "").strip(),
+                status,
+                priority,
+                department,
+                assigned_to,
+                request.form.get("client_id") or None,
+                due_date,
+                session["user_id"],
+            ),
+        ).lastrowid
     conn.close()
+    audit.record("create", "task", task_id,
+                 {"title": title, "assigned_to": int(assigned_to) if assigned_to else None})
+
+    if request.form.get("assigned_to") == "auto" and assigned_to is None:
+        flash(f"No staff in {department} to auto-assign to — the task is unassigned", "error")
 
     flash("Task created successfully", "success")
     return redirect(url_for("tasks.task_list"))
 
 
+# Columns a CSV import may contain (only title and department are required)
+IMPORT_COLUMNS = ("title", "description", "status", "priority", "department",
+                  "assigned_to", "client", "due_date")
+MAX_IMPORT_ROWS = 5000
+
+
+def _parse_import(file, auto_assign):
+    """Read and validate an uploaded CSV. Returns (rows, errors).
+
+    Every row is checked before anything is written, so an import
+    either goes in completely or not at all. assigned_to holds a
+    username, "auto", or nothing (auto if the "auto-assign" box was
+    ticked); client holds a company name.
+    """
+    conn = get_db()
+    user_ids = dict(conn.execute("SELECT username, id FROM users").fetchall())
+    client_ids = dict(conn.execute("SELECT company_name, id FROM clients").fetchall())
+    conn.close()
+
+    try:
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig"))
+        header = reader.fieldnames or []
+    except UnicodeDecodeError:
+        return [], ["The file is not UTF-8 text — save it as CSV (UTF-8) and try again"]
+    missing = [name for name in ("title", "department") if name not in header]
+    if missing:
+        return [], [f"Missing column(s): {', '.join(missing)}"]
+
+    rows, errors = [], []
+    try:
+        for line, record in enumerate(reader, start=2):  # line 1 is the header
+            if len(rows) >= MAX_IMPORT_ROWS:
+                errors.append(f"At most {MAX_IMPORT_ROWS} tasks per import")
+                break
+            record = {name: (record.get(name) or "").strip() for name in IMPORT_COLUMNS}
+            row_errors = []
+            if not record["title"]:
+                row_errors.append("title is required")
+            if record["department"] not in DEPARTMENTS:
+                row_errors.append(f"unknown department '{record['department']}'")
+            record["status"] = record["status"] or "open"
+            if record["status"] not in TASK_STATUSES:
+                row_errors.append(f"unknown status '{record['status']}'")
+            record["priority"] = record["priority"] or "medium"
+            if record["priority"] not in TASK_PRIORITIES:
+                row_errors.append(f"unknown priority '{record['priority']}'")
+            if record["due_date"]:
+                try:
+                    record["due_date"] = datetime.date.fromisoformat(record["due_date"]).isoformat()
+                except ValueError:
+                    row_errors.append(f"due_date '{record['due_date']}' is not YYYY-MM-DD")
+            else:
+                record["due_date"] = None
+
+            assignee = record["assigned_to"] or ("auto" if auto_assign else "")
+            if assignee == "auto":
+                record["assigned_to"] = "auto"
+            elif assignee:
+                record["assigned_to"] = user_ids.get(assignee)
+                if record["assigned_to"] is None:
+                    row_errors.append(f"unknown user '{assignee}'")
+            else:
+                record["assigned_to"] = None
+
+            client = record.pop("client")
+            record["client_id"] = client_ids.get(client) if client else None
+            if client and record["client_id"] is None:
+                row_errors.append(f"unknown client '{client}'")
+
+            if row_errors:
+                errors.append(f"Line {line}: {'; '.join(row_errors)}")
+            rows.append(record)
+    except (csv.Error, UnicodeDecodeError) as exc:
+        errors.append(f"Could not read the file: {exc}")
+    return rows, errors
+
+
+@tasks_bp.route("/import", methods=["POST"])
+@login_required
+@role_required("admin", "manager")
+def import_tasks():
+    """Create many tasks at once from an uploaded CSV file.
+
+    All rows go in ONE transaction, and auto-assigned rows are spread
+    across each department's staff by workload as they are inserted —
+    each pick is O(log n), so thousands of rows import in well under a
+    second. Nothing is written if any row is invalid. (With sharded
+    storage it is one transaction per department's shard.)
+    """
+    file = request.files.get("file")
+    if file is None or file.filename == "":
+        flash("Choose a CSV file to import", "error")
+        return redirect(url_for("tasks.task_list"))
+
+    rows, errors = _parse_import(file.stream, request.form.get("auto_assign") == "1")
+    if not errors and not rows:
+        errors.append("The file has no tasks in it")
+    if errors:
+        for error in errors[:10]:
+            flash(error, "error")
+        if len(errors) > 10:
+            flash(f"…and {len(errors) - 10} more problem(s). Nothing was imported.", "error")
+        return redirect(url_for("tasks.task_list"))
+
+    # One transaction per file: everything in single-file storage, one
+    # per department's shard in sharded storage
+    by_shard = {}
+    for row in rows:
+        shard = row["department"] if database.SHARDED else None
+        by_shard.setdefault(shard, []).append(row)
+
+    unassigned = 0
+    for shard, shard_rows in by_shard.items():
+        conn = get_db(shard)
+        with workload.index_for(shard).assigning(conn) as assign:
+            for row in shard_rows:
+                row["assigned_to"] = assign(row["department"], row["priority"], row["due_date"],
+                                            row["status"], row["assigned_to"])
+                unassigned += row["assigned_to"] is None
+                row["created_by"] = session["user_id"]
+            conn.executemany(
+                """
+                INSERT INTO tasks (title, description, status, priority, department,
+                                  assigned_to, client_id, due_date, created_by)
+                VALUES (:title, :description, :status, :priority, :department,
+                        :assigned_to, :client_id, :due_date, :created_by)
+                """,
+                shard_rows,
+            )
+            # Each transaction's ids are consecutive
+            last_id = conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0]
+        conn.close()
+        audit.record("import", "task", None, {
+            "filename": file.filename, "count": len(shard_rows),
+            "first_id": last_id - len(shard_rows) + 1, "last_id": last_id,
+        })
+
+    message = f"Imported {len(rows)} task(s)"
+    if unassigned:
+        message += f" ({unassigned} unassigned)"
+    flash(message, "success")
+    return redirect(url_for("tasks.task_list"))
+
+
 @tasks_bp.route("/<int:task_id>/edit", methods=["POST"])
 @login_required
 @role_required("admin", "manager")
@@ -240,37 +603,48 @@ def edit_task(task_id):
 
     Staff use the separate /status route which only allows status changes.
     """
-    conn = get_db()
-
-    # Check task exists
-    existing = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-    if existing is None:
-        conn.close()
-        flash("Task not found", "error")
+    version = request.form.get("version", type=int)
+    status = request.form.get("status", "open")
+    assigned_to = request.form.get("assigned_to", type=int)
+    department = request.form.get("department", "").strip()
+    if database.SHARDED and department != database.department_for_id(task_id):
+        flash("A task cannot move to another department — create it there instead", "error")
         return redirect(url_for("tasks.task_list"))
 
-    conn.execute(
+    conn = task_db(task_id)
+    before = _before_write(conn, task_id, version)
+    updated = conn.execute(
         """
         UPDATE tasks SET title=?, description=?, status=?, priority=?,
                department=?, assigned_to=?, client_id=?, due_date=?,
-               updated_at=CURRENT_TIMESTAMP
-        WHERE id = ?
+               updated_at=CURRENT_TIMESTAMP, updated_by=?, version=version + 1
+        WHERE id = ? AND version = ?
+        RETURNING id
         """,
         (
             request.form.get("title", "").strip(),
             request.form.get("description", "").strip(),
-            request.form.get("status", "open"),
+            status,
             request.form.get("priority", "medium"),
-            request.form.get("department", "").strip(),
-            request.form.get("assigned_to") or None,
+            department,
+            assigned_to,
             request.form.get("client_id") or None,
             request.form.get("due_date") or None,
+            session["user_id"],
             task_id,
+            version,
         ),
-    )
+    ).fetchone()
+    if updated is None:
+        message = _write_failed(conn, task_id)
+        conn.close()
+        flash(message, "error")
+        return redirect(url_for("tasks.task_list"))
     conn.commit()
     conn.close()
 
+    audit.record("update", "task", task_id, {"version": version + 1})
+    _audit_edit(task_id, before, status, assigned_to)
     flash("Task updated successfully", "success")
     return redirect(url_for("tasks.task_list"))
 
@@ -286,35 +660,37 @@ def update_task_status(task_id):
     - Using a separate route (instead of field whitelisting) is simpler
       and more secure — the form only has a status dropdown
     """
-    conn = get_db()
-
-    # Check task exists
-    existing = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-    if existing is None:
-        conn.close()
-        flash("Task not found", "error")
-        return redirect(url_for("tasks.task_list"))
-
-    # Staff can only update tasks assigned to them
-    if session.get("role") == "staff" and existing["assigned_to"] != session.get("user_id"):
-        conn.close()
-        flash("You can only update tasks assigned to you", "error")
-        return redirect(url_for("tasks.task_list"))
-
     new_status = request.form.get("status", "")
     valid_statuses = ["open", "in_progress", "completed", "cancelled"]
     if new_status not in valid_statuses:
-        conn.close()
         flash("Invalid status value", "error")
         return redirect(url_for("tasks.task_list"))
 
-    conn.execute(
-        "UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        (new_status, task_id),
-    )
+    # Staff can only update tasks assigned to them — enforced in the
+    # WHERE clause, so the check and the write are the same statement
+    query = """
+        UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP,
+               updated_by = ?, version = version + 1
+        WHERE id = ? AND version = ?
+    """
+    version = request.form.get("version", type=int)
+    params = [new_status, session["user_id"], task_id, version]
+    if session.get("role") == "staff":
+        query += " AND assigned_to = ?"
+        params.append(session["user_id"])
+
+    conn = task_db(task_id)
+    before = _before_write(conn, task_id, version)
+    updated = conn.execute(query + " RETURNING id", params).fetchone()
+    if updated is None:
+        message = _write_failed(conn, task_id)
+        conn.close()
+        flash(message, "error")
+        return redirect(url_for("tasks.task_list"))
     conn.commit()
     conn.close()
 
+    _audit_edit(task_id, before, new_status, before["assigned_to"])
     flash("Task status updated", "success")
     return redirect(url_for("tasks.task_list"))
 
@@ -323,19 +699,24 @@ def update_task_status(task_id):
 @login_required
 @role_required("admin", "manager")
 def delete_task(task_id):
-    """Delete a task and its attachments. Admin and manager only."""
-    conn = get_db()
-    existing = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-    if existing is None:
+    """Delete a task and its attachments. Admin and manager only.
+
+    The attachment rows go with it through the foreign key's
+    ON DELETE CASCADE (get_db() switches foreign keys on).
+    """
+    conn = task_db(task_id)
+    deleted = conn.execute(
+        "DELETE FROM tasks WHERE id = ? AND version = ? RETURNING id, title",
+        (task_id, request.form.get("version", type=int)),
+    ).fetchone()
+    if deleted is None:
+        message = _write_failed(conn, task_id)
         conn.close()
-        flash("Task not found", "error")
+        flash(message, "error")
         return redirect(url_for("tasks.task_list"))
-
-    # Delete attachments first (cascade), then the task
-    conn.execute("DELETE FROM attachments WHERE task_id = ?", (task_id,))
-    conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
     conn.commit()
     conn.close()
 
+    audit.record("delete", "task", task_id, {"title": deleted["title"]})
     flash("Task deleted successfully", "success")
     return redirect(url_for("tasks.task_list"))
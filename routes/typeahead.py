@@ -0,0 +1,28 @@
+"""
+Typeahead Routes — search-as-you-type lookups for the task form pickers.
+
+    GET /typeahead/users?q=jo      → [{id, label, detail}, ...]
+    GET /typeahead/clients?q=west
+
+Admin and manager only (the only roles that assign tasks). At most
+typeahead.MAX_RESULTS matches are returned; ?limit= can ask for fewer.
+"""
+
+from flask import Blueprint, abort, jsonify, request
+from routes.auth import login_required, role_required
+import typeahead
+
+typeahead_bp = Blueprint("typeahead", __name__)
+
+
+@typeahead_bp.route("/<kind>", methods=["GET"])
+@login_required
+@role_required("admin", "manager")
+def lookup(kind):
+    """Top matches for ?q= from the in-memory prefix index."""
+    index = typeahead.INDEXES.get(kind)
+    if index is None:
+        abort(404)
+    limit = request.args.get("limit", typeahead.MAX_RESULTS, type=int)
+    limit = max(1, min(limit, typeahead.MAX_RESULTS))
+    return jsonify(results=index().search(request.args.get("q", ""), limit))
@@ -0,0 +1,193 @@
+"""
+Saved Views — named /tasks filters, with their counts in the navigation.
+
+People apply the same filters over and over ("my urgent open tasks",
+"Finance, due this month"). A saved view is just the task list's query
+string under a name, stored per user in saved_views. Each one appears
+in the navigation bar on every page as a link with a count badge.
+
+The problem:
+    The navigation is on EVERY page. Counting each view's tasks for
+    every render would add a query per view to every request.
+
+The solution — counts cached per view, invalidated by scope:
+    Each count is cached in this process, with the "scopes" its tasks
+    can come from:
+
+        assignee:<id> / assignee:none   if the view (or the staff role)
+                                        pins who the tasks belong to
+        department:<name>               otherwise — the departments it
+                                        filters on, or all of them
+
+    Triggers (database.py) bump those scopes' rows in
+    task_scope_versions on every task INSERT, UPDATE and DELETE — the
+    old and the new department and assignee. So:
+
+    - While the tasks table's change counter (cache.py) has not moved,
+      every badge is served from the cache: no query at all.
+    - When it has moved, one small query reads the versions of the
+      scopes the user's views depend on, and only the views whose
+      scopes moved are counted again. An edit to a Finance task does
+      not recount a view of HR's tasks, or of someone else's.
+
+    Each user's list of views is cached too (@cached("saved_views")),
+    until any view is saved or deleted.
+
+Counts follow the task list's own rules: staff only count tasks
+assigned to them.
+"""
+
+import collections
+import os
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+from werkzeug.datastructures import MultiDict
+
+import cache
+import database
+from cache import cached
+from query_planner import DEPARTMENTS, TASK_LIST
+
+MAX_VIEWS_PER_USER = 8
+MAX_NAME_LENGTH = 40
+
+_VERSION_QUERY = "SELECT scope, version FROM task_scope_versions WHERE scope IN ({marks})"
+
+
+def canonical_query(args):
+    """The task-list query string for `args`, keeping only what the list reads.
+
+    Parameters come out in a fixed order, so the same filters saved twice
+    give the same string. Returns (query, errors) — errors as in
+    TASK_LIST.plan().
+    """
+    pairs = [
+        (parameter, value)
+        for parameter in TASK_LIST.parameters + ["sort", "order"]
+        for value in args.getlist(parameter)
+        if value.strip()
+    ]
+    return urlencode(pairs), TASK_LIST.plan(args).errors
+
+
+def _plan(query):
+    return TASK_LIST.plan(MultiDict(parse_qsl(query)))
+
+
+def _scopes(plan, staff_user_id):
+    """The task_scope_versions rows a view's count depends on."""
+    if staff_user_id is not None:
+        return ("assignee:" + str(staff_user_id),)
+    if plan.form["assigned_to"]:
+        return tuple("assignee:" + value for value in plan.form["assigned_to"])
+    return tuple("department:" + name for name in (plan.form["department"] or DEPARTMENTS))
+
+
+def _count(plan, staff_user_id):
+    """Tasks matching a view, summed over the shards its departments are in."""
+    query = "SELECT COUNT(*) FROM tasks t WHERE 1=1"
+    params = []
+    if staff_user_id is not None:
+        query += " AND t.assigned_to = ?"
+        params.append(staff_user_id)
+
+    def fetch(conn):
+        return conn.execute(f"{query}{plan.where}", params + plan.params).fetchone()[0]
+
+    return sum(database.fan_out(fetch, plan.form["department"]))
+
+
+def _versions(scopes):
+    """{scope: version} summed over every shard (0 for a scope never written)."""
+    scopes = sorted(scopes)
+    sql = _VERSION_QUERY.format(marks=", ".join("?" * len(scopes)))
+    versions = collections.Counter()
+    for rows in database.fan_out(lambda conn: conn.execute(sql, scopes).fetchall()):
+        for scope, version in rows:
+            versions[scope] += version
+    return versions
+
+
+@cached("saved_views")
+def views_for(user_id):
+    """A user's saved views as (id, name, query) tuples, oldest first."""
+    conn = database.get_db()
+    rows = conn.execute(
+        "SELECT id, name, query FROM saved_views WHERE user_id = ? ORDER BY id", (user_id,)
+    ).fetchall()
+    conn.close()
+    return tuple(tuple(row) for row in rows)
+
+
+class ViewCounts:
+    """Per-process cache of saved-view counts, recounted per view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # (view id, query, staff user id) → (tasks counter it was checked at,
+        #                                     scopes, scope version, count)
+        self._entries = {}
+        self._pid = os.getpid()
+        self.hits = 0
+        self.recounted = 0
+
+    def counts(self, views, staff_user_id=None):
+        """[(id, name, query, count), ...] for a user's views."""
+        if not views:
+            return []
+        checked_at = cache.table_versions().get("tasks")
+        keys = [(view_id, query, staff_user_id) for view_id, _, query in views]
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            entries = {key: self._entries[key] for key in keys if key in self._entries}
+        unchecked = [key for key in keys
+                     if checked_at is None or entries.get(key, (None,))[0] != checked_at]
+
+        if unchecked:
+            plans = {key: _plan(key[1]) for key in unchecked}
+            scopes = {key: entries[key][1] if key in entries else _scopes(plans[key], staff_user_id)
+                      for key in unchecked}
+            # Versions are read BEFORE counting, as in client_rollups.py:
+            # a write in between only means one extra recount later
+            versions = _versions({scope for key in unchecked for scope in scopes[key]})
+            recounted = 0
+            for key in unchecked:
+                version = sum(versions[scope] for scope in scopes[key])
+                if key in entries and entries[key][2] == version:
+                    count = entries[key][3]
+                else:
+                    count = _count(plans[key], staff_user_id)
+                    recounted += 1
+                entries[key] = (checked_at, scopes[key], version, count)
+            with self._lock:
+                self._entries.update((key, entries[key]) for key in unchecked)
+                self.recounted += recounted
+        with self._lock:
+            self.hits += len(keys) - len(unchecked)
+
+        return [(view_id, name, query, entries[key][3])
+                for (view_id, name, query), key in zip(views, keys)]
+
+    def forget(self, view_id):
+        """Drop a deleted view's counts."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == view_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {"views": len(self._entries), "hits": self.hits, "recounted": self.recounted}
+
+
+# One shared cache per process
+view_counts = ViewCounts()
+
+
+def badges(user_id, role):
+    """The navigation's saved views for one user, with counts from the cache."""
+    return view_counts.counts(views_for(user_id), user_id if role == "staff" else None)
@@ -12,7 +12,7 @@ The seed data reflects MJ Limited's department structure from the fact file.
 """
 
 from werkzeug.security import generate_password_hash
-from database import get_db, init_db
+from database import get_db, init_db, shard_departments
 
 
 def seed():
@@ -121,15 +121,20 @@ def seed():
          "open", "low", "Administration", 7, 5, "2026-03-15", 4),
     ]
 
-    cursor.executemany(
-        "INSERT INTO tasks (title, description, status, priority, department, "
-        "assigned_to, client_id, due_date, created_by) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        tasks,
-    )
-
     conn.commit()
     conn.close()
+
+    # With sharded storage each department's tasks go into its own file
+    for shard in shard_departments():
+        conn = get_db(shard)
+        conn.executemany(
+            "INSERT INTO tasks (title, description, status, priority, department, "
+            "assigned_to, client_id, due_date, created_by) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [task for task in tasks if shard is None or task[4] == shard],
+        )
+        conn.commit()
+        conn.close()
     print("✅ Database seeded successfully with sample data.")
     print("   Users: 8 (1 admin, 3 managers, 4 staff)")
     print("   Clients: 5 (4 active, 1 inactive)")
@@ -0,0 +1,187 @@
+"""
+Production Server Launcher — serves the app with Gunicorn.
+
+`python app.py` starts Flask's development server: one process, the
+interactive debugger switched on, and no protection against a slow
+request holding everyone else up. That is perfect while coding and
+dangerous in production. This script is the production entry point.
+
+Usage:
+    python serve.py                                  # sensible defaults
+    python serve.py --workers 4 --threads 2 --bind 0.0.0.0:8000
+    python serve.py --max-requests 2000              # recycle workers sooner
+    python serve.py --asgi                           # Uvicorn workers (see asgi.py)
+
+Every option can also be set in .env (SERVER_WORKERS, SERVER_THREADS, ...).
+
+How it works:
+    1. PRELOAD — the app is created ONCE in the master process, before
+       any workers exist. Templates are compiled and caches filled here.
+    2. FORK — each worker is a copy of the master. Linux shares the
+       master's memory pages with every worker until someone writes to
+       them ("copy-on-write"), so N workers do not cost N copies of the
+       compiled templates and warm caches.
+    3. WARM — each worker opens its own database connections (SQLite
+       connections must never cross a fork) before taking traffic.
+    4. RECYCLE — after --max-requests requests (plus random jitter, so
+       workers don't all restart together) a worker is replaced. Any slow
+       memory growth is bounded instead of accumulating all day.
+    5. SHUT DOWN GRACEFULLY — on SIGTERM workers stop accepting new
+       connections and get --graceful-timeout seconds to finish the
+       requests they are already serving.
+
+With --asgi each worker runs Uvicorn's event loop instead of a thread
+pool: attachment uploads and downloads are served by async views that
+hold no thread while they wait on the network, and every other route
+runs on ASGI_WSGI_THREADS threads per worker (so --threads is ignored).
+
+Gunicorn only runs on Linux/macOS. On Windows, use `python app.py`.
+"""
+
+import argparse
+import gc
+import os
+import sys
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # pragma: no cover - depends on the environment
+    BaseApplication = None
+
+from app import create_app
+import cache
+
+
+def warm_up(app):
+    """Do the first-request work now, so no user has to wait for it.
+
+    - Compile every Jinja2 template (normally done lazily on first render)
+    - Open the cache-coherence connection and build the typeahead indexes
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    with app.app_context():
+        cache.validate()
+        import typeahead
+
+        for build_index in typeahead.INDEXES.values():
+            build_index()
+
+
+def _default_workers():
+    """Gunicorn's rule of thumb: (2 × CPU cores) + 1."""
+    return (os.cpu_count() or 1) * 2 + 1
+
+
+def parse_args(argv=None):
+    """Read launcher options from the command line, defaulting to .env values."""
+    parser = argparse.ArgumentParser(description="Run the MJ Limited Staff Portal in production.")
+    parser.add_argument(
+        "--bind", default=os.getenv("SERVER_BIND", "127.0.0.1:8000"),
+        help="address:port to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("SERVER_WORKERS", _default_workers())),
+        help="worker processes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=int(os.getenv("SERVER_THREADS", 2)),
+        help="threads per worker (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=int(os.getenv("SERVER_MAX_REQUESTS", 1000)),
+        help="recycle a worker after this many requests, 0 = never (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout", type=int, default=int(os.getenv("SERVER_TIMEOUT", 30)),
+        help="kill a worker silent for this many seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 20)),
+        help="seconds to finish in-flight requests on shutdown (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--asgi", action="store_true", default=os.getenv("SERVER_ASGI", "0") == "1",
+        help="serve with Uvicorn workers and async attachment transfers (needs uvicorn)",
+    )
+    return parser.parse_args(argv)
+
+
+def _post_fork(server, worker):
+    """Runs inside each new worker, before it accepts any requests."""
+    cache.validate()  # opens this worker's own watcher connection
+
+
+def _when_ready(server):
+    """Runs in the master once it is listening, just before forking workers.
+
+    gc.freeze() moves every object that exists now into a permanent
+    generation the garbage collector never scans. Without it, the first
+    collection in each worker would touch (and therefore copy) nearly
+    every page it shares with the master.
+    """
+    gc.freeze()
+
+
+if BaseApplication is not None:
+
+    class StandaloneApplication(BaseApplication):
+        """Run Gunicorn from Python with an app object we already built."""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+
+def main(argv=None):
+    if BaseApplication is None:
+        sys.exit(
+            "Gunicorn is not installed (pip install -r requirements.txt). "
+            "On Windows, use `python app.py` instead."
+        )
+
+    args = parse_args(argv)
+    if args.asgi:
+        try:
+            import uvicorn.workers  # noqa: F401 - imported by name by Gunicorn
+        except ImportError:
+            sys.exit("--asgi needs Uvicorn (pip install uvicorn).")
+
+    # Preload: build and warm the app once, in the master process
+    app = create_app()
+    warm_up(app)
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread" if args.threads > 1 else "sync",
+        "preload_app": True,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "post_fork": _post_fork,
+        "when_ready": _when_ready,
+        "accesslog": "-",
+    }
+    application = app
+    if args.asgi:
+        from asgi import create_asgi_app
+
+        options["worker_class"] = "uvicorn.workers.UvicornWorker"
+        application = create_asgi_app(app)
+    StandaloneApplication(application, options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,16 @@
  * - Keeps JavaScript out of the HTML template
  * - Can be cached by the browser (fewer bytes on repeat visits)
  * - Easier to test and maintain than inline <script> blocks
+ *
+ * Live updates: listenForDashboardUpdates() opens a Server-Sent Events
+ * stream. The server sends only the figures that changed, and
+ * applyDashboardDelta() patches them into the existing cards and charts —
+ * no page reload, no chart rebuilt from scratch.
  */
 
+/** Chart instances by data key (e.g. "tasks_by_status"), for in-place updates. */
+const dashboardCharts = {};
+
 /**
  * Render all dashboard charts based on role and available data.
  *
@@ -24,7 +32,7 @@
 function renderCharts(data, role) {
   // --- Tasks by Status (all roles) ---
   if (data.tasks_by_status) {
-    new Chart(document.getElementById("statusChart"), {
+    dashboardCharts.tasks_by_status = new Chart(document.getElementById("statusChart"), {
       type: "doughnut",
       data: {
         labels: data.tasks_by_status.labels,
@@ -44,7 +52,7 @@ function renderCharts(data, role) {
 
   // --- Tasks by Priority (all roles) ---
   if (data.tasks_by_priority) {
-    new Chart(document.getElementById("priorityChart"), {
+    dashboardCharts.tasks_by_priority = new Chart(document.getElementById("priorityChart"), {
       type: "doughnut",
       data: {
         labels: data.tasks_by_priority.labels,
@@ -64,7 +72,7 @@ function renderCharts(data, role) {
 
   // --- Tasks by Department (admin only) ---
   if (data.tasks_by_department && role === "admin") {
-    new Chart(document.getElementById("departmentChart"), {
+    dashboardCharts.tasks_by_department = new Chart(document.getElementById("departmentChart"), {
       type: "bar",
       data: {
         labels: data.tasks_by_department.labels,
@@ -86,7 +94,7 @@ function renderCharts(data, role) {
 
   // --- Workload by Staff (admin + manager) ---
   if (data.workload_by_user && (role === "admin" || role === "manager")) {
-    new Chart(document.getElementById("workloadChart"), {
+    dashboardCharts.workload_by_user = new Chart(document.getElementById("workloadChart"), {
       type: "bar",
       data: {
         labels: data.workload_by_user.labels,
@@ -106,4 +114,135 @@ function renderCharts(data, role) {
       },
     });
   }
+
+  // --- Completed per Week (all roles) ---
+  if (data.completed_per_week) {
+    dashboardCharts.completed_per_week = new Chart(document.getElementById("throughputChart"), {
+      type: "bar",
+      data: {
+        labels: data.completed_per_week.labels,
+        datasets: [
+          {
+            label: "Completed",
+            data: data.completed_per_week.data,
+            backgroundColor: data.completed_per_week.backgroundColor,
+          },
+        ],
+      },
+      options: {
+        responsive: true,
+        scales: { y: { beginAtZero: true, ticks: { stepSize: 1 } } },
+        plugins: { legend: { display: false } },
+      },
+    });
+  }
+
+  // --- Median Cycle Time (all roles) — gaps where nothing was completed ---
+  if (data.median_cycle_time) {
+    dashboardCharts.median_cycle_time = new Chart(document.getElementById("cycleTimeChart"), {
+      type: "line",
+      data: {
+        labels: data.median_cycle_time.labels,
+        datasets: [
+          {
+            label: "Median days",
+            data: data.median_cycle_time.data,
+            backgroundColor: data.median_cycle_time.backgroundColor,
+            borderColor: data.median_cycle_time.backgroundColor,
+          },
+        ],
+      },
+      options: {
+        responsive: true,
+        scales: { y: { beginAtZero: true } },
+        plugins: { legend: { display: false } },
+      },
+    });
+  }
+}
+
+/**
+ * Patch changed figures into the page.
+ *
+ * @param {Object} delta - {summary: {key: value}, charts: {key: {labels, data, backgroundColor}}}
+ */
+function applyDashboardDelta(delta) {
+  // Summary cards: each value element carries data-stat="<summary key>"
+  for (const [key, value] of Object.entries(delta.summary || {})) {
+    const element = document.querySelector(`[data-stat="${key}"]`);
+    if (element) {
+      element.textContent = value;
+    }
+  }
+
+  // Charts: swap the data in place and let Chart.js animate the change
+  for (const [key, series] of Object.entries(delta.charts || {})) {
+    const chart = dashboardCharts[key];
+    if (!chart) {
+      continue;
+    }
+    chart.data.labels = series.labels;
+    chart.data.datasets[0].data = series.data;
+    chart.data.datasets[0].backgroundColor = series.backgroundColor;
+    chart.update();
+  }
+}
+
+/**
+ * Subscribe to the dashboard's live stream.
+ *
+ * EventSource reconnects by itself if the connection drops, sending the
+ * last event id so the server can catch the page up.
+ *
+ * @param {string} url - The /dashboard/stream URL (with ?since=<feed position>)
+ */
+function listenForDashboardUpdates(url) {
+  if (!window.EventSource) {
+    return; // very old browser — the page still works, just without live updates
+  }
+  const source = new EventSource(url);
+  source.addEventListener("delta", (event) => {
+    applyDashboardDelta(JSON.parse(event.data));
+  });
+}
+
+/** One colour per department (same order as the dashboard's department chart). */
+const REPORT_COLOURS = ["#4895ef", "#f9a825", "#4caf50", "#e91e63", "#9c27b0", "#00bcd4"];
+
+/**
+ * Render the report page's stacked charts (one dataset per department).
+ *
+ * @param {Object} figures - Report figures from reporting.py (see build_report)
+ */
+function renderReportCharts(figures) {
+  const stacked = {
+    responsive: true,
+    scales: { x: { stacked: true }, y: { stacked: true, beginAtZero: true } },
+    plugins: { legend: { position: "bottom" } },
+  };
+  const datasets = (rows, key) =>
+    rows.map((row, i) => ({
+      label: row.department,
+      data: row[key],
+      backgroundColor: REPORT_COLOURS[i % REPORT_COLOURS.length],
+    }));
+
+  new Chart(document.getElementById("ageingChart"), {
+    type: "bar",
+    data: { labels: figures.ageing.labels, datasets: datasets(figures.ageing.rows, "counts") },
+    options: stacked,
+  });
+  new Chart(document.getElementById("priorityMixChart"), {
+    type: "bar",
+    data: {
+      labels: figures.priority_mix.labels,
+      datasets: datasets(figures.priority_mix.rows, "counts"),
+    },
+    options: stacked,
+  });
+  new Chart(document.getElementById("weeklyChart"), {
+    type: "bar",
+    data: { labels: figures.weekly.labels, datasets: datasets(figures.weekly.series, "data") },
+    options: stacked,
+  });
 }
@@ -0,0 +1,160 @@
+/**
+ * typeahead.js — the assignee and client pickers on the task page.
+ *
+ * The server used to render every user and client as an <option>. Now a
+ * picker sends what has been typed to /typeahead/<kind>?q=... (a prefix
+ * search in typeahead.py) and lists the matches under the text box.
+ *
+ * Markup (see the typeahead_picker / typeahead_filter macros in tasks.html):
+ *
+ *   <div class="typeahead" data-source="/typeahead/users"
+ *        data-extra='[{"id": "auto", "label": "Auto-assign"}]'>
+ *     <input type="hidden" name="assigned_to">   ← the id the form submits
+ *     <input type="text" class="typeahead-input"> ← what the user types
+ *     <ul class="typeahead-menu" hidden></ul>
+ *   </div>
+ *
+ * With data-multiple (the filter bar) a picked match is added as a
+ * checked checkbox named data-name instead of filling a hidden input.
+ *
+ * Requests are debounced, and a newer keystroke aborts the request still
+ * in flight, so a slow answer for "jo" can never overwrite the one for "jon".
+ */
+
+const TYPEAHEAD_DELAY_MS = 150;
+
+/** Set a single picker's value (e.g. when the edit modal opens). */
+function setTypeahead(input, value, label) {
+  const box = input.closest(".typeahead");
+  box.querySelector("input[type=hidden]").value = value || "";
+  input.value = value ? label || "#" + value : "";
+}
+
+function initTypeahead(box) {
+  const input = box.querySelector(".typeahead-input");
+  const menu = box.querySelector(".typeahead-menu");
+  const hidden = box.querySelector("input[type=hidden]");
+  const extra = JSON.parse(box.dataset.extra || "[]");
+  const multiple = box.hasAttribute("data-multiple");
+  let matches = [];
+  let active = -1;
+  let timer = null;
+  let inFlight = null;
+
+  function close() {
+    menu.hidden = true;
+    active = -1;
+  }
+
+  function show(results) {
+    matches = results;
+    menu.replaceChildren();
+    results.forEach((match, i) => {
+      const item = document.createElement("li");
+      item.textContent = match.label;
+      if (match.detail) {
+        const detail = document.createElement("small");
+        detail.textContent = match.detail;
+        item.append(" ", detail);
+      }
+      // mousedown, not click: it fires before the input's blur closes the menu
+      item.addEventListener("mousedown", (event) => {
+        event.preventDefault();
+        pick(i);
+      });
+      menu.append(item);
+    });
+    active = -1;
+    menu.hidden = results.length === 0;
+  }
+
+  function highlight(i) {
+    active = i;
+    menu.querySelectorAll("li").forEach((item, j) => {
+      item.classList.toggle("active", j === i);
+    });
+  }
+
+  function pick(i) {
+    const match = matches[i];
+    if (multiple) {
+      const list = box.parentElement;
+      const already = list.querySelector(
+        `input[name="${box.dataset.name}"][value="${match.id}"]`
+      );
+      if (already) {
+        already.checked = true;
+      } else {
+        const item = document.createElement("li");
+        const label = document.createElement("label");
+        const checkbox = document.createElement("input");
+        checkbox.type = "checkbox";
+        checkbox.name = box.dataset.name;
+        checkbox.value = match.id;
+        checkbox.checked = true;
+        label.append(checkbox, " " + match.label);
+        item.append(label);
+        list.insertBefore(item, box);
+      }
+      input.value = "";
+    } else {
+      hidden.value = match.id;
+      input.value = match.label;
+    }
+    close();
+  }
+
+  async function lookup(query) {
+    if (inFlight) inFlight.abort();
+    inFlight = new AbortController();
+    const local = extra.filter((match) =>
+      match.label.toLowerCase().startsWith(query.toLowerCase())
+    );
+    if (!query) {
+      show(local);
+      return;
+    }
+    try {
+      const response = await fetch(
+        `${box.dataset.source}?q=${encodeURIComponent(query)}`,
+        { signal: inFlight.signal, headers: { Accept: "application/json" } }
+      );
+      if (!response.ok) return;
+      const data = await response.json();
+      show(local.concat(data.results));
+    } catch (error) {
+      if (error.name !== "AbortError") throw error;
+    }
+  }
+
+  input.addEventListener("input", () => {
+    // Typing over a picked name un-picks it until a match is chosen again
+    if (hidden) hidden.value = "";
+    clearTimeout(timer);
+    timer = setTimeout(() => lookup(input.value.trim()), TYPEAHEAD_DELAY_MS);
+  });
+
+  input.addEventListener("focus", () => {
+    if (!input.value && extra.length) show(extra);
+  });
+
+  input.addEventListener("keydown", (event) => {
+    if (menu.hidden) return;
+    if (event.key === "ArrowDown") {
+      highlight(Math.min(active + 1, matches.length - 1));
+    } else if (event.key === "ArrowUp") {
+      highlight(Math.max(active - 1, 0));
+    } else if (event.key === "Enter" && active >= 0) {
+      pick(active);
+    } else if (event.key === "Escape") {
+      close();
+    } else {
+      return;
+    }
+    event.preventDefault();
+  });
+
+  input.addEventListener("blur", close);
+}
+
+document.querySelectorAll(".typeahead").forEach(initTypeahead);
@@ -0,0 +1,124 @@
+"""
+Typeahead — prefix search over user and client names for the pickers.
+
+The task forms used to carry every user and every active client as
+<option>s. That makes every page heavier as the lists grow, and a
+dropdown of a few thousand clients is unusable anyway. The forms now
+send what the user has typed to /typeahead/<kind>?q=... and show the
+top matches.
+
+How a lookup works:
+    Each searchable name is lower-cased and stored in a SORTED list.
+    Every name starting with "jo" sits in one contiguous run of that
+    list, so bisect finds where the run starts in O(log n) and we read
+    matches until we have `limit` of them — a lookup never looks at
+    the rest of the list, however many clients there are.
+
+    To also match later words ("jones" → "Michael Jones"), a second
+    sorted list holds each name from every word onwards ("jones").
+    Matches on the whole name come first, then matches on a later word.
+
+Staying current:
+    The indexes are built by @cached functions (see cache.py). Any write
+    to users or clients bumps that table's change counter, and the next
+    request in each worker drops the stale index; the following lookup
+    rebuilds it with one query.
+"""
+
+import bisect
+import re
+
+import database
+from cache import cached
+
+MAX_RESULTS = 10
+_WORD = re.compile(r"\w+")
+
+
+def normalise(text):
+    """Case- and spacing-insensitive form used for keys and queries."""
+    return " ".join((text or "").casefold().split())
+
+
+class PrefixIndex:
+    """Sorted prefix lists over some records' names."""
+
+    def __init__(self, records):
+        """records: iterable of (id, label, detail, searchable texts)."""
+        self.records = {}
+        whole, words = [], []
+        for record_id, label, detail, texts in records:
+            self.records[record_id] = {"id": record_id, "label": label, "detail": detail}
+            for text in texts:
+                key = normalise(text)
+                if not key:
+                    continue
+                whole.append((key, record_id))
+                for match in _WORD.finditer(key):
+                    if match.start():
+                        words.append((key[match.start():], record_id))
+        whole.sort()
+        words.sort()
+        # Parallel lists: bisect works on the keys alone
+        self._runs = [
+            ([key for key, _ in entries], [record_id for _, record_id in entries])
+            for entries in (whole, words)
+        ]
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Up to `limit` records whose name (or a later word of it) starts with `query`."""
+        prefix = normalise(query)
+        if not prefix:
+            return []
+        found, seen = [], set()
+        for keys, ids in self._runs:
+            position = bisect.bisect_left(keys, prefix)
+            while position < len(keys) and len(found) < limit and keys[position].startswith(prefix):
+                record_id = ids[position]
+                if record_id not in seen:
+                    seen.add(record_id)
+                    found.append(self.records[record_id])
+                position += 1
+        return found
+
+    def label(self, record_id):
+        record = self.records.get(record_id)
+        return record["label"] if record else None
+
+
+@cached("users")
+def user_index():
+    """Every user, searchable by full name and username."""
+    conn = database.get_db()
+    rows = conn.execute("SELECT id, full_name, username, role, department FROM users").fetchall()
+    conn.close()
+    return PrefixIndex(
+        (row["id"], row["full_name"], f"{row['role']} · {row['department']}",
+         (row["full_name"], row["username"]))
+        for row in rows
+    )
+
+
+@cached("clients")
+def client_index():
+    """Clients, searchable by company and contact name.
+
+    Only active clients are searchable (as in the old dropdowns), but
+    inactive ones keep a label so existing filters still read properly.
+    """
+    conn = database.get_db()
+    rows = conn.execute(
+        "SELECT id, company_name, contact_name, status FROM clients"
+    ).fetchall()
+    conn.close()
+    return PrefixIndex(
+        (row["id"], row["company_name"], row["contact_name"],
+         (row["company_name"], row["contact_name"]) if row["status"] == "active" else ())
+        for row in rows
+    )
+
+
+INDEXES = {"users": user_index, "clients": client_index}
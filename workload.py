@@ -0,0 +1,289 @@
+"""
+Workload — picks the least-loaded staff member for a new task.
+
+Managers used to choose an assignee by eye from the dropdown. With the
+"Auto-assign" option (task form and CSV import) the server picks the
+staff member in the task's department with the LOWEST weighted open
+workload instead.
+
+How workload is weighed:
+    Each open or in-progress task counts by priority
+        low = 1, medium = 2, high = 3, urgent = 5
+    multiplied by how pressing its due date is
+        overdue × 2, due within 7 days × 1.5, otherwise × 1.
+    Completed and cancelled tasks count for nothing.
+
+How it stays fast:
+    Each worker process keeps a WorkloadIndex: one min-heap per
+    department holding (load, user_id) for its staff. The least-loaded
+    person is always at the top of the heap, so assigning a task is
+    "look at the top, add the task's weight, sift down" — O(log n),
+    however many tasks are being imported.
+
+    When someone's load changes but they are NOT at the top of the
+    heap, we do not search the heap for their old entry. We push a new
+    entry and remember their true load in a dict; old entries are
+    recognised as stale (their load no longer matches) and thrown away
+    when they reach the top. This is "lazy deletion".
+
+How it stays correct:
+    Assignment runs inside a BEGIN IMMEDIATE transaction, so no other
+    writer can slip in while we pick and insert. The change counters
+    (see cache.py) are read at the start. If the tasks table changed
+    since the index last caught up — an edit, a status change, another
+    worker's import — the change_feed rows since then say WHICH tasks
+    (as in reporting.py). Only those rows are re-read: each one's old
+    weight is taken off its old assignee and its new weight added to
+    the new one, as heap deltas. The index remembers the weight it
+    counted for every open task (_tasks) so it knows what to take off.
+
+    Just before COMMIT our own inserts are caught up the same way, so
+    the next assignment starts from exactly where this one left off.
+
+    The full rebuild (one query over the open tasks) only happens on
+    first use, on a new day (the due-date factors move), when the feed
+    has been pruned past the index, or when the users table changed —
+    someone joined, left or moved department, which is rare.
+
+Sharded storage (see database.py):
+    Each department's tasks are in their own shard, so each shard gets
+    its own index (index_for(department)), built from and locked with
+    that shard alone — so loads count the tasks in that department only.
+    Shards keep no change feed, so there a change by anyone else means
+    a rebuild — of that one department's tasks.
+"""
+
+import contextlib
+import datetime
+import heapq
+import os
+import threading
+
+import database
+
+PRIORITY_WEIGHTS = {"low": 1, "medium": 2, "high": 3, "urgent": 5}
+OPEN_STATUSES = ("open", "in_progress")
+OVERDUE_FACTOR = 2.0
+DUE_SOON_FACTOR = 1.5
+DUE_SOON_DAYS = 7
+
+
+def _due_bounds(today):
+    return today.isoformat(), (today + datetime.timedelta(days=DUE_SOON_DAYS)).isoformat()
+
+
+def task_weight(priority, due_date, status="open", today=None):
+    """How much one task adds to its assignee's workload."""
+    if status not in OPEN_STATUSES:
+        return 0.0
+    overdue_before, due_soon_by = _due_bounds(today or datetime.date.today())
+    weight = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS["medium"])
+    if due_date and due_date < overdue_before:
+        weight *= OVERDUE_FACTOR
+    elif due_date and due_date <= due_soon_by:
+        weight *= DUE_SOON_FACTOR
+    return float(weight)
+
+
+# The same weighting, as SQL, for reading many tasks' weights in one query
+_PRIORITY_CASE = "CASE t.priority " + " ".join(
+    f"WHEN '{name}' THEN {weight}" for name, weight in PRIORITY_WEIGHTS.items()
+) + f" ELSE {PRIORITY_WEIGHTS['medium']} END"
+
+_WEIGHTS_QUERY = f"""
+    SELECT t.id, t.assigned_to,
+           {_PRIORITY_CASE} * CASE
+               WHEN t.due_date < ? THEN {OVERDUE_FACTOR}
+               WHEN t.due_date <= ? THEN {DUE_SOON_FACTOR}
+               ELSE 1 END AS weight
+    FROM tasks t
+    WHERE t.status IN {OPEN_STATUSES} AND t.assigned_to IS NOT NULL
+"""
+
+_STAFF_QUERY = "SELECT id, department FROM users WHERE role = 'staff'"
+
+# Changed tasks re-read per query when catching up from the feed
+FETCH_CHUNK = 500
+
+
+def _counter_versions(conn):
+    # On a shard connection the users counter is in the attached common file
+    users = f"{database.COMMON_SCHEMA}.change_counters" if database.SHARDED else "change_counters"
+    return tuple(conn.execute(
+        "SELECT (SELECT version FROM change_counters WHERE table_name = 'tasks'), "
+        f"(SELECT version FROM {users} WHERE table_name = 'users')"
+    ).fetchone())
+
+
+class WorkloadIndex:
+    """Per-process heaps of staff workload, one per department."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._loads = {}          # user_id → current load (the truth)
+        self._department = {}     # user_id → department
+        self._heaps = {}          # department → [(load, user_id), ...]
+        self._members = {}        # department → number of staff
+        self._tasks = {}          # open task id → (staff user_id, weight counted)
+        self._versions = None     # change counters the index matches
+        self._cursor = 0          # change_feed id the index includes
+        self._day = None          # due-date factors depend on today
+        self._pid = os.getpid()
+
+    def _rebuild(self, conn, today):
+        self._reset()
+        if not database.SHARDED:
+            self._cursor = conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed").fetchone()[0]
+        for user_id, department in conn.execute(_STAFF_QUERY):
+            self._loads[user_id] = 0.0
+            self._department[user_id] = department
+            self._members[department] = self._members.get(department, 0) + 1
+        for task_id, user_id, weight in conn.execute(_WEIGHTS_QUERY, _due_bounds(today)):
+            if user_id in self._loads:
+                self._tasks[task_id] = (user_id, float(weight))
+                self._loads[user_id] += weight
+        for user_id, load in self._loads.items():
+            self._heaps.setdefault(self._department[user_id], []).append((load, user_id))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+        self._day = today
+
+    def _catch_up(self, conn, today):
+        """Apply the tasks changed since _cursor as heap deltas.
+
+        Returns False if the feed was pruned past us — then only a
+        rebuild can tell what changed.
+        """
+        oldest = conn.execute("SELECT MIN(id) FROM change_feed").fetchone()[0]
+        if oldest is not None and oldest > self._cursor + 1:
+            return False
+        latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed").fetchone()[0]
+        changed = [row[0] for row in conn.execute(
+            "SELECT DISTINCT row_id FROM change_feed "
+            "WHERE id > ? AND id <= ? AND table_name = 'tasks'",
+            (self._cursor, latest),
+        )]
+        for start in range(0, len(changed), FETCH_CHUNK):
+            chunk = changed[start:start + FETCH_CHUNK]
+            for task_id in chunk:
+                user_id, weight = self._tasks.pop(task_id, (None, 0.0))
+                self._add(user_id, -weight)
+            rows = conn.execute(
+                f"{_WEIGHTS_QUERY} AND t.id IN ({', '.join('?' * len(chunk))})",
+                list(_due_bounds(today)) + chunk,
+            )
+            for task_id, user_id, weight in rows:
+                if user_id in self._loads:
+                    self._tasks[task_id] = (user_id, float(weight))
+                    self._add(user_id, float(weight))
+        self._cursor = latest
+        return True
+
+    def _add(self, user_id, weight):
+        """Add to (or take from) one user's load, leaving any old heap entry to go stale."""
+        if user_id not in self._loads or not weight:
+            return  # not staff (e.g. a manager), or nothing to add
+        self._loads[user_id] += weight
+        department = self._department[user_id]
+        heap = self._heaps[department]
+        heapq.heappush(heap, (self._loads[user_id], user_id))
+        # Too many stale entries? Rebuild this heap from the true loads.
+        if len(heap) > 2 * self._members[department] + 16:
+            heap[:] = [(load, uid) for uid, load in self._loads.items()
+                       if self._department[uid] == department]
+            heapq.heapify(heap)
+
+    def _pick(self, department, weight):
+        """Least-loaded staff member in `department` (or None); charges them `weight`."""
+        heap = self._heaps.get(department)
+        while heap:
+            load, user_id = heap[0]
+            if self._loads.get(user_id) == load:
+                break
+            heapq.heappop(heap)  # stale entry — lazy deletion
+        else:
+            return None
+        self._loads[user_id] = load + weight
+        heapq.heapreplace(heap, (load + weight, user_id))
+        return user_id
+
+    @contextlib.contextmanager
+    def assigning(self, conn):
+        """Open a write transaction and yield an `assign` function.
+
+            with workload.index.assigning(conn) as assign:
+                user_id = assign(department, priority, due_date, status, assigned_to="auto")
+                conn.execute("INSERT INTO tasks ...", (..., user_id, ...))
+
+        assign() returns the chosen user id for assigned_to="auto", and
+        otherwise records the given assignee's new load and returns it
+        unchanged. The transaction is committed on leaving the block.
+        """
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                today = datetime.date.today()
+                versions = _counter_versions(conn)
+                if (self._pid != os.getpid() or self._day != today or self._versions is None
+                        or self._versions[1] != versions[1]):
+                    self._rebuild(conn, today)
+                elif self._versions[0] != versions[0]:
+                    if database.SHARDED or not self._catch_up(conn, today):
+                        self._rebuild(conn, today)
+
+                charged = []  # (user_id, weight) added by assign() in this transaction
+
+                def assign(department, priority, due_date, status="open", assigned_to="auto"):
+                    weight = task_weight(priority, due_date, status, today)
+                    if assigned_to == "auto":
+                        assigned_to = self._pick(department, weight)
+                    elif assigned_to:
+                        self._add(int(assigned_to), weight)
+                    if assigned_to:
+                        charged.append((int(assigned_to), weight))
+                    return assigned_to
+
+                yield assign
+                if not database.SHARDED:
+                    # Swap the charges for the inserted rows themselves, so
+                    # _tasks knows their weights for later edits
+                    for user_id, weight in charged:
+                        self._add(user_id, -weight)
+                    if not self._catch_up(conn, today):
+                        self._rebuild(conn, today)
+                versions = _counter_versions(conn)
+                conn.commit()
+                self._versions = versions
+            except BaseException:
+                conn.rollback()
+                self._versions = None  # our in-memory changes never happened
+                raise
+
+    def loads(self):
+        """{department: [(user_id, load), ...]} least-loaded first (for diagnostics)."""
+        with self._lock:
+            result = {}
+            for user_id, load in sorted(self._loads.items(), key=lambda item: (item[1], item[0])):
+                result.setdefault(self._department[user_id], []).append((user_id, load))
+            return result
+
+
+# One shared index per process
+index = WorkloadIndex()
+
+# ...or, in sharded storage, one per department's shard
+_shard_indexes = {}
+_shard_indexes_lock = threading.Lock()
+
+
+def index_for(department):
+    """The index to assign with for a task in `department`."""
+    if not database.SHARDED:
+        return index
+    with _shard_indexes_lock:
+        if department not in _shard_indexes:
+            _shard_indexes[department] = WorkloadIndex()
+        return _shard_indexes[department]